@@ -0,0 +1,18 @@
+from django.db import connections
+
+
+def upsert_kwargs(unique_fields, update_fields, using="default"):
+    """
+    Build the bulk_create() kwargs for an "insert or update" write.
+
+    PostgreSQL and SQLite need the conflict target (unique_fields) while
+    MySQL refuses it and upserts on any unique key, so only pass it where
+    the backend supports it.
+    """
+    kwargs = {
+        "update_conflicts": True,
+        "update_fields": list(update_fields),
+    }
+    if connections[using].features.supports_update_conflicts_with_target:
+        kwargs["unique_fields"] = list(unique_fields)
+    return kwargs
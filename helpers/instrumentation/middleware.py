@@ -0,0 +1,103 @@
+# helpers/instrumentation/middleware.py
+import logging
+import random
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .queries import QueryRecorder
+from .spans import SpanCollector
+
+logger = logging.getLogger(__name__)
+
+
+def declared_budget(view_class, method):
+    """
+    Query budget a view declares for an HTTP method, or None.
+
+    Views declare it as a class attribute, either one number for every method
+    or a per-method dict: query_budget = {"GET": 12, "POST": 10}
+    """
+    budget = getattr(view_class, "query_budget", None)
+    if isinstance(budget, dict):
+        return budget.get(method.upper())
+    return budget
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Per-request query count, SQL time, duplicate shapes and N+1 origins.
+
+    Enabled with QUERY_INSTRUMENTATION=True. Adds X-Query-Count / X-Query-Time-Ms
+    response headers and logs a summary; requests over the view's declared
+    query_budget or with N+1 patterns are logged as warnings.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._query_view_class = None
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        summary = recorder.summary()
+        response["X-Query-Count"] = str(summary["count"])
+        response["X-Query-Time-Ms"] = str(summary["time_ms"])
+
+        budget = declared_budget(request._query_view_class, request.method)
+        over_budget = budget is not None and recorder.count > budget
+        level = logging.WARNING if over_budget or summary["n_plus_one"] else logging.INFO
+        logger.log(
+            level,
+            "%s %s: %s queries (budget %s) in %s ms, %s duplicated shapes",
+            request.method, request.path, summary["count"], budget,
+            summary["time_ms"], summary["duplicates"],
+            extra={"queries": summary},
+        )
+        if level == logging.WARNING:
+            logger.warning("%s %s query report\n%s", request.method, request.path, recorder.report())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_view_class = (
+            getattr(view_func, "view_class", None) or getattr(view_func, "cls", None)
+        )
+
+
+class TimingSpanMiddleware:
+    """
+    Collect helpers.instrumentation.spans for a sample of requests.
+
+    TIMING_SAMPLE_RATE (0..1) picks the share of requests to trace. Sampled
+    requests log one structured record with their spans and return them in a
+    Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, "TIMING_SAMPLE_RATE", 0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        with SpanCollector() as collector:
+            response = self.get_response(request)
+
+        if collector.spans:
+            response["Server-Timing"] = collector.server_timing()
+            logger.info(
+                "%s %s timing: %s",
+                request.method, request.path,
+                ", ".join(f"{s.name}={s.duration * 1000:.1f}ms/{s.queries}q" for s in collector.spans),
+                extra={
+                    "spans": [s.as_dict() for s in collector.spans],
+                    "total_queries": collector.query_count,
+                },
+            )
+        return response
@@ -0,0 +1,198 @@
+# helpers/instrumentation/queries.py
+"""
+Record the SQL a block of code issues: count, total time, repeated query
+shapes, and where each query came from.
+
+    with QueryRecorder() as rec:
+        YatraRegistrationView.as_view()(request, yatra_id=...)
+    print(rec.report())
+
+A query is "lazy" when it was triggered from a serializer method/field or a
+model property (e.g. ProfileSerializer.get_is_profile_approved,
+YatraRegistration.total_amount) - the usual source of N+1 patterns.
+"""
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import cached_property
+
+from django.conf import settings
+from django.db import connections
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_PLACEHOLDERS = re.compile(r"(?:%s, )+%s")
+
+# Frames from these packages are never reported as a query's origin
+_LIBRARY_MARKERS = (
+    f"{os.sep}django{os.sep}",
+    f"{os.sep}rest_framework{os.sep}",
+    f"{os.sep}site-packages{os.sep}",
+    f"{os.sep}helpers{os.sep}instrumentation{os.sep}",
+)
+
+
+def query_shape(sql):
+    """SQL with variable-length placeholder lists collapsed, so IN (...) batches compare equal."""
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _PLACEHOLDERS.sub("...", sql)
+
+
+def _is_library(filename):
+    return any(marker in filename for marker in _LIBRARY_MARKERS)
+
+
+def _lazy_source(frame):
+    """Name the serializer method/field or model property a frame belongs to, if any."""
+    from django.db.models import Model
+    from rest_framework.fields import Field
+    from rest_framework.serializers import BaseSerializer
+
+    owner = frame.f_locals.get("self")
+    name = frame.f_code.co_name
+    if owner is None:
+        return None
+
+    if isinstance(owner, BaseSerializer) and name.startswith("get_"):
+        return f"{type(owner).__name__}.{name}"
+
+    if (
+        isinstance(owner, Field)
+        and not isinstance(owner, BaseSerializer)
+        and name in ("get_attribute", "to_representation")
+        and getattr(owner, "parent", None) is not None
+    ):
+        return f"{type(owner.parent).__name__}.{owner.field_name}"
+
+    if isinstance(owner, Model):
+        attr = getattr(type(owner), name, None)
+        if isinstance(attr, (property, cached_property)):
+            return f"{type(owner).__name__}.{name}"
+
+    return None
+
+
+@dataclass
+class QueryRecord:
+    sql: str
+    duration: float
+    origin: str
+    lazy_source: str = None
+
+    @property
+    def shape(self):
+        return query_shape(self.sql)
+
+
+class QueryRecorder:
+    """
+    Context manager wrapping connection.execute_wrapper().
+
+    capture_origin walks the Python stack for every query; leave it on for
+    diagnostics and tests, turn it off when only counts/timings are needed.
+    """
+
+    def __init__(self, using="default", capture_origin=True):
+        self.using = using
+        self.capture_origin = capture_origin
+        self.queries = []
+        self._wrapper = None
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._wrapper.__exit__(exc_type, exc, tb)
+        self._wrapper = None
+        return False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            origin, lazy = self._locate() if self.capture_origin else ("", None)
+            self.queries.append(QueryRecord(sql, duration, origin, lazy))
+
+    def _locate(self):
+        origin = None
+        lazy = None
+        frame = sys._getframe(2)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if lazy is None:
+                lazy = _lazy_source(frame)
+            if origin is None and not _is_library(filename):
+                origin = f"{os.path.relpath(filename, settings.BASE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}"
+            if origin is not None and lazy is not None:
+                break
+            frame = frame.f_back
+        return origin or "<unknown>", lazy
+
+    # -----------------------------------------------------------------
+    # Summaries
+    # -----------------------------------------------------------------
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(q.duration for q in self.queries)
+
+    def duplicates(self):
+        """{shape: times} for every query shape executed more than once."""
+        counts = Counter(q.shape for q in self.queries)
+        return {shape: n for shape, n in counts.items() if n > 1}
+
+    def n_plus_one(self, threshold=None):
+        """
+        [(origin, lazy_source, shape, times)] for the same query shape issued
+        repeatedly from the same line - one query per row instead of one per batch.
+        """
+        if threshold is None:
+            threshold = getattr(settings, "QUERY_N_PLUS_ONE_THRESHOLD", 3)
+        groups = defaultdict(list)
+        for q in self.queries:
+            groups[(q.origin, q.shape)].append(q)
+        return sorted(
+            (
+                (origin, qs[0].lazy_source, shape, len(qs))
+                for (origin, shape), qs in groups.items()
+                if len(qs) >= threshold
+            ),
+            key=lambda item: -item[3],
+        )
+
+    def lazy_loads(self):
+        """{lazy_source: times} for queries issued from serializers or model properties."""
+        return dict(Counter(q.lazy_source for q in self.queries if q.lazy_source))
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "time_ms": round(self.total_time * 1000, 2),
+            "duplicates": len(self.duplicates()),
+            "n_plus_one": [
+                {"origin": origin, "source": source, "times": times}
+                for origin, source, _, times in self.n_plus_one()
+            ],
+            "lazy_loads": self.lazy_loads(),
+        }
+
+    def report(self):
+        lines = [f"{self.count} queries in {self.total_time * 1000:.1f} ms"]
+        for origin, source, shape, times in self.n_plus_one():
+            lines.append(f"  N+1 x{times} at {origin}" + (f" ({source})" if source else ""))
+            lines.append(f"      {shape[:200]}")
+        for source, times in self.lazy_loads().items():
+            lines.append(f"  lazy load x{times} from {source}")
+        for i, q in enumerate(self.queries, 1):
+            lines.append(f"  {i:>3}. {q.duration * 1000:7.2f} ms  {q.origin}")
+            lines.append(f"       {q.sql[:200]}")
+        return "\n".join(lines)
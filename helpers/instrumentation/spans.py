@@ -0,0 +1,85 @@
+# helpers/instrumentation/spans.py
+"""
+Named timing spans for view code.
+
+    with span("dashboard_rows"):
+        ...
+
+Each span records its wall time and the number of queries issued inside it.
+Spans are only collected for requests sampled by TimingSpanMiddleware
+(TIMING_SAMPLE_RATE); otherwise span() is a no-op costing one ContextVar read.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.db import connections
+
+_collector = ContextVar("timing_span_collector", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    duration: float
+    queries: int
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "ms": round(self.duration * 1000, 2),
+            "queries": self.queries,
+        }
+
+
+class SpanCollector:
+    """Collects spans for one request and counts the queries issued meanwhile."""
+
+    def __init__(self, using="default"):
+        self.using = using
+        self.spans = []
+        self.query_count = 0
+        self._wrapper = None
+        self._token = None
+
+    def _count(self, execute, sql, params, many, context):
+        self.query_count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self._count)
+        self._wrapper.__enter__()
+        self._token = _collector.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _collector.reset(self._token)
+        self._wrapper.__exit__(exc_type, exc, tb)
+        return False
+
+    def server_timing(self):
+        """Value for the Server-Timing response header."""
+        return ", ".join(
+            f'{s.name};dur={s.duration * 1000:.1f};desc="{s.queries} queries"'
+            for s in self.spans
+        )
+
+
+@contextmanager
+def span(name):
+    collector = _collector.get()
+    if collector is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    queries_before = collector.query_count
+    try:
+        yield
+    finally:
+        collector.spans.append(Span(
+            name,
+            time.perf_counter() - start,
+            collector.query_count - queries_before,
+        ))
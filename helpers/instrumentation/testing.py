@@ -0,0 +1,39 @@
+# helpers/instrumentation/testing.py
+"""
+Test helpers that fail when code goes over its query budget.
+
+    with assert_query_budget(8):
+        client.get(url)
+
+    with assert_view_query_budget(YatraRegistrationView, "GET"):
+        client.get(url)
+"""
+from contextlib import contextmanager
+
+from .middleware import declared_budget
+from .queries import QueryRecorder
+
+
+@contextmanager
+def assert_query_budget(budget, using="default", allow_n_plus_one=False):
+    """Fail if the block issues more than `budget` queries (or any N+1 pattern)."""
+    with QueryRecorder(using=using) as recorder:
+        yield recorder
+
+    problems = []
+    if recorder.count > budget:
+        problems.append(f"{recorder.count} queries, budget is {budget}")
+    if not allow_n_plus_one and recorder.n_plus_one():
+        problems.append("N+1 query pattern detected")
+    if problems:
+        raise AssertionError("; ".join(problems) + "\n" + recorder.report())
+
+
+@contextmanager
+def assert_view_query_budget(view_class, method, using="default", allow_n_plus_one=False):
+    """assert_query_budget() using the query_budget the view class declares."""
+    budget = declared_budget(view_class, method)
+    if budget is None:
+        raise AssertionError(f"{view_class.__name__} declares no query_budget for {method}")
+    with assert_query_budget(budget, using=using, allow_n_plus_one=allow_n_plus_one) as recorder:
+        yield recorder
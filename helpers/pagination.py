@@ -0,0 +1,112 @@
+# helpers/pagination.py
+"""
+Keyset (cursor) pagination over an indexed ordering.
+
+A page is read as WHERE (key, tiebreak) > (last_key, last_tiebreak)
+ORDER BY key, tiebreak LIMIT n, so page N costs the same as page 1 as long as
+an index covers the filter columns followed by (key, tiebreak). The cursor
+is an opaque token holding the ordering and the last row's key.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.db.models import Q
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def wants_pagination(request, params=('cursor', 'page_size')):
+    """Pagination is opt-in: clients that send none of `params` keep getting full lists."""
+    return any(name in request.query_params for name in params)
+
+
+def _cursor_value(value):
+    # isoformat keeps microseconds, so datetime keys compare exactly on the next page
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else value
+
+
+def _encode(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def _decode(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidPageRequest("Invalid cursor.")
+    if not isinstance(payload, dict) or not {'o', 'k', 't'} <= payload.keys():
+        raise InvalidPageRequest("Invalid cursor.")
+    return payload
+
+
+class KeysetPaginator:
+    """
+    orderings maps a public ordering name to (key field, tiebreak field);
+    prefix the name with '-' in ?ordering= for descending order.
+
+        paginator = KeysetPaginator(request, {'name': ('sort_name', 'profile_id')}, 'name')
+        rows = paginator.paginate(queryset.values(...))
+        paginator.next_cursor  # None on the last page
+    """
+
+    def __init__(self, request, orderings, default_ordering, default_page_size=50, max_page_size=200):
+        params = request.query_params
+        self.ordering = params.get('ordering', default_ordering)
+        self.descending = self.ordering.startswith('-')
+        name = self.ordering.lstrip('-')
+        if name not in orderings:
+            raise InvalidPageRequest(
+                f"Invalid ordering '{self.ordering}'. Use one of: {', '.join(sorted(orderings))}"
+            )
+        self.key, self.tiebreak = orderings[name]
+
+        try:
+            self.page_size = int(params.get('page_size', default_page_size))
+        except ValueError:
+            raise InvalidPageRequest("page_size must be a number.")
+        self.page_size = max(1, min(self.page_size, max_page_size))
+
+        self.after = None
+        if params.get('cursor'):
+            cursor = _decode(params['cursor'])
+            if cursor['o'] != self.ordering:
+                raise InvalidPageRequest("Cursor does not match the requested ordering.")
+            self.after = (cursor['k'], cursor['t'])
+
+        self.next_cursor = None
+
+    @property
+    def is_first_page(self):
+        return self.after is None
+
+    def _value(self, row, field):
+        return row[field] if isinstance(row, dict) else getattr(row, field)
+
+    def paginate(self, queryset):
+        sign = '-' if self.descending else ''
+        queryset = queryset.order_by(f'{sign}{self.key}', f'{sign}{self.tiebreak}')
+
+        if self.after is not None:
+            key, tiebreak = self.after
+            op = 'lt' if self.descending else 'gt'
+            # The leading range condition lets the database seek the index
+            queryset = queryset.filter(
+                Q(**{f'{self.key}__{op}e': key}),
+                Q(**{f'{self.key}__{op}': key}) | Q(**{self.key: key, f'{self.tiebreak}__{op}': tiebreak}),
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            last = rows[-1]
+            self.next_cursor = _encode({
+                'o': self.ordering,
+                'k': _cursor_value(self._value(last, self.key)),
+                't': str(self._value(last, self.tiebreak)),
+            })
+        return rows
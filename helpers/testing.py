@@ -0,0 +1,144 @@
+# helpers/testing.py
+"""
+Fixtures shared by the apps' tests: a yatra with two installments, a mentor
+with approved mentees, and clients for them and for a staff user.
+
+    class MyTests(YatraTestCase):
+        mentee_count = 3
+
+        def test_something(self):
+            self.approve()
+            self.register(labels=["A"])
+"""
+import datetime
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from userProfile.models import MentorRequest, Profile
+from yatra.models import Yatra, YatraInstallment
+
+
+def make_profile(username, **fields):
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="x")
+    profile, _ = Profile.objects.get_or_create(user=user, defaults={"username": username})
+    for name, value in {"first_name": username, "last_name": "Das", **fields}.items():
+        setattr(profile, name, value)
+    profile.save()
+    return profile
+
+
+def make_staff(username="staff"):
+    profile = make_profile(username)
+    User.objects.filter(id=profile.user_id).update(is_staff=True)
+    profile.user.refresh_from_db()
+    return profile
+
+
+def make_yatra(**fields):
+    yatra = Yatra.objects.create(**{
+        "title": "Vrindavan Yatra",
+        "description": "-",
+        "start_date": datetime.date(2026, 11, 1),
+        "end_date": datetime.date(2026, 11, 5),
+        "location": "Vrindavan",
+        "capacity": 100,
+        **fields,
+    })
+    YatraInstallment.objects.create(yatra=yatra, label="A", amount=Decimal("3000"), order=1)
+    YatraInstallment.objects.create(yatra=yatra, label="B", amount=Decimal("3500"), order=2)
+    return yatra
+
+
+def make_mentees(mentor, count, prefix="mentee"):
+    mentees = []
+    for i in range(count):
+        mentee = make_profile(f"{prefix}{i}", mentor=mentor, user_type="devotee")
+        MentorRequest.objects.create(from_user=mentee, to_mentor=mentor, is_approved=True)
+        mentees.append(mentee)
+    return mentees
+
+
+def client_for(profile):
+    client = APIClient()
+    client.force_authenticate(profile.user)
+    return client
+
+
+class YatraTestCase(TestCase):
+    """A yatra (installments A 3000, B 3500) and a mentor with `mentee_count` approved mentees."""
+    mentee_count = 3
+
+    def setUp(self):
+        self.yatra = make_yatra()
+        self.mentor = make_profile("mentor", user_type="mentor")
+        self.mentees = make_mentees(self.mentor, self.mentee_count)
+        self.client = client_for(self.mentor)
+
+    def add_mentees(self, count, prefix="extra"):
+        mentees = make_mentees(self.mentor, count, prefix=prefix)
+        self.mentees += mentees
+        return mentees
+
+    def staff_client(self):
+        self.staff = make_staff()
+        return client_for(self.staff)
+
+    def approve(self, profiles=None):
+        profiles = self.mentees if profiles is None else profiles
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                f"/yatras/{self.yatra.id}/eligibility/",
+                {"profile_ids": [str(p.id) for p in profiles], "action": "approve"},
+                format="json",
+            )
+
+    def register(self, profiles=None, labels=("A",)):
+        profiles = self.mentees if profiles is None else profiles
+        body = {
+            str(p.id): {"form_fields": {}, "installments_selected": list(labels)}
+            for p in profiles
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f"/yatras/{self.yatra.id}/register/", body, format="json")
+
+    def pay(self, transaction_id, profiles, labels=("A",), client=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return (client or self.client).post(
+                f"/payments/{self.yatra.id}/batch-payment-proof/",
+                {
+                    "transaction_id": transaction_id,
+                    "total_amount": "1",
+                    "registration_installments": [
+                        {"profile_id": str(p.id), "installments": list(labels)} for p in profiles
+                    ],
+                },
+                format="json",
+            )
+
+
+class TemporaryMediaMixin:
+    """Keep files saved to the default storage in a throwaway MEDIA_ROOT."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(
+            MEDIA_ROOT=cls._media_root,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            },
+        )
+        cls._media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
+        super().tearDownClass()
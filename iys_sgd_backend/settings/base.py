@@ -68,6 +68,7 @@ INSTALLED_APPS = [
     'yatra_substitution',
     'announcements',
     'learning_material',
+    'uploads',
 ]
 SITE_ID = 1
 
@@ -89,6 +90,9 @@ CSRF_TRUSTED_ORIGINS = config(
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # no-op unless QUERY_INSTRUMENTATION / TIMING_SAMPLE_RATE are enabled
+    'helpers.instrumentation.middleware.QueryInstrumentationMiddleware',
+    'helpers.instrumentation.middleware.TimingSpanMiddleware',
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -103,6 +107,12 @@ MIDDLEWARE = [
 
 # ROOT_URLCONF = 'iys_sgd_backend.urls'
 
+# Per-request query count / SQL time / N+1 report (helpers.instrumentation)
+QUERY_INSTRUMENTATION = config("QUERY_INSTRUMENTATION", default=False, cast=bool)
+QUERY_N_PLUS_ONE_THRESHOLD = config("QUERY_N_PLUS_ONE_THRESHOLD", default=3, cast=int)
+# Share of requests (0..1) whose view spans are logged and sent as Server-Timing
+TIMING_SAMPLE_RATE = config("TIMING_SAMPLE_RATE", default=0.0, cast=float)
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -137,10 +147,55 @@ else:
             default=DATABASE_URL,
             conn_max_age=DB_CONN_MAX_AGE,
             conn_health_checks=True,
-            ssl_require=True
+            # False for a local MySQL/Postgres (e.g. load tests)
+            ssl_require=config("DB_SSL_REQUIRE", default=True, cast=bool)
         )
         }
 
+# Cache for API responses (yatra_registration.detail). Without REDIS_URL every
+# worker has its own in-process cache and invalidations only reach the worker
+# that made the change, so registration details are then not cached at all.
+REDIS_URL = config("REDIS_URL", default=None)
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+# Keep well below the lifetime of signed media URLs (S3Storage: 1 hour); 0 disables
+# the detail cache, which is always the case without a shared cache
+REGISTRATION_DETAIL_CACHE_TTL = config("REGISTRATION_DETAIL_CACHE_TTL", default=300, cast=int) if REDIS_URL else 0
+
+# RCS download log rows are buffered per process and bulk inserted
+# (yatra_registration.rcs_downloads)
+RCS_LOG_BUFFER_SIZE = config("RCS_LOG_BUFFER_SIZE", default=50, cast=int)
+RCS_LOG_FLUSH_SECONDS = config("RCS_LOG_FLUSH_SECONDS", default=5, cast=float)
+
+# How long a verifier holds the payments claimed from the verification queue (payment.verification)
+PAYMENT_VERIFICATION_LEASE_SECONDS = config("PAYMENT_VERIFICATION_LEASE_SECONDS", default=600, cast=int)
+
+# Payment proof normalization and duplicate detection (payment.proofs)
+PAYMENT_PROOF_MAX_DIMENSION = config("PAYMENT_PROOF_MAX_DIMENSION", default=1600, cast=int)
+PAYMENT_PROOF_JPEG_QUALITY = config("PAYMENT_PROOF_JPEG_QUALITY", default=80, cast=int)
+PAYMENT_PROOF_KEEP_ORIGINAL = config("PAYMENT_PROOF_KEEP_ORIGINAL", default=True, cast=bool)
+PAYMENT_PROOF_DUPLICATE_DISTANCE = config("PAYMENT_PROOF_DUPLICATE_DISTANCE", default=6, cast=int)
+# Background worker threads per process; 0 processes proofs inline after commit
+PAYMENT_PROOF_WORKERS = config("PAYMENT_PROOF_WORKERS", default=2, cast=int)
+
+# Resumable chunked uploads (uploads.chunks); chunks are kept in the default storage
+UPLOAD_MAX_BYTES = config("UPLOAD_MAX_BYTES", default=15 * 1024 * 1024, cast=int)
+# Stay below DATA_UPLOAD_MAX_MEMORY_SIZE (2.5 MB), which also caps raw request bodies
+UPLOAD_CHUNK_MAX_BYTES = config("UPLOAD_CHUNK_MAX_BYTES", default=1024 * 1024, cast=int)
+UPLOAD_SESSION_TTL = config("UPLOAD_SESSION_TTL", default=24 * 60 * 60, cast=int)
+UPLOAD_CHUNK_PREFIX = "upload_chunks"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -226,6 +281,15 @@ ACCOUNT_CONFIRM_EMAIL_ON_GET = True
 
 
 FRONTEND_BASE_URL = config("FRONTEND_BASE_URL")
+# Public URL of this backend, used for links rendered outside a request (RCS QR codes)
+BACKEND_BASE_URL = config("BACKEND_BASE_URL", default="")
+# Path of MarkAttendanceView under BACKEND_BASE_URL (the API urlconf). RCS slips are
+# also rendered in the admin process, whose urlconf mounts the view elsewhere, so the
+# QR link is built from this instead of reverse()
+ATTENDANCE_URL_PATH = "/yatras/mark-attendance/{registration_id}/"
+# Signs the attendance token in RCS QR codes; gate scanners verify with it offline,
+# so set a key of its own in production rather than sharing SECRET_KEY
+ATTENDANCE_QR_SIGNING_KEY = config("ATTENDANCE_QR_SIGNING_KEY", default=SECRET_KEY)
 
 
 ACCOUNT_EMAIL_CONFIRMATION_AUTHENTICATED_REDIRECT_URL = None
@@ -249,26 +313,37 @@ SOCIALACCOUNT_ADAPTER = 'userProfile.adapters.MySocialAccountAdapter'
 
 
 
-CLOUDFLARE_R2_BUCKET_ENDPOINT = config("CLOUDFLARE_R2_BUCKET_ENDPOINT")
-CLOUDFLARE_R2_BUCKET = config("CLOUDFLARE_R2_BUCKET")
-CLOUDFLARE_R2_ACCESS_KEY = config("CLOUDFLARE_R2_ACCESS_KEY")
-CLOUDFLARE_R2_SECRET_KEY = config("CLOUDFLARE_R2_SECRET_KEY")
-
+# "r2" (Cloudflare R2) or "local" (files under MEDIA_ROOT; load tests and
+# offline development, no outside services)
+MEDIA_STORAGE = config("MEDIA_STORAGE", default="r2")
 
-CLOUDFLARE_R2_CONFIG_OPTIONS = {
-    "bucket_name": CLOUDFLARE_R2_BUCKET,
-    "access_key": CLOUDFLARE_R2_ACCESS_KEY,
-    "secret_key": CLOUDFLARE_R2_SECRET_KEY,
-    "endpoint_url": CLOUDFLARE_R2_BUCKET_ENDPOINT,
-    "default_acl": "public-read",  # or "private"
-    "signature_version": "s3v4",
-}
-
-STORAGES = {
-    "default": {  # MEDIA FILES → Cloudflare R2
+if MEDIA_STORAGE == "local":
+    MEDIA_ROOT = BASE_DIR / "media"
+    MEDIA_URL = "/media/"
+    MEDIA_STORAGE_BACKEND = {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    }
+else:
+    CLOUDFLARE_R2_BUCKET_ENDPOINT = config("CLOUDFLARE_R2_BUCKET_ENDPOINT")
+    CLOUDFLARE_R2_BUCKET = config("CLOUDFLARE_R2_BUCKET")
+    CLOUDFLARE_R2_ACCESS_KEY = config("CLOUDFLARE_R2_ACCESS_KEY")
+    CLOUDFLARE_R2_SECRET_KEY = config("CLOUDFLARE_R2_SECRET_KEY")
+
+    CLOUDFLARE_R2_CONFIG_OPTIONS = {
+        "bucket_name": CLOUDFLARE_R2_BUCKET,
+        "access_key": CLOUDFLARE_R2_ACCESS_KEY,
+        "secret_key": CLOUDFLARE_R2_SECRET_KEY,
+        "endpoint_url": CLOUDFLARE_R2_BUCKET_ENDPOINT,
+        "default_acl": "public-read",  # or "private"
+        "signature_version": "s3v4",
+    }
+    MEDIA_STORAGE_BACKEND = {  # MEDIA FILES → Cloudflare R2
         "BACKEND": "helpers.cloudflare.storages.MediaFileStorage",
         "OPTIONS": CLOUDFLARE_R2_CONFIG_OPTIONS,
-    },
+    }
+
+STORAGES = {
+    "default": MEDIA_STORAGE_BACKEND,
 
     "staticfiles": {  # STATIC FILES → local filesystem
         "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
@@ -21,6 +21,7 @@ urlpatterns = [
     path('yatras/', include('yatra_registration.urls')),  # Yatra app URLs
     path('payments/', include('payment.urls')),  # Payment app URLs
     path('yatra-transfers/', include('yatra_substitution.urls')),  # Payment app URLs
+    path('uploads/', include('uploads.urls')),  # Resumable chunked uploads
 
       # Auth APIs
     path('api/auth/', include('dj_rest_auth.urls')),  # login/logout/password reset/change
@@ -19,6 +19,7 @@ urlpatterns = [
     path('yatras/', include('yatra_registration.urls')),  # Yatra app URLs
     path('payments/', include('payment.urls')),  # Payment app URLs
     path('yatra-transfers/', include('yatra_substitution.urls')),  # Payment app URLs
+    path('uploads/', include('uploads.urls')),  # Resumable chunked uploads
     path('announcements/', include('announcements.urls')),  # Announcements app URLs
     path('learning_material/', include('learning_material.urls')),
 
@@ -11,29 +11,59 @@ class PaymentAdmin(admin.ModelAdmin):
         'uploaded_by', 
         'status',
         'processed_at',
+        'claimed_by',
         # 'uploaded_at',
         # 'is_verified',
         # 'verified_at'
     )
+    list_select_related = ('uploaded_by', 'claimed_by')
     list_filter = ('uploaded_at', 'processed_at', 'status')
     search_fields = ('transaction_id', 'uploaded_by__first_name', 'uploaded_by__last_name')
-    readonly_fields = ('uploaded_at',)
+    readonly_fields = ('uploaded_at', 'proof_original', 'proof_phash', 'proof_processed_at')
     actions = ["approve_selected", "reject_selected","under_review"]
 
     def approve_selected(self, request, queryset):
-        for p in queryset:
-            p.approve(request.user.profile, "Verified via admin panel")
-        self.message_user(request, f"{queryset.count()} payments verified.")
+        count = Payment.bulk_transition(queryset, "verified", request.user.profile, "Verified via admin panel")
+        self.message_user(request, f"{count} payments verified.")
     approve_selected.short_description = "Approve selected payments"
 
     def reject_selected(self, request, queryset):
-        for p in queryset:
-            p.reject(request.user.profile, "Rejected via admin panel")
-        self.message_user(request, f"{queryset.count()} payments rejected.")
+        count = Payment.bulk_transition(queryset, "rejected", request.user.profile, "Rejected via admin panel")
+        self.message_user(request, f"{count} payments rejected.")
     reject_selected.short_description = "Reject selected payments"
     
     def under_review(self, request, queryset):
-        for p in queryset:
-            p.mark_under_review(request.user.profile, "Marked under review via admin panel")
-        self.message_user(request, f"{queryset.count()} payments marked under review.")
+        count = Payment.bulk_transition(queryset, "under_review", request.user.profile, "Marked under review via admin panel")
+        self.message_user(request, f"{count} payments marked under review.")
     under_review.short_description = "Mark selected payments as under review"
+
+
+
+class LedgerTotalsAdmin(admin.ModelAdmin):
+    """Read-only: the ledger is written by payment.ledger (rebuild_payment_ledger to recompute)."""
+    totals = (
+        'collected_count', 'collected_amount', 'under_review_count', 'under_review_amount',
+        'rejected_count', 'rejected_amount', 'refunded_count', 'refunded_amount',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(YatraLedger)
+class YatraLedgerAdmin(LedgerTotalsAdmin):
+    list_display = ('yatra',) + LedgerTotalsAdmin.totals + ('updated_at',)
+    list_select_related = ('yatra',)
+
+
+@admin.register(InstallmentLedger)
+class InstallmentLedgerAdmin(LedgerTotalsAdmin):
+    list_display = ('yatra', 'installment') + LedgerTotalsAdmin.totals + ('updated_at',)
+    list_select_related = ('yatra', 'installment__yatra')
+    list_filter = ('yatra',)
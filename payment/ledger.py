@@ -0,0 +1,205 @@
+# payment/ledger.py
+"""
+Per-yatra and per-installment payment ledger.
+
+YatraLedger and InstallmentLedger hold, for every payment status bucket
+(collected, under review, rejected, refunded), how many payment-linked
+registration installments are in it and the sum of their installment
+amounts. The write paths that link installments to payments or move
+payments between statuses wrap the change in track(): it totals the
+affected installments before and after and adds the difference to the
+ledger rows with F() updates, inside the caller's transaction. Single-row
+save()/delete() of installments and payments outside track() (admin edits,
+deletes) are recorded the same way by payment.signals; queryset.update()
+and bulk writes elsewhere must use track().
+
+rebuild_ledger() (the rebuild_payment_ledger command) recomputes the rows
+from scratch and reports the ones that had drifted, e.g. after a bulk
+write made outside the tracked paths.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from helpers.db import upsert_kwargs
+from yatra.models import YatraInstallment
+from yatra_registration.models import YatraRegistrationInstallment
+from .models import InstallmentLedger, YatraLedger
+
+# Payment.status -> ledger bucket
+BUCKETS = {
+    'verified': 'collected',
+    'under_review': 'under_review',
+    'pending': 'under_review',
+    'rejected': 'rejected',
+    'refunded': 'refunded',
+}
+LEDGER_FIELDS = [
+    f'{bucket}_{measure}'
+    for bucket in dict.fromkeys(BUCKETS.values())
+    for measure in ('count', 'amount')
+]
+
+
+def linked_totals(installments):
+    """
+    {(yatra_id, installment_id): {ledger field: value}} of the payment-linked
+    rows of `installments` (a YatraRegistrationInstallment queryset).
+    """
+    totals = defaultdict(lambda: defaultdict(int))
+    for row in (
+        installments.filter(payment__isnull=False)
+        .order_by()
+        .values('payment__status', 'installment__yatra_id', 'installment_id')
+        .annotate(count=Count('id'), amount=Sum('installment__amount'))
+    ):
+        bucket = BUCKETS[row['payment__status']]
+        fields = totals[(row['installment__yatra_id'], row['installment_id'])]
+        fields[f'{bucket}_count'] += row['count']
+        fields[f'{bucket}_amount'] += row['amount'] or 0
+    return totals
+
+
+def _difference(after, before):
+    deltas = {}
+    for key in after.keys() | before.keys():
+        fields = {
+            field: after.get(key, {}).get(field, 0) - before.get(key, {}).get(field, 0)
+            for field in LEDGER_FIELDS
+        }
+        fields = {field: value for field, value in fields.items() if value}
+        if fields:
+            deltas[key] = fields
+    return deltas
+
+
+def _add(model, lookup, fields, create):
+    changes = {field: F(field) + value for field, value in fields.items()}
+    rows = model.objects.filter(**lookup)
+    if not rows.update(updated_at=timezone.now(), **changes):
+        # First change recorded for this yatra/installment
+        model.objects.bulk_create([model(**create)], ignore_conflicts=True)
+        rows.update(updated_at=timezone.now(), **changes)
+
+
+def apply_difference(after, before):
+    """Add after - before (linked_totals() results) to the ledger rows."""
+    deltas = _difference(after, before)
+    by_yatra = defaultdict(lambda: defaultdict(int))
+    for (yatra_id, installment_id), fields in deltas.items():
+        _add(
+            InstallmentLedger, {'installment_id': installment_id}, fields,
+            {'yatra_id': yatra_id, 'installment_id': installment_id},
+        )
+        for field, value in fields.items():
+            by_yatra[yatra_id][field] += value
+    for yatra_id, fields in by_yatra.items():
+        _add(YatraLedger, {'yatra_id': yatra_id}, fields, {'yatra_id': yatra_id})
+
+
+_tracking = threading.local()
+
+
+def tracking():
+    """True inside a track() block; the payment.signals receivers leave those writes to it."""
+    return getattr(_tracking, 'depth', 0) > 0
+
+
+@contextmanager
+def track(installments):
+    """
+    Record in the ledger what the block changes about `installments` (their
+    payment links or their payments' statuses). The queryset is evaluated
+    before and after the block, so it must select the same rows both times.
+    """
+    with transaction.atomic():
+        before = linked_totals(installments)
+        _tracking.depth = getattr(_tracking, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            _tracking.depth -= 1
+        apply_difference(linked_totals(installments), before)
+
+
+def ledger_summary(yatra_id):
+    """The yatra's ledger row and its installments' rows (zeros before any payment)."""
+    yatra_row = YatraLedger.objects.filter(yatra_id=yatra_id).values(*LEDGER_FIELDS, 'updated_at').first()
+    installments = {
+        row['installment_id']: row
+        for row in InstallmentLedger.objects.filter(yatra_id=yatra_id).values('installment_id', *LEDGER_FIELDS)
+    }
+    empty = dict.fromkeys(LEDGER_FIELDS, 0)
+    return {
+        'yatra_id': str(yatra_id),
+        'totals': {**empty, **(yatra_row or {'updated_at': None})},
+        'installments': [
+            {
+                'installment_id': inst.id,
+                'label': inst.label,
+                'amount': inst.amount,
+                **{field: installments.get(inst.id, empty)[field] for field in LEDGER_FIELDS},
+            }
+            for inst in YatraInstallment.objects.filter(yatra_id=yatra_id).order_by('order', 'id')
+        ],
+    }
+
+
+def _drift(model, lookup, expected):
+    stored = model.objects.filter(**lookup).values(*LEDGER_FIELDS).first() or dict.fromkeys(LEDGER_FIELDS, 0)
+    return {
+        field: {'stored': stored[field], 'expected': expected[field]}
+        for field in LEDGER_FIELDS
+        if Decimal(stored[field]) != Decimal(expected[field])
+    }
+
+
+def rebuild_ledger(yatra_id, apply=True):
+    """
+    Recompute the yatra's ledger rows from its payment-linked installments.
+    Returns the drifted rows: [{'installment_id': id or None, 'fields': {...}}],
+    None standing for the yatra row. With apply=False only reports.
+    """
+    totals = {
+        installment_id: fields
+        for (_, installment_id), fields in linked_totals(
+            YatraRegistrationInstallment.objects.filter(installment__yatra_id=yatra_id)
+        ).items()
+    }
+    expected = {}
+    yatra_expected = dict.fromkeys(LEDGER_FIELDS, 0)
+    for installment_id in YatraInstallment.objects.filter(yatra_id=yatra_id).values_list('id', flat=True):
+        fields = {field: totals.get(installment_id, {}).get(field, 0) for field in LEDGER_FIELDS}
+        expected[installment_id] = fields
+        for field, value in fields.items():
+            yatra_expected[field] += value
+
+    drifted = []
+    for installment_id, fields in expected.items():
+        drift = _drift(InstallmentLedger, {'installment_id': installment_id}, fields)
+        if drift:
+            drifted.append({'installment_id': installment_id, 'fields': drift})
+    drift = _drift(YatraLedger, {'yatra_id': yatra_id}, yatra_expected)
+    if drift:
+        drifted.append({'installment_id': None, 'fields': drift})
+
+    if apply and drifted:
+        now = timezone.now()
+        with transaction.atomic():
+            InstallmentLedger.objects.bulk_create(
+                [
+                    InstallmentLedger(yatra_id=yatra_id, installment_id=installment_id, updated_at=now, **fields)
+                    for installment_id, fields in expected.items()
+                ],
+                **upsert_kwargs(['installment'], LEDGER_FIELDS + ['updated_at'])
+            )
+            YatraLedger.objects.bulk_create(
+                [YatraLedger(yatra_id=yatra_id, updated_at=now, **yatra_expected)],
+                **upsert_kwargs(['yatra'], LEDGER_FIELDS + ['updated_at'])
+            )
+    return drifted
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from payment.models import Payment
+from payment.proofs import process_proof
+
+
+class Command(BaseCommand):
+    help = "Normalize and hash payment proofs that have not been processed yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, batch_size, **options):
+        pending = (
+            Payment.objects
+            .filter(proof_processed_at__isnull=True)
+            .exclude(proof='')
+            .order_by('id')
+        )
+        processed, last_id = 0, None
+        while True:
+            batch = pending.filter(id__gt=last_id) if last_id else pending
+            ids = list(batch.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            for payment_id in ids:
+                processed += process_proof(payment_id)
+            last_id = ids[-1]
+        self.stdout.write(f"Processed {processed} payment proofs")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from payment.ledger import rebuild_ledger
+from yatra.models import Yatra
+
+
+class Command(BaseCommand):
+    help = "Recompute the payment ledger of yatras from their payments and report the rows that had drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("yatra_ids", nargs="*", help="Yatras to rebuild (default: all)")
+        parser.add_argument("--check", action="store_true", help="Only report drift, do not rewrite the ledger")
+
+    def handle(self, *args, yatra_ids, check, **options):
+        yatras = Yatra.objects.all()
+        if yatra_ids:
+            yatras = yatras.filter(id__in=yatra_ids)
+
+        for yatra in yatras:
+            drifted = rebuild_ledger(yatra.id, apply=not check)
+            state = "drifted" if check else "rebuilt"
+            self.stdout.write(f"{yatra.title}: {len(drifted)} ledger rows {state}")
+            for row in drifted:
+                name = row["installment_id"] or "yatra total"
+                for field, values in row["fields"].items():
+                    self.stdout.write(f"  {name} {field}: {values['stored']} -> {values['expected']}")
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payment.statements import StatementError, reconcile_statement
+from userProfile.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Match a bank/UPI statement (CSV or XLSX) against a yatra's under_review payments and verify exact matches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("yatra_id")
+        parser.add_argument("statement", help="Path to the CSV or XLSX statement")
+        parser.add_argument("--verified-by", help="Username recorded as the verifier (required unless --dry-run)")
+        parser.add_argument("--dry-run", action="store_true", help="Report matches without approving them")
+        parser.add_argument("--reference-column", help="Header of the UTR/reference column")
+        parser.add_argument("--amount-column", help="Header of the credit amount column")
+
+    def handle(self, *args, yatra_id, statement, verified_by, dry_run, reference_column, amount_column, **options):
+        profile = None
+        if not dry_run:
+            if not verified_by:
+                raise CommandError("--verified-by is required to approve payments.")
+            profile = Profile.objects.filter(user__username=verified_by).first()
+            if profile is None:
+                raise CommandError(f"No profile for user '{verified_by}'.")
+
+        with open(statement, "rb") as f:
+            try:
+                report = reconcile_statement(
+                    yatra_id, f, statement, profile, apply=not dry_run,
+                    reference_column=reference_column, amount_column=amount_column,
+                )
+            except StatementError as e:
+                raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{report['statement_rows']} statement rows: {len(report['matched'])} matched "
+            f"({report['approved']} approved), {len(report['amount_mismatch'])} amount mismatches, "
+            f"{len(report['not_found'])} not on the statement"
+        )
+        for entry in report["amount_mismatch"]:
+            amounts = ", ".join(str(a) for a in entry["statement_amounts"])
+            self.stdout.write(f"  {entry['transaction_id']}: paid {entry['amount']}, statement {amounts}")
+        for entry in report["not_found"]:
+            self.stdout.write(f"  {entry['transaction_id']}: not on the statement")
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0002_payment_verification_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='proof_original',
+            field=models.FileField(blank=True, upload_to='payment_proofs/originals/'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='proof_phash',
+            field=models.CharField(blank=True, db_index=True, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='proof_processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ProofHashBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('value', models.PositiveIntegerField()),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proof_hash_buckets', to='payment.payment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['value', 'band'], name='proofhash_bucket_idx')],
+                'unique_together': {('payment', 'band')},
+            },
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:29
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+BUCKETS = {
+    'verified': 'collected',
+    'under_review': 'under_review',
+    'pending': 'under_review',
+    'rejected': 'rejected',
+    'refunded': 'refunded',
+}
+
+
+def seed_ledger(apps, schema_editor):
+    YatraRegistrationInstallment = apps.get_model('yatra_registration', 'YatraRegistrationInstallment')
+    InstallmentLedger = apps.get_model('payment', 'InstallmentLedger')
+    YatraLedger = apps.get_model('payment', 'YatraLedger')
+
+    installments = defaultdict(lambda: defaultdict(int))
+    yatras = defaultdict(lambda: defaultdict(int))
+    rows = (
+        YatraRegistrationInstallment.objects
+        .filter(payment__isnull=False)
+        .values('payment__status', 'installment__yatra_id', 'installment_id')
+        .annotate(count=Count('id'), amount=Sum('installment__amount'))
+        .order_by()
+    )
+    for row in rows:
+        bucket = BUCKETS[row['payment__status']]
+        for totals in (installments[(row['installment__yatra_id'], row['installment_id'])],
+                       yatras[row['installment__yatra_id']]):
+            totals[f'{bucket}_count'] += row['count']
+            totals[f'{bucket}_amount'] += row['amount'] or 0
+
+    InstallmentLedger.objects.bulk_create(
+        InstallmentLedger(yatra_id=yatra_id, installment_id=installment_id, **totals)
+        for (yatra_id, installment_id), totals in installments.items()
+    )
+    YatraLedger.objects.bulk_create(
+        YatraLedger(yatra_id=yatra_id, **totals) for yatra_id, totals in yatras.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0003_payment_proof_normalization'),
+        ('yatra', '0006_yatraimportantnote_yatracontactcategory'),
+        ('yatra_registration', '0011_attendance_qr_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstallmentLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collected_count', models.IntegerField(default=0)),
+                ('collected_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('under_review_count', models.IntegerField(default=0)),
+                ('under_review_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('rejected_count', models.IntegerField(default=0)),
+                ('rejected_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refunded_count', models.IntegerField(default=0)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('installment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='yatra.yatrainstallment')),
+                ('yatra', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='installment_ledgers', to='yatra.yatra')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='YatraLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collected_count', models.IntegerField(default=0)),
+                ('collected_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('under_review_count', models.IntegerField(default=0)),
+                ('under_review_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('rejected_count', models.IntegerField(default=0)),
+                ('rejected_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refunded_count', models.IntegerField(default=0)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('yatra', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='yatra.yatra')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(seed_ledger, migrations.RunPython.noop),
+    ]
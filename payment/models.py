@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 import uuid
 from userProfile.models import *
 from yatra.models import *
@@ -40,54 +40,155 @@ class Payment(models.Model):
     processed_at  = models.DateTimeField(null=True, blank=True)
     notes = models.TextField(blank=True, null=True)
 
+    # Verification queue lease (payment.verification); expired leases are free to claim
+    claimed_by = models.ForeignKey(
+        Profile,
+        null=True,
+        blank=True,
+        related_name='+',
+        on_delete=models.SET_NULL
+    )
+    claim_expires_at = models.DateTimeField(null=True, blank=True)
+
+    # Proof normalization (payment.proofs): the uploaded file when it is kept,
+    # the 64-bit dHash of the image as hex, and when the proof was processed
+    proof_original = models.FileField(upload_to='payment_proofs/originals/', blank=True)
+    proof_phash = models.CharField(max_length=16, blank=True, db_index=True)
+    proof_processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'uploaded_at', 'id'], name='payment_queue_idx'),
+        ]
+
     def __str__(self):
         return f"Payment {self.transaction_id} - ₹{self.total_amount}"
     
+    # What approve/reject/mark_under_review save; a full save() from an instance
+    # loaded before process_proof swapped the file in would write the old proof back
+    TRANSITION_FIELDS = ["status", "processed_by", "processed_at", "notes"]
+
     def approve(self, user_profile, notes=""):
-        self.status = "verified"
-        self.processed_by = user_profile
-        self.processed_at = timezone.now()
-        self.notes = notes
-        self.save()
-
-        # mark installments as paid
-        for inst in self.installments.all():
-            inst.is_paid = True
-            inst.paid_at = timezone.now()
-            inst.verified_by = user_profile
-            inst.verified_at = timezone.now()
-            inst.save()
-            inst.registration.update_status()
+        from .ledger import track
+
+        with track(self.installments.all()):
+            self.status = "verified"
+            self.processed_by = user_profile
+            self.processed_at = timezone.now()
+            self.notes = notes
+            self.save(update_fields=self.TRANSITION_FIELDS)
+
+            # mark installments as paid
+            registrations = {}
+            for inst in self.installments.select_related('registration'):
+                inst.is_paid = True
+                inst.paid_at = timezone.now()
+                inst.verified_by = user_profile
+                inst.verified_at = timezone.now()
+                inst.save()
+                registrations[inst.registration_id] = inst.registration
+            self._update_registration_statuses(registrations)
 
     def reject(self, user_profile, notes=""):
-        self.status = "rejected"
-        self.processed_by = user_profile
-        self.processed_at = timezone.now()
-        self.notes = notes
-        self.save()
-
-        # rollback installments
-        for inst in self.installments.all():
-            inst.is_paid = False
-            inst.paid_at = None
-            inst.verified_by = user_profile
-            inst.verified_at = timezone.now()
-            inst.save()
-            inst.registration.update_status()
+        from .ledger import track
+
+        with track(self.installments.all()):
+            self.status = "rejected"
+            self.processed_by = user_profile
+            self.processed_at = timezone.now()
+            self.notes = notes
+            self.save(update_fields=self.TRANSITION_FIELDS)
+
+            # rollback installments
+            registrations = {}
+            for inst in self.installments.select_related('registration'):
+                inst.is_paid = False
+                inst.paid_at = None
+                inst.verified_by = user_profile
+                inst.verified_at = timezone.now()
+                inst.save()
+                registrations[inst.registration_id] = inst.registration
+            self._update_registration_statuses(registrations)
     
     def mark_under_review(self, user_profile, notes=""):
-        self.status = "under_review"
-        self.processed_by = None
-        self.processed_at = None
-        self.notes = notes
-        self.save()
-
-        for inst in self.installments.all():
-            inst.is_paid = False
-            inst.verified_by = None
-            inst.verified_at = None
-            inst.save()
-            inst.registration.update_status()
+        from .ledger import track
+
+        with track(self.installments.all()):
+            self.status = "under_review"
+            self.processed_by = None
+            self.processed_at = None
+            self.notes = notes
+            self.save(update_fields=self.TRANSITION_FIELDS)
+
+            registrations = {}
+            for inst in self.installments.select_related('registration'):
+                inst.is_paid = False
+                inst.verified_by = None
+                inst.verified_at = None
+                inst.save()
+                registrations[inst.registration_id] = inst.registration
+            self._update_registration_statuses(registrations)
+
+    @staticmethod
+    def _transition_fields(status, user_profile, now):
+        """(payment fields, installment fields) that approve/reject/mark_under_review write."""
+        # Any transition ends the verification lease
+        lease = {"claimed_by": None, "claim_expires_at": None}
+        if status == "verified":
+            return (
+                {"processed_by": user_profile, "processed_at": now, **lease},
+                {"is_paid": True, "paid_at": now, "verified_by": user_profile, "verified_at": now},
+            )
+        if status == "rejected":
+            return (
+                {"processed_by": user_profile, "processed_at": now, **lease},
+                {"is_paid": False, "paid_at": None, "verified_by": user_profile, "verified_at": now},
+            )
+        if status == "under_review":
+            return (
+                {"processed_by": None, "processed_at": None, **lease},
+                {"is_paid": False, "verified_by": None, "verified_at": None},
+            )
+        if status == "refunded":
+            # A refunded payment no longer pays for its installments (see yatra_registration.refunds)
+            return (
+                {"processed_by": user_profile, "processed_at": now, **lease},
+                {"is_paid": False},
+            )
+        raise ValueError(f"Unsupported payment transition: {status}")
+
+    @classmethod
+    def bulk_transition(cls, payments, status, user_profile, notes=""):
+        """
+        Set-based approve/reject/mark_under_review for a queryset of payments:
+        one UPDATE for the payments, one for their installments, then one
+        status recompute over the affected registrations. Every row gets the
+        same timestamp. Returns the number of payments transitioned.
+        """
+        from yatra_registration.models import YatraRegistration, YatraRegistrationInstallment
+        from yatra_registration.signals import registrations_changed
+        from yatra_registration.status import recompute_statuses
+        from .ledger import track
+
+        payment_fields, installment_fields = cls._transition_fields(status, user_profile, timezone.now())
+        with transaction.atomic():
+            ids = list(payments.select_for_update().values_list("id", flat=True))
+            if not ids:
+                return 0
+            installments = YatraRegistrationInstallment.objects.filter(payment_id__in=ids)
+            with track(installments):
+                cls.objects.filter(id__in=ids).update(status=status, notes=notes, **payment_fields)
+                registration_ids = set(installments.values_list("registration_id", flat=True))
+                installments.update(**installment_fields)
+
+            recompute_statuses(YatraRegistration.objects.filter(id__in=registration_ids))
+            registrations_changed(registration_ids)
+        return len(ids)
+
+    def _update_registration_statuses(self, registrations):
+        # once per registration, after all of its installments are updated
+        for registration in registrations.values():
+            registration.update_status()
         
     
     def has_add_permission(self, request):
@@ -97,4 +198,56 @@ class Payment(models.Model):
     def has_module_permission(self, request):
         return True  # Still show in admin menu
 
-    
\ No newline at end of file
+    
+
+
+class ProofHashBucket(models.Model):
+    """
+    One band of a payment proof's perceptual hash (payment.proofs). Proofs
+    whose hashes share any band value are near-duplicate candidates, so
+    lookups use the (value, band) index instead of comparing every pair.
+    """
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='proof_hash_buckets')
+    band = models.PositiveSmallIntegerField()
+    value = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('payment', 'band')
+        indexes = [
+            models.Index(fields=['value', 'band'], name='proofhash_bucket_idx'),
+        ]
+
+
+class LedgerTotals(models.Model):
+    """
+    Payment totals by payment status (payment.ledger). Each payment-linked
+    registration installment counts its installment amount once, in the
+    bucket of its payment's status.
+    """
+    collected_count = models.IntegerField(default=0)
+    collected_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    under_review_count = models.IntegerField(default=0)
+    under_review_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    rejected_count = models.IntegerField(default=0)
+    rejected_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refunded_count = models.IntegerField(default=0)
+    refunded_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class YatraLedger(LedgerTotals):
+    yatra = models.OneToOneField('yatra.Yatra', on_delete=models.CASCADE, related_name='ledger')
+
+    def __str__(self):
+        return f"Ledger of {self.yatra}"
+
+
+class InstallmentLedger(LedgerTotals):
+    yatra = models.ForeignKey('yatra.Yatra', on_delete=models.CASCADE, related_name='installment_ledgers')
+    installment = models.OneToOneField('yatra.YatraInstallment', on_delete=models.CASCADE, related_name='ledger')
+
+    def __str__(self):
+        return f"Ledger of {self.installment}"
@@ -0,0 +1,185 @@
+# payment/proofs.py
+"""
+Payment proof normalization and near-duplicate detection.
+
+process_proof() runs after a proof is uploaded: it downscales the image to
+PAYMENT_PROOF_MAX_DIMENSION, re-encodes it as a JPEG that replaces
+Payment.proof, and keeps the uploaded file as proof_original when
+PAYMENT_PROOF_KEEP_ORIGINAL is set (the file is only re-pointed, not copied).
+It also stores a 64-bit difference hash (dHash) of the image. Screenshots of
+the same payment hash to the same or nearly the same value even after
+cropping artefacts or recompression.
+
+The hash is split into HASH_BANDS bands of 8 bits stored as ProofHashBucket
+rows. Two hashes within HASH_BANDS - 1 differing bits share at least one
+band, so near_duplicates() looks up candidates through the bucket index and
+only compares those with the Hamming distance.
+
+Processing happens on a small thread pool after commit
+(process_in_background); the process_payment_proofs command handles
+backlogs.
+"""
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Payment, ProofHashBucket
+
+logger = logging.getLogger(__name__)
+
+HASH_BANDS = 8
+BAND_BITS = 64 // HASH_BANDS
+
+
+def dhash(image):
+    """64-bit difference hash: is each pixel brighter than its right neighbour, on a 9x8 grayscale thumbnail."""
+    pixels = list(image.convert('L').resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (band * BAND_BITS)) & mask for band in range(HASH_BANDS)]
+
+
+def distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def normalize_image(image):
+    """The proof as an RGB JPEG no larger than PAYMENT_PROOF_MAX_DIMENSION on either side."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    else:
+        image = image.convert('RGB')
+    image.thumbnail((settings.PAYMENT_PROOF_MAX_DIMENSION,) * 2, Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=settings.PAYMENT_PROOF_JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def process_proof(payment_id):
+    """Normalize and hash one payment's proof. Returns False when there was nothing to do."""
+    payment = Payment.objects.filter(id=payment_id).only('id', 'proof', 'proof_original').first()
+    if payment is None or not payment.proof:
+        return False
+
+    uploaded_name = payment.proof.name
+    try:
+        with payment.proof.open('rb') as f:
+            image = Image.open(f)
+            image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        # PDFs and unreadable files are left as uploaded
+        Payment.objects.filter(id=payment_id).update(proof_processed_at=timezone.now())
+        return False
+
+    value = dhash(image)
+    normalized = normalize_image(image)
+    # A name of its own, so storages that overwrite (R2) never replace the upload
+    stem = os.path.splitext(os.path.basename(uploaded_name))[0]
+    name = f"{stem}-{hashlib.sha256(normalized).hexdigest()[:12]}.jpg"
+    stored = payment.proof.storage.save(
+        payment.proof.field.generate_filename(payment, name), ContentFile(normalized),
+    )
+
+    with transaction.atomic():
+        # Another upload may have replaced the proof meanwhile; only swap the file we read
+        swapped = Payment.objects.filter(id=payment_id, proof=uploaded_name).update(
+            proof=stored,
+            proof_original=uploaded_name if settings.PAYMENT_PROOF_KEEP_ORIGINAL else '',
+            proof_phash=f"{value:016x}",
+            proof_processed_at=timezone.now(),
+        )
+        if swapped:
+            ProofHashBucket.objects.filter(payment_id=payment_id).delete()
+            ProofHashBucket.objects.bulk_create([
+                ProofHashBucket(payment_id=payment_id, band=band, value=band_value)
+                for band, band_value in enumerate(bands(value))
+            ])
+
+    if not swapped:
+        payment.proof.storage.delete(stored)
+        return False
+    if not settings.PAYMENT_PROOF_KEEP_ORIGINAL:
+        payment.proof.storage.delete(uploaded_name)
+    if payment.proof_original and payment.proof_original.name != uploaded_name:
+        # The original kept from an earlier proof of this payment
+        payment.proof_original.storage.delete(payment.proof_original.name)
+    return True
+
+
+_executor = None
+
+
+def process_in_background(payment_id):
+    """Queue process_proof on the proof worker pool (synchronously when PAYMENT_PROOF_WORKERS is 0)."""
+    global _executor
+    if not settings.PAYMENT_PROOF_WORKERS:
+        process_proof(payment_id)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(settings.PAYMENT_PROOF_WORKERS, thread_name_prefix='payment-proof')
+
+    def run():
+        try:
+            process_proof(payment_id)
+        except Exception:
+            logger.exception("Processing the proof of payment %s failed", payment_id)
+        finally:
+            connections.close_all()
+
+    _executor.submit(run)
+
+
+def near_duplicates(payments, max_distance=None):
+    """
+    {payment id: [(other payment id, transaction_id, distance), ...]} for
+    payments whose proof hash is within max_distance bits of another's.
+    One query for the whole list.
+    """
+    if max_distance is None:
+        max_distance = settings.PAYMENT_PROOF_DUPLICATE_DISTANCE
+    hashes = {p.id: p.proof_phash for p in payments if p.proof_phash}
+    if not hashes:
+        return {}
+
+    wanted = defaultdict(set)
+    for payment_id, phash in hashes.items():
+        for band, value in enumerate(bands(int(phash, 16))):
+            wanted[(band, value)].add(payment_id)
+    condition = Q()
+    for band, value in wanted:
+        condition |= Q(band=band, value=value)
+
+    found = defaultdict(dict)
+    for band, value, other_id, other_hash, transaction_id in (
+        ProofHashBucket.objects
+        .filter(condition)
+        .values_list('band', 'value', 'payment_id', 'payment__proof_phash', 'payment__transaction_id')
+    ):
+        for payment_id in wanted[(band, value)]:
+            if other_id == payment_id:
+                continue
+            bits = distance(hashes[payment_id], other_hash)
+            if bits <= max_distance:
+                found[payment_id][other_id] = (other_id, transaction_id, bits)
+    return {payment_id: sorted(others.values(), key=lambda o: o[2]) for payment_id, others in found.items()}
@@ -0,0 +1,81 @@
+# payment/signals.py
+"""
+Queue proof normalization (payment.proofs) after a proof is uploaded, and keep
+the ledger (payment.ledger) current for single-row saves and deletes of
+payments and installments made outside track().
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from yatra_registration.models import YatraRegistrationInstallment
+from .ledger import apply_difference, linked_totals, tracking
+from .models import Payment
+from .proofs import process_in_background
+
+
+@receiver(pre_save, sender=Payment)
+def payment_snapshot(sender, instance, update_fields=None, **kwargs):
+    # One query per save, shared by the proof and ledger receivers; None for new payments
+    instance._stored = None
+    instance._ledger_before = None
+    if instance._state.adding:
+        return
+    status_saved = not tracking() and (update_fields is None or 'status' in update_fields)
+    proof_saved = update_fields is None or 'proof' in update_fields
+    if status_saved or proof_saved:
+        instance._stored = Payment.objects.filter(pk=instance.pk).values('status', 'proof').first()
+    if status_saved and instance._stored is not None and instance._stored['status'] != instance.status:
+        instance._ledger_before = linked_totals(instance.installments.all())
+
+
+@receiver(post_save, sender=Payment)
+def payment_proof_uploaded(sender, instance, created, update_fields=None, **kwargs):
+    # Any save that writes a new proof name, including a full save() from the admin
+    stored = getattr(instance, '_stored', None)
+    proof_saved = created or update_fields is None or 'proof' in update_fields
+    if proof_saved and instance.proof and (stored is None or stored['proof'] != instance.proof.name):
+        payment_id = instance.id
+        transaction.on_commit(lambda: process_in_background(payment_id))
+
+
+# ---------------------------------------------------------------------
+# Ledger
+# ---------------------------------------------------------------------
+@receiver(post_save, sender=Payment)
+def payment_ledger_saved(sender, instance, **kwargs):
+    before = getattr(instance, '_ledger_before', None)
+    if before is not None:
+        instance._ledger_before = None
+        apply_difference(linked_totals(instance.installments.all()), before)
+
+
+@receiver(pre_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    # The installments are unlinked (SET_NULL) during the delete
+    apply_difference({}, linked_totals(instance.installments.all()))
+
+
+def _installment_totals(instance):
+    return linked_totals(YatraRegistrationInstallment.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_save, sender=YatraRegistrationInstallment)
+def installment_ledger_snapshot(sender, instance, **kwargs):
+    instance._ledger_before = None
+    if not tracking():
+        instance._ledger_before = {} if instance._state.adding else _installment_totals(instance)
+
+
+@receiver(post_save, sender=YatraRegistrationInstallment)
+def installment_ledger_saved(sender, instance, **kwargs):
+    before = getattr(instance, '_ledger_before', None)
+    if before is not None:
+        instance._ledger_before = None
+        apply_difference(_installment_totals(instance) if instance.payment_id else {}, before)
+
+
+@receiver(pre_delete, sender=YatraRegistrationInstallment)
+def installment_deleted(sender, instance, **kwargs):
+    if instance.payment_id and not tracking():
+        apply_difference({}, _installment_totals(instance))
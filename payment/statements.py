@@ -0,0 +1,171 @@
+# payment/statements.py
+"""
+Bank / UPI statement reconciliation.
+
+read_statement() streams the credit rows of a CSV or XLSX statement
+(csv.reader / openpyxl read-only mode, one row in memory at a time) as
+(row number, reference, amount) tuples. References are normalized the same
+way as Payment.transaction_id (references()), so "UTR 4123-5678 9012" and
+"412356789012" match. The statement's reference column is found by its
+header; statements without one have the 12-digit UTR pulled out of the
+narration.
+
+reconcile_statement() indexes the statement by (reference, amount), checks
+every under_review payment of a yatra against the index in one pass and
+approves the exact matches with one Payment.bulk_transition(). Everything
+else stays under_review for the verification queue and is listed in the
+report: a reference found with a different amount, or a reference not on
+the statement.
+"""
+import csv
+import io
+import re
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+import openpyxl
+
+from .models import Payment
+
+REFERENCE_HEADERS = ('utr', 'utr no', 'utr number', 'rrn', 'reference', 'reference no', 'ref no',
+                     'ref no./cheque no.', 'transaction id', 'txn id', 'upi ref no')
+AMOUNT_HEADERS = ('credit', 'credit amount', 'deposit', 'deposit amt.', 'deposits', 'amount', 'cr')
+NARRATION_HEADERS = ('narration', 'description', 'particulars', 'remarks', 'details')
+
+UTR_PATTERN = re.compile(r'(?<!\d)\d{12}(?!\d)')
+
+
+class StatementError(ValueError):
+    pass
+
+
+def normalize_reference(value):
+    return re.sub(r'[^0-9A-Z]', '', str(value or '').upper())
+
+
+def references(value):
+    """The normalized reference plus any 12-digit UTR inside it ("UTR-4123 4567 8903" -> ..., "412345678903")."""
+    reference = normalize_reference(value)
+    if not reference:
+        return []
+    return [reference] + [utr for utr in UTR_PATTERN.findall(reference) if utr != reference]
+
+
+def parse_amount(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        amount = Decimal(str(value))
+    else:
+        try:
+            amount = Decimal(re.sub(r'[^0-9.\-]', '', str(value)) or 'x')
+        except InvalidOperation:
+            return None
+    return amount.quantize(Decimal('0.01')) if amount > 0 else None
+
+
+def _rows(file, filename):
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        text = file if isinstance(file, io.TextIOBase) else io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        yield from csv.reader(text)
+
+
+def _column(header, names, override=None):
+    labels = [str(cell or '').strip().lower() for cell in header]
+    wanted = [override.strip().lower()] if override else names
+    for name in wanted:
+        if name in labels:
+            return labels.index(name)
+    return None
+
+
+def read_statement(file, filename, reference_column=None, amount_column=None):
+    """
+    Yield (row number, normalized reference, amount) for every credit row.
+    The header is the first row naming an amount column (banks put account
+    details above the table).
+    """
+    rows = _rows(file, filename)
+    for number, header in enumerate(rows, start=1):
+        amount_at = _column(header, AMOUNT_HEADERS, amount_column)
+        if amount_at is not None:
+            break
+    else:
+        raise StatementError("No amount/credit column found in the statement.")
+    reference_at = _column(header, REFERENCE_HEADERS, reference_column)
+    narration_at = _column(header, NARRATION_HEADERS)
+    if reference_at is None and narration_at is None:
+        raise StatementError("No reference (UTR) or narration column found in the statement.")
+
+    for number, row in enumerate(rows, start=number + 1):
+        if len(row) <= amount_at:
+            continue
+        amount = parse_amount(row[amount_at])
+        if amount is None:
+            continue
+        found = []
+        if reference_at is not None and reference_at < len(row):
+            found += references(row[reference_at])
+        if narration_at is not None and narration_at < len(row) and row[narration_at]:
+            found += UTR_PATTERN.findall(str(row[narration_at]))
+        for reference in dict.fromkeys(found):
+            yield number, reference, amount
+
+
+def reconcile_statement(yatra_id, file, filename, user_profile, apply=True, **columns):
+    """
+    Match a statement against the yatra's under_review payments. With
+    apply=True the exact matches are verified. Returns the report dict.
+    """
+    index = {}
+    amounts = defaultdict(set)
+    rows = 0
+    for number, reference, amount in read_statement(file, filename, **columns):
+        index.setdefault((reference, amount), number)
+        amounts[reference].add(amount)
+        rows += 1
+
+    matched, amount_mismatch, not_found = [], [], []
+    payments = (
+        Payment.objects
+        .filter(status='under_review', installments__registration__yatra_id=yatra_id)
+        .distinct()
+        .values_list('id', 'transaction_id', 'total_amount')
+    )
+    claimed_rows = set()
+    for payment_id, transaction_id, total_amount in payments:
+        entry = {'id': str(payment_id), 'transaction_id': transaction_id, 'amount': total_amount}
+        candidates = references(transaction_id)
+        row = next(
+            (index[key] for key in ((r, total_amount) for r in candidates)
+             if key in index and index[key] not in claimed_rows),
+            None,
+        )
+        known = [r for r in candidates if r in amounts]
+        if row is not None:
+            claimed_rows.add(row)
+            matched.append({**entry, 'statement_row': row})
+        elif known:
+            amount_mismatch.append({**entry, 'statement_amounts': sorted(amounts[known[0]])})
+        else:
+            not_found.append(entry)
+
+    approved = 0
+    if apply and matched:
+        approved = Payment.bulk_transition(
+            Payment.objects.filter(id__in=[m['id'] for m in matched], status='under_review'),
+            'verified', user_profile, f"Matched bank statement {filename}",
+        )
+    return {
+        'statement_rows': rows,
+        'matched': matched,
+        'approved': approved,
+        'amount_mismatch': amount_mismatch,
+        'not_found': not_found,
+    }
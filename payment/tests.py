@@ -1,3 +1,485 @@
-from django.test import TestCase
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from helpers.instrumentation.testing import assert_view_query_budget
+from helpers.testing import TemporaryMediaMixin, YatraTestCase, client_for, make_profile, make_staff, make_yatra
+from yatra_registration.models import YatraRegistration, YatraRegistrationInstallment
+from yatra_registration.status import recompute_statuses
+from .ledger import LEDGER_FIELDS, ledger_summary, rebuild_ledger
+from .models import InstallmentLedger, Payment, ProofHashBucket
+from .proofs import BAND_BITS, HASH_BANDS, bands, dhash, near_duplicates, process_proof
+from .statements import StatementError, parse_amount, read_statement, reconcile_statement, references
+from .verification import claim_batch, claimed, queue, release
+from .views import BatchPaymentProofView
+
+
+class PaymentTestCase(YatraTestCase):
+    """Registered mentees (installments A and B selected) and a staff verifier."""
+
+    def setUp(self):
+        super().setUp()
+        self.staff = make_staff()
+        self.approve()
+        self.register(labels=("A", "B"))
+
+    def statuses(self):
+        return dict(YatraRegistration.objects.values_list('registered_for_id', 'status'))
+
+    def transition(self, status, *transaction_ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.bulk_transition(
+                Payment.objects.filter(transaction_id__in=transaction_ids), status, self.staff, "checked",
+            )
+
+
+class BatchPaymentProofTests(PaymentTestCase):
+    def linked(self):
+        return {
+            (row[0], row[1]): row[2:]
+            for row in YatraRegistrationInstallment.objects.values_list(
+                'registration__registered_for_id', 'installment__label', 'id', 'payment__transaction_id',
+            )
+        }
+
+    def test_links_the_selected_installments_in_place(self):
+        first, second, _ = self.mentees
+        before = self.linked()
+        response = self.pay("T1", [first, second], labels=("A", "B"))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["linked_installments"], 4)
+
+        after = self.linked()
+        self.assertEqual(after.keys(), before.keys())
+        self.assertEqual({key: row[0] for key, row in after.items()}, {key: row[0] for key, row in before.items()})
+        self.assertEqual(after[(first.id, "A")][1], "T1")
+        self.assertIsNone(after[(self.mentees[2].id, "A")][1])
+
+        # A second proof relinks the same row instead of adding one
+        self.pay("T2", [first], labels=("A",))
+        relinked = self.linked()
+        self.assertEqual(len(relinked), len(before))
+        self.assertEqual(relinked[(first.id, "A")], (before[(first.id, "A")][0], "T2"))
+        self.assertEqual(relinked[(first.id, "B")][1], "T1")
+
+    def test_skips_unknown_and_foreign_profiles(self):
+        other_yatra = make_yatra(title="Mayapur Yatra")
+        foreign = make_profile("foreign")
+        YatraRegistration.objects.create(yatra=other_yatra, registered_for=foreign, registered_by=foreign)
+        stranger = make_profile("stranger")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/payments/{self.yatra.id}/batch-payment-proof/",
+                {
+                    "transaction_id": "T1",
+                    "total_amount": "3000",
+                    "registration_installments": [
+                        {"profile_id": str(self.mentees[0].id), "installments": ["A", "Z"]},
+                        {"profile_id": str(self.mentees[1].id), "installments": ["Z"]},
+                        {"profile_id": str(foreign.id), "installments": ["A"]},
+                        {"profile_id": str(stranger.id), "installments": ["A"]},
+                        {"profile_id": str(uuid.uuid4()), "installments": ["A"]},
+                    ],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["linked_installments"], 1)
+        self.assertEqual(
+            list(YatraRegistrationInstallment.objects.filter(payment__isnull=False).values_list(
+                'registration__registered_for_id', 'installment__label',
+            )),
+            [(self.mentees[0].id, "A")],
+        )
+        self.assertFalse(YatraRegistrationInstallment.objects.filter(registration__yatra=other_yatra).exists())
+
+    def test_recomputes_each_registration_once(self):
+        first, second, third = self.mentees
+        YatraRegistration.objects.filter(registered_for=first).update(status='pending')
+        versions = dict(YatraRegistration.objects.values_list('registered_for_id', 'status_version'))
+
+        with mock.patch('payment.views.recompute_statuses', wraps=recompute_statuses) as recompute:
+            self.pay("T1", [first, second], labels=("A", "B"))
+        recompute.assert_called_once()
+        self.assertEqual(
+            set(recompute.call_args.args[0].values_list('registered_for_id', flat=True)),
+            {first.id, second.id},
+        )
+        self.assertEqual(self.statuses(), {first.id: 'partial', second.id: 'partial', third.id: 'partial'})
+        self.assertEqual(
+            dict(YatraRegistration.objects.values_list('registered_for_id', 'status_version')),
+            {**versions, first.id: versions[first.id] + 1},
+        )
+
+    def test_query_budget_with_40_mentees(self):
+        new = self.add_mentees(37)
+        self.approve(new)
+        self.register(new, labels=("A", "B"))
+        with assert_view_query_budget(BatchPaymentProofView, 'POST'):
+            response = self.pay("T1", self.mentees, labels=("A", "B"))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["linked_installments"], 80)
+
+
+class BulkTransitionTests(PaymentTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pay("T1", self.mentees[:1], labels=("A", "B"))
+        self.pay("T2", self.mentees[1:2], labels=("A",))
+        self.installments = YatraRegistrationInstallment.objects.filter(payment__isnull=False)
+
+    def test_verified(self):
+        Payment.objects.update(claimed_by=self.staff, claim_expires_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(self.transition("verified", "T1", "T2"), 2)
+
+        self.assertEqual(
+            set(Payment.objects.values_list('status', 'processed_by', 'notes', 'claimed_by', 'claim_expires_at')),
+            {("verified", self.staff.id, "checked", None, None)},
+        )
+        self.assertEqual(set(self.installments.values_list('is_paid', 'verified_by')), {(True, self.staff.id)})
+        first, second, third = self.mentees
+        self.assertEqual(self.statuses(), {first.id: 'paid', second.id: 'partial', third.id: 'partial'})
+
+    def test_rejected_and_back_under_review(self):
+        self.transition("verified", "T1")
+        self.transition("rejected", "T1")
+        self.assertEqual(set(self.installments.filter(payment__transaction_id="T1").values_list(
+            'is_paid', 'paid_at', 'verified_by',
+        )), {(False, None, self.staff.id)})
+        # A payment is still attached, so the registration stays partial
+        self.assertEqual(self.statuses()[self.mentees[0].id], 'partial')
+
+        self.transition("under_review", "T1")
+        self.assertEqual(Payment.objects.get(transaction_id="T1").processed_by, None)
+        self.assertEqual(set(self.installments.values_list('verified_by', flat=True)), {None})
+
+    def test_matches_the_per_payment_methods(self):
+        self.transition("verified", "T1")
+        Payment.objects.get(transaction_id="T2").approve(self.staff)
+        rows = {
+            row[0]: row[1:]
+            for row in self.installments.values_list('payment__transaction_id', 'is_paid', 'verified_by', 'payment__status')
+        }
+        self.assertEqual(rows["T1"], rows["T2"])
+
+    def test_leaves_registrations_with_a_decided_status_alone(self):
+        YatraRegistration.objects.filter(registered_for=self.mentees[0]).update(status='cancelled')
+        self.transition("verified", "T1")
+        self.assertEqual(self.statuses()[self.mentees[0].id], 'cancelled')
+
+    def test_unknown_status_and_empty_selection(self):
+        with self.assertRaises(ValueError):
+            self.transition("pending", "T1")
+        self.assertEqual(self.transition("verified", "missing"), 0)
+
+
+class VerificationLeaseTests(PaymentTestCase):
+    def setUp(self):
+        super().setUp()
+        for i, mentee in enumerate(self.mentees):
+            self.pay(f"T{i}", [mentee])
+        self.other = make_staff("other_staff")
+        self.ids = list(Payment.objects.order_by('uploaded_at', 'id').values_list('id', flat=True))
+
+    def test_verifiers_get_disjoint_batches_oldest_first(self):
+        mine = claim_batch(self.staff, 2)
+        theirs = claim_batch(self.other, 2)
+        self.assertEqual(mine, self.ids[:2])
+        self.assertEqual(theirs, self.ids[2:])
+        # Claiming again renews the same payments instead of taking more
+        self.assertEqual(sorted(claim_batch(self.staff, 2)), sorted(mine))
+        self.assertEqual(set(queue(self.other).values_list('id', flat=True)), set(theirs))
+
+    def test_expired_lease_can_be_claimed_by_someone_else(self):
+        mine = claim_batch(self.staff, 1)
+        Payment.objects.filter(id__in=mine).update(claim_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(claimed(self.staff).exists())
+        self.assertEqual(claim_batch(self.other, 1), mine)
+
+        # The first verifier's decision on the lost lease is skipped
+        client = client_for(self.staff)
+        response = client.post("/payments/verification/decide/", {
+            "payment_ids": [str(mine[0])], "action": "approve",
+        }, format="json")
+        self.assertEqual(response.data, {"decided": [], "skipped": [str(mine[0])]})
+        self.assertEqual(Payment.objects.get(id=mine[0]).status, "under_review")
+
+    def test_decision_and_release_end_the_lease(self):
+        mine = claim_batch(self.staff, 3)
+        client = client_for(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/payments/verification/decide/", {
+                "payment_ids": [str(mine[0])], "action": "reject",
+            }, format="json")
+        self.assertEqual(response.data["decided"], [str(mine[0])])
+        self.assertEqual(release(self.other, mine), 0)
+        self.assertEqual(release(self.staff, mine[1:]), 2)
+        self.assertEqual(claim_batch(self.other, 3), mine[1:])
+
+
+def screenshot(size=(600, 1200)):
+    """A synthetic payment screenshot: bands of text-like blocks on a gradient."""
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        top = 60 + i * 90
+        draw.rectangle((40, top, 80 + (i * 37) % 480, top + 40), fill=(20 * i % 255, 40, 120))
+    return image
+
+
+class ProofHashTests(TemporaryMediaMixin, PaymentTestCase):
+    mentee_count = 1
+
+    def make_payment(self, transaction_id, phash=None):
+        payment = Payment.objects.create(
+            transaction_id=transaction_id, total_amount=3000, uploaded_by=self.mentor, proof_phash=phash or '',
+        )
+        if phash:
+            ProofHashBucket.objects.bulk_create([
+                ProofHashBucket(payment=payment, band=band, value=value)
+                for band, value in enumerate(bands(int(phash, 16)))
+            ])
+        return payment
+
+    def test_bands_split_the_hash(self):
+        value = 0x0123456789abcdef
+        self.assertEqual(sum(band << (i * BAND_BITS) for i, band in enumerate(bands(value))), value)
+        # One bit flipped in each of HASH_BANDS - 1 bands still leaves one band equal
+        other = value
+        for band in range(HASH_BANDS - 1):
+            other ^= 1 << (band * BAND_BITS)
+        shared = [a == b for a, b in zip(bands(value), bands(other))]
+        self.assertEqual(shared.count(True), 1)
+
+    def test_recompressed_screenshot_hashes_nearly_the_same(self):
+        original = screenshot()
+        buffer = BytesIO()
+        original.resize((450, 900)).save(buffer, 'JPEG', quality=40)
+        recompressed = Image.open(BytesIO(buffer.getvalue()))
+        different = screenshot().transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+
+        self.assertLessEqual(bin(dhash(original) ^ dhash(recompressed)).count('1'), 4)
+        self.assertGreater(bin(dhash(original) ^ dhash(different)).count('1'), 16)
+
+    def test_near_duplicates_through_the_buckets(self):
+        base = 0x0f0f0f0f0f0f0f0f
+        original = self.make_payment("P1", f"{base:016x}")
+        close = self.make_payment("P2", f"{base ^ 0b10101:016x}")
+        far = self.make_payment("P3", f"{~base & (2 ** 64 - 1):016x}")
+        unhashed = self.make_payment("P4")
+
+        with self.assertNumQueries(1):
+            found = near_duplicates([original, close, far, unhashed])
+        self.assertEqual(found, {
+            original.id: [(close.id, "P2", 3)],
+            close.id: [(original.id, "P1", 3)],
+        })
+        self.assertEqual(near_duplicates([original], max_distance=2), {})
+
+    @override_settings(PAYMENT_PROOF_KEEP_ORIGINAL=True)
+    def test_process_proof_normalizes_and_buckets(self):
+        buffer = BytesIO()
+        screenshot(size=(2000, 4000)).save(buffer, 'PNG')
+        payment = self.make_payment("P1")
+        payment.proof.save("shot.png", ContentFile(buffer.getvalue()))
+
+        self.assertTrue(process_proof(payment.id))
+        payment.refresh_from_db()
+        self.assertTrue(payment.proof.name.endswith('.jpg'))
+        self.assertEqual(payment.proof_original.name, payment.proof.name.rsplit('/', 1)[0] + '/shot.png')
+        with payment.proof.open('rb') as f:
+            self.assertEqual(max(Image.open(f).size), 1600)
+        self.assertEqual(
+            sorted(ProofHashBucket.objects.filter(payment=payment).values_list('band', 'value')),
+            list(enumerate(bands(int(payment.proof_phash, 16)))),
+        )
+
+
+    def test_proof_replaced_by_a_full_save_is_processed(self):
+        payment = self.make_payment("P1")
+        with mock.patch('payment.signals.process_in_background') as queued:
+            with self.captureOnCommitCallbacks(execute=True):
+                payment.proof = SimpleUploadedFile("replaced.png", b"png")
+                payment.save()
+            queued.assert_called_once_with(payment.id)
+
+            queued.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                payment.notes = "checked"
+                payment.save()
+            queued.assert_not_called()
+
+    def test_decisions_keep_a_proof_processed_meanwhile(self):
+        payment = self.make_payment("P1")
+        payment.proof.save("decided.png", ContentFile(b"png"))
+        for decide in ("approve", "reject", "mark_under_review"):
+            with self.subTest(decide):
+                stale = Payment.objects.get(id=payment.id)
+                Payment.objects.filter(id=payment.id).update(proof=f"payment_proofs/{decide}.jpg")
+                getattr(stale, decide)(self.staff)
+                payment.refresh_from_db()
+                self.assertEqual(payment.proof.name, f"payment_proofs/{decide}.jpg")
+                self.assertEqual(payment.status, stale.status)
+
+class StatementTests(PaymentTestCase):
+    STATEMENT = (
+        "Account statement,,\n"
+        "Account,1234,\n"
+        "Date,Narration,Ref No,Credit\n"
+        "01/10,UPI/412345678901/mentee,412345678901,3000.00\n"
+        "02/10,UPI/998877665544/mentee,,\"6,500.00\"\n"
+        "03/10,NEFT ABCD,UTR-5555 6666 7777,3500\n"
+        "04/10,ATM withdrawal,,\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        first, second, third = self.mentees
+        for transaction_id, profile, amount in (
+            ("UTR 4123-4567-8901", first, "3000"),
+            ("998877665544", second, "6000"),
+            ("111122223333", third, "3000"),
+        ):
+            self.pay(transaction_id, [profile])
+            Payment.objects.filter(transaction_id=transaction_id).update(total_amount=amount)
+
+    def reconcile(self, apply=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            return reconcile_statement(
+                self.yatra.id, BytesIO(self.STATEMENT.encode()), "statement.csv", self.staff, apply=apply,
+            )
+
+    def test_references_and_amounts(self):
+        self.assertEqual(references("UTR 4123-5678 9012"), ["UTR412356789012", "412356789012"])
+        self.assertEqual(references(" 412356789012 "), ["412356789012"])
+        self.assertEqual(parse_amount("₹ 6,500.5"), Decimal("6500.50"))
+        self.assertIsNone(parse_amount("-20"))
+
+    def test_reads_credit_rows_below_the_preamble(self):
+        rows = list(read_statement(BytesIO(self.STATEMENT.encode()), "statement.csv"))
+        self.assertEqual(rows, [
+            (4, "412345678901", Decimal("3000.00")),
+            (5, "998877665544", Decimal("6500.00")),
+            (6, "UTR555566667777", Decimal("3500.00")),
+            (6, "555566667777", Decimal("3500.00")),
+        ])
+
+    def test_reads_xlsx(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        for row in (["UTR No", "Deposits"], ["412345678901", 3000], ["", None]):
+            sheet.append(row)
+        buffer = BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        self.assertEqual(list(read_statement(buffer, "statement.xlsx")), [(2, "412345678901", Decimal("3000.00"))])
+
+    def test_matches_reference_and_amount(self):
+        report = self.reconcile()
+        self.assertEqual(report['statement_rows'], 4)
+        self.assertEqual([(m['transaction_id'], m['statement_row']) for m in report['matched']],
+                         [("UTR 4123-4567-8901", 4)])
+        self.assertEqual(report['approved'], 1)
+        self.assertEqual([(m['transaction_id'], m['statement_amounts']) for m in report['amount_mismatch']],
+                         [("998877665544", [Decimal("6500.00")])])
+        self.assertEqual([m['transaction_id'] for m in report['not_found']], ["111122223333"])
+        self.assertEqual(
+            dict(Payment.objects.values_list('transaction_id', 'status')),
+            {"UTR 4123-4567-8901": "verified", "998877665544": "under_review", "111122223333": "under_review"},
+        )
+
+    def test_dry_run_changes_nothing(self):
+        report = self.reconcile(apply=False)
+        self.assertEqual((len(report['matched']), report['approved']), (1, 0))
+        self.assertFalse(Payment.objects.filter(status='verified').exists())
+
+    def test_statement_without_amount_column(self):
+        with self.assertRaises(StatementError):
+            list(read_statement(BytesIO(b"Date,Narration\n01/10,x\n"), "statement.csv"))
+
+
+class LedgerTests(PaymentTestCase):
+    def setUp(self):
+        super().setUp()
+        first, second, _ = self.mentees
+        self.pay("T1", [first, second], labels=("A",))
+        self.pay("T2", [first], labels=("B",))
+        self.labels = dict(self.yatra.installments.values_list('id', 'label'))
+
+    def ledger(self):
+        summary = ledger_summary(self.yatra.id)
+        nonzero = lambda row: {field: row[field] for field in LEDGER_FIELDS if row[field]}
+        return nonzero(summary['totals']), {i['label']: nonzero(i) for i in summary['installments']}
+
+    def test_linking_counts_under_review(self):
+        totals, installments = self.ledger()
+        self.assertEqual(totals, {'under_review_count': 3, 'under_review_amount': Decimal("9500")})
+        self.assertEqual(installments, {
+            "A": {'under_review_count': 2, 'under_review_amount': Decimal("6000")},
+            "B": {'under_review_count': 1, 'under_review_amount': Decimal("3500")},
+        })
+
+    def test_transitions_move_rows_between_buckets(self):
+        self.transition("verified", "T1")
+        self.transition("rejected", "T2")
+        totals, installments = self.ledger()
+        self.assertEqual(installments, {
+            "A": {'collected_count': 2, 'collected_amount': Decimal("6000")},
+            "B": {'rejected_count': 1, 'rejected_amount': Decimal("3500")},
+        })
+        self.transition("refunded", "T1")
+        self.assertEqual(self.ledger()[1]["A"], {'refunded_count': 2, 'refunded_amount': Decimal("6000")})
+        self.assertEqual(rebuild_ledger(self.yatra.id, apply=False), [])
+
+    def test_rebuild_reports_and_fixes_drift(self):
+        InstallmentLedger.objects.filter(installment__label="A").update(under_review_count=7)
+        drifted = rebuild_ledger(self.yatra.id)
+        self.assertEqual(
+            [(self.labels.get(d['installment_id']), d['fields']) for d in drifted],
+            [("A", {'under_review_count': {'stored': 7, 'expected': 2}})],
+        )
+        self.assertEqual(self.ledger()[1]["A"]['under_review_count'], 2)
+        self.assertEqual(rebuild_ledger(self.yatra.id), [])
+
+    def test_admin_edits_and_deletes_update_the_ledger(self):
+        # The admin change forms save() the edited instance (ModelAdmin.save_model)
+        installment = YatraRegistrationInstallment.objects.get(
+            registration__registered_for=self.mentees[0], installment__label="A",
+        )
+        installment.payment = Payment.objects.get(transaction_id="T2")
+        installment.save()
+        payment = Payment.objects.get(transaction_id="T2")
+        payment.status = "verified"
+        payment.save()
+        self.assertEqual(self.ledger()[1], {
+            "A": {'under_review_count': 1, 'under_review_amount': Decimal("3000"),
+                  'collected_count': 1, 'collected_amount': Decimal("3000")},
+            "B": {'collected_count': 1, 'collected_amount': Decimal("3500")},
+        })
+
+        installment.delete()
+        YatraRegistration.objects.get(registered_for=self.mentees[1]).delete()
+        self.assertEqual(self.ledger()[1], {"A": {}, "B": {'collected_count': 1, 'collected_amount': Decimal("3500")}})
+        self.assertEqual(rebuild_ledger(self.yatra.id, apply=False), [])
+
+    def test_per_payment_methods_count_once(self):
+        Payment.objects.get(transaction_id="T1").approve(self.staff)
+        self.assertEqual(self.ledger()[1]["A"], {'collected_count': 2, 'collected_amount': Decimal("6000")})
+        self.assertEqual(rebuild_ledger(self.yatra.id, apply=False), [])
+
+    def test_ledger_view(self):
+        self.transition("verified", "T2")
+        response = client_for(self.staff).get(f"/payments/{self.yatra.id}/ledger/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['collected_amount'], Decimal("3500"))
+        self.assertEqual([i['label'] for i in response.data['installments']], ["A", "B"])
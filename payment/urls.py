@@ -6,9 +6,14 @@ from .views import *
 
 urlpatterns = [
     path('<uuid:yatra_id>/batch-payment-proof/', BatchPaymentProofView.as_view(), name='batch-payment-proof'),
+    path('<uuid:yatra_id>/ledger/', PaymentLedgerView.as_view(), name='payment-ledger'),
+    path('<uuid:yatra_id>/statement-reconcile/', PaymentStatementReconcileView.as_view(), name='payment-statement-reconcile'),
     path(
             '<uuid:payment_id>/upload-screenshot/',
             UploadPaymentScreenshotView.as_view(),
             name='upload-payment-screenshot'
-        )
+        ),
+    path('verification/queue/', PaymentVerificationQueueView.as_view(), name='payment-verification-queue'),
+    path('verification/release/', PaymentVerificationReleaseView.as_view(), name='payment-verification-release'),
+    path('verification/decide/', PaymentVerificationDecisionView.as_view(), name='payment-verification-decide'),
 ]
\ No newline at end of file
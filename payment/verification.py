@@ -0,0 +1,144 @@
+# payment/verification.py
+"""
+Verification queue over under_review payments.
+
+Verifiers claim a batch of payments and hold it for
+PAYMENT_VERIFICATION_LEASE_SECONDS. Claiming selects the oldest unclaimed
+payments with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent verifiers get
+disjoint batches without waiting on each other. A lease is only a
+timestamp: once claim_expires_at passes the payment is claimable again, with
+no cleanup job. Deciding a payment (Payment.bulk_transition) ends its lease.
+
+queue_items() turns a page of payments into queue entries with their
+installments and registrations, read in one query, and the other payments
+whose proof looks the same (payment.proofs.near_duplicates, one more query).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Payment
+from .proofs import near_duplicates
+
+QUEUE_ORDERINGS = {'uploaded_at': ('uploaded_at', 'id')}
+
+
+def _unclaimed(now):
+    return Q(claim_expires_at__isnull=True) | Q(claim_expires_at__lte=now)
+
+
+def queue(profile):
+    """under_review payments the profile can work on: unclaimed, expired or its own."""
+    return (
+        Payment.objects
+        .filter(status='under_review')
+        .filter(_unclaimed(timezone.now()) | Q(claimed_by=profile))
+        .select_related('uploaded_by', 'claimed_by')
+    )
+
+
+def claimed(profile):
+    """Payments the profile currently holds a lease on."""
+    return Payment.objects.filter(
+        status='under_review', claimed_by=profile, claim_expires_at__gt=timezone.now(),
+    )
+
+
+def claim_batch(profile, size):
+    """
+    Top the profile's claims up to `size` payments and extend all of them by a
+    fresh lease. Returns the ids the profile now holds.
+    """
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.PAYMENT_VERIFICATION_LEASE_SECONDS)
+    with transaction.atomic():
+        held = list(claimed(profile).values_list('id', flat=True))
+        wanted = size - len(held)
+        if wanted > 0:
+            held += list(
+                Payment.objects
+                .filter(_unclaimed(now), status='under_review')
+                .order_by('uploaded_at', 'id')
+                .select_for_update(skip_locked=True)
+                .values_list('id', flat=True)[:wanted]
+            )
+        Payment.objects.filter(id__in=held).update(claimed_by=profile, claim_expires_at=expires_at)
+    return held
+
+
+def release(profile, payment_ids):
+    """Give back claimed payments before their lease runs out. Returns how many were released."""
+    return (
+        Payment.objects
+        .filter(id__in=payment_ids, claimed_by=profile)
+        .update(claimed_by=None, claim_expires_at=None)
+    )
+
+
+def _name(first_name, last_name):
+    return f"{first_name or ''} {last_name or ''}".strip()
+
+
+def queue_items(payments, request=None):
+    """Queue entries for a list of payments (select_related uploaded_by/claimed_by)."""
+    from yatra_registration.models import YatraRegistrationInstallment
+
+    registrations = defaultdict(dict)
+    for row in (
+        YatraRegistrationInstallment.objects
+        .filter(payment_id__in=[p.id for p in payments])
+        .order_by('registration_id', 'installment__order')
+        .values(
+            'id', 'payment_id', 'registration_id', 'is_paid',
+            label=F('installment__label'),
+            amount=F('installment__amount'),
+            yatra=F('registration__yatra__title'),
+            registration_status=F('registration__status'),
+            first_name=F('registration__registered_for__first_name'),
+            last_name=F('registration__registered_for__last_name'),
+            member_id=F('registration__registered_for__member_id'),
+        )
+    ):
+        registration = registrations[row['payment_id']].setdefault(row['registration_id'], {
+            'id': str(row['registration_id']),
+            'yatra': row['yatra'],
+            'name': _name(row['first_name'], row['last_name']),
+            'member_id': row['member_id'],
+            'status': row['registration_status'],
+            'installments': [],
+        })
+        registration['installments'].append({
+            'id': str(row['id']),
+            'label': row['label'],
+            'amount': row['amount'],
+            'is_paid': row['is_paid'],
+        })
+
+    duplicates = near_duplicates(payments)
+    items = []
+    for payment in payments:
+        linked = list(registrations[payment.id].values())
+        proof_url = payment.proof.url if payment.proof else None
+        items.append({
+            'id': str(payment.id),
+            'transaction_id': payment.transaction_id,
+            'total_amount': payment.total_amount,
+            'installments_amount': sum(
+                (i['amount'] or 0 for r in linked for i in r['installments']), 0
+            ),
+            'proof_url': request.build_absolute_uri(proof_url) if request and proof_url else proof_url,
+            'uploaded_by': _name(payment.uploaded_by.first_name, payment.uploaded_by.last_name),
+            'uploaded_at': payment.uploaded_at,
+            'claimed_by': str(payment.claimed_by_id) if payment.claimed_by_id else None,
+            'claim_expires_at': payment.claim_expires_at,
+            'registrations': linked,
+            'possible_duplicates': [
+                {'id': str(other_id), 'transaction_id': transaction_id, 'distance': bits}
+                for other_id, transaction_id, bits in duplicates.get(payment.id, [])
+            ],
+        })
+    return items
@@ -1,7 +1,7 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view,permission_classes,authentication_classes
@@ -18,6 +18,13 @@ import logging
 from rest_framework import status, permissions
 from django.db import connection
 from django.http import JsonResponse
+from helpers.db import upsert_kwargs
+from helpers.pagination import InvalidPageRequest, KeysetPaginator
+from yatra_registration.signals import registrations_changed
+from yatra_registration.status import recompute_statuses
+from .ledger import ledger_summary, track
+from .statements import StatementError, reconcile_statement
+from .verification import QUEUE_ORDERINGS, claim_batch, claimed, queue, queue_items, release
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +33,7 @@ class BatchPaymentProofView(APIView):
     Creates a Payment entry and links it to multiple YatraRegistrationInstallments.
     """
     permission_classes = [IsAuthenticated]
+    query_budget = {'POST': 36}
 
     @transaction.atomic
     def post(self, request, yatra_id):
@@ -63,55 +71,61 @@ class BatchPaymentProofView(APIView):
         # else:
         #     logger.warning(f"Reused existing Payment: id={payment.id}, txn={payment.transaction_id}")
 
-        linked_count = 0
-
-        # --- Step 2: Iterate through each registration group ---
+        # --- Step 2: Resolve every registration and installment with one query each ---
+        labels_by_profile = {}
         for reg_item in data["registration_installments"]:
-            profile_id = reg_item["profile_id"]
-            installment_labels = reg_item["installments"]
-            logger.debug(f"Processing profile_id={profile_id} with installments={installment_labels}")
-
-            # ✅ Fetch the Profile instance first
-            try:
-                profile = Profile.objects.get(id=profile_id)
-            except Profile.DoesNotExist:
-                logger.error(f"Profile not found for id={profile_id}, skipping.")
-                continue
+            labels_by_profile.setdefault(reg_item["profile_id"], set()).update(reg_item["installments"])
+        logger.debug(f"Linking installments by profile: {labels_by_profile}")
 
-            # ✅ Then fetch registration for this profile and yatra
-            try:
-                registration = YatraRegistration.objects.get(
-                    registered_for=profile,
-                    yatra_id=yatra_id
-                )
-            except YatraRegistration.DoesNotExist:
-                logger.error(f"No registration found for profile={profile_id} and yatra={yatra_id}, skipping.")
-                continue
-
-            # ✅ Fetch installments matching the given labels
-            installments = YatraInstallment.objects.filter(
+        registrations = dict(
+            YatraRegistration.objects
+            .filter(yatra_id=yatra_id, registered_for_id__in=labels_by_profile.keys())
+            .values_list("registered_for_id", "id")
+        )
+        installments = {
+            inst.label: inst
+            for inst in YatraInstallment.objects.filter(
                 yatra_id=yatra_id,
-                label__in=installment_labels
+                label__in=set().union(*labels_by_profile.values()),
             )
-            if not installments.exists():
-                logger.warning(f"No matching installments found for labels={installment_labels} in yatra={yatra_id}")
-                continue
+        }
 
-            for inst in installments:
-                reg_inst, created = YatraRegistrationInstallment.objects.get_or_create(
-                    registration=registration,
+        links = []
+        for profile_id, installment_labels in labels_by_profile.items():
+            registration_id = registrations.get(profile_id)
+            if registration_id is None:
+                logger.error(f"No registration found for profile={profile_id} and yatra={yatra_id}, skipping.")
+                continue
+            matched = [installments[label] for label in installment_labels if label in installments]
+            if not matched:
+                logger.warning(f"No matching installments found for labels={sorted(installment_labels)} in yatra={yatra_id}")
+                continue
+            for inst in matched:
+                links.append(YatraRegistrationInstallment(
+                    registration_id=registration_id,
                     installment=inst,
-                )
-                reg_inst.payment = payment
-                reg_inst.verified_by = None
-                reg_inst.verified_at = None
-                reg_inst.save()
-                reg_inst.registration.update_status()
-                linked_count += 1
+                    payment=payment,
+                ))
                 logger.info(
                     f"Linked installment '{inst.label}' (₹{inst.amount}) "
-                    f"to registration={registration.id}, payment={payment.id}"
+                    f"to registration={registration_id}, payment={payment.id}"
+                )
+
+        # --- Step 3: Upsert and link the installments, then recompute the statuses once ---
+        linked_count = len(links)
+        if links:
+            registration_ids = {link.registration_id for link in links}
+            with track(YatraRegistrationInstallment.objects.filter(
+                registration_id__in=registration_ids,
+                installment_id__in={link.installment_id for link in links},
+            )):
+                YatraRegistrationInstallment.objects.bulk_create(
+                    links,
+                    **upsert_kwargs(['registration', 'installment'], ['payment', 'verified_by', 'verified_at'])
                 )
+            # bulk writes skip signals; refresh the affected registrations explicitly
+            recompute_statuses(YatraRegistration.objects.filter(id__in=registration_ids))
+            registrations_changed(registration_ids)
 
         logger.info(f"Finished linking {linked_count} installments to Payment {payment.id}")
 
@@ -144,3 +158,126 @@ class UploadPaymentScreenshotView(APIView):
             "proof_url": request.build_absolute_uri(payment.proof.url)
         })
 
+
+
+class PaymentVerificationQueueView(APIView):
+    """
+    GET  /payments/verification/queue/?cursor=&page_size=
+         under_review payments that are unclaimed, expired or claimed by you,
+         oldest first (keyset paginated).
+    POST /payments/verification/queue/  {"size": 20}
+         Claim payments up to `size` and renew your lease; returns the
+         payments you hold.
+    """
+    permission_classes = [IsAdminUser]
+    # see helpers.instrumentation; one page query plus one installments query
+    query_budget = {'GET': 6, 'POST': 10}
+
+    def get(self, request):
+        try:
+            paginator = KeysetPaginator(request, QUEUE_ORDERINGS, 'uploaded_at', default_page_size=25, max_page_size=100)
+        except InvalidPageRequest as e:
+            return Response({'error': str(e)}, status=400)
+        payments = paginator.paginate(queue(request.user.profile))
+        return Response({
+            'results': queue_items(payments, request),
+            'next_cursor': paginator.next_cursor,
+        })
+
+    def post(self, request):
+        try:
+            size = int(request.data.get('size', 20))
+        except (TypeError, ValueError):
+            return Response({'error': 'size must be a number'}, status=400)
+        size = max(1, min(size, 100))
+
+        profile = request.user.profile
+        held = claim_batch(profile, size)
+        payments = list(
+            Payment.objects.filter(id__in=held)
+            .select_related('uploaded_by', 'claimed_by')
+            .order_by('uploaded_at', 'id')
+        )
+        return Response({'results': queue_items(payments, request)})
+
+
+class PaymentVerificationReleaseView(APIView):
+    """
+    POST /payments/verification/release/  {"payment_ids": [...]}
+    Give back claimed payments without deciding them.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        payment_ids = request.data.get('payment_ids') or []
+        released = release(request.user.profile, payment_ids)
+        return Response({'released': released})
+
+
+class PaymentVerificationDecisionView(APIView):
+    """
+    POST /payments/verification/decide/
+    Expects: {"payment_ids": [...], "action": "approve" | "reject", "notes": ""}
+    Only payments you hold an unexpired lease on are decided; the rest are
+    returned under "skipped".
+    """
+    permission_classes = [IsAdminUser]
+    ACTIONS = {'approve': 'verified', 'reject': 'rejected'}
+
+    def post(self, request):
+        action = request.data.get('action')
+        if action not in self.ACTIONS:
+            return Response({'error': "action must be 'approve' or 'reject'"}, status=400)
+        payment_ids = [str(pid) for pid in request.data.get('payment_ids') or []]
+
+        profile = request.user.profile
+        held = claimed(profile).filter(id__in=payment_ids)
+        decided = {str(pid) for pid in held.values_list('id', flat=True)}
+        Payment.bulk_transition(held, self.ACTIONS[action], profile, request.data.get('notes', ''))
+        return Response({
+            'decided': sorted(decided),
+            'skipped': [pid for pid in payment_ids if pid not in decided],
+        })
+
+
+class PaymentStatementReconcileView(APIView):
+    """
+    POST /payments/<yatra_id>/statement-reconcile/   (multipart, staff only)
+    Fields: statement (CSV/XLSX file), dry_run ("true" to only report),
+            reference_column / amount_column (optional header overrides).
+    Verifies the under_review payments of the yatra found on the statement
+    with the same amount; the rest stay in the verification queue and are
+    listed under "amount_mismatch" and "not_found".
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request, yatra_id):
+        statement = request.FILES.get("statement")
+        if not statement:
+            return Response({"error": "No statement file provided."}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get("dry_run", "")).lower() in ("1", "true", "yes")
+
+        try:
+            report = reconcile_statement(
+                yatra_id, statement.file, statement.name, request.user.profile, apply=not dry_run,
+                reference_column=request.data.get("reference_column") or None,
+                amount_column=request.data.get("amount_column") or None,
+            )
+        except StatementError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+
+class PaymentLedgerView(APIView):
+    """
+    GET /payments/<yatra_id>/ledger/   (staff only)
+    Collected, under review, rejected and refunded totals (count and amount)
+    of the yatra and of each of its installments, read from the ledger.
+    """
+    permission_classes = [IsAdminUser]
+    query_budget = {'GET': 4}
+
+    def get(self, request, yatra_id):
+        get_object_or_404(Yatra, id=yatra_id)
+        return Response(ledger_summary(yatra_id))
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import UploadSession
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'purpose', 'owner', 'filename', 'size', 'offset', 'status', 'created_at')
+    list_filter = ('purpose', 'status')
+    list_select_related = ('owner',)
+    readonly_fields = ('chunks', 'stored_name', 'created_at')
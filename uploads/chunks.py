@@ -0,0 +1,234 @@
+# uploads/chunks.py
+"""
+Resumable chunked uploads.
+
+A client opens a session with the file's size and SHA-256, then sends the
+file as consecutive chunks, each with the offset it starts at and its own
+SHA-256. Every chunk is written to storage as a separate object when it
+arrives, so a request never holds more than one chunk in memory and a
+dropped connection loses only the chunk in flight: the client reads the
+session's offset and continues from there.
+
+After the last chunk, the chunks are streamed in order into the final file
+(one storage.save() fed by a reader that opens the chunk objects one after
+another) while the whole-file SHA-256 is computed, and the file is attached
+to its target (uploads.targets). The request that stored the last chunk and
+an empty "finish" request may both get there; only the one that moves the
+session from uploading to assembling with a conditional UPDATE assembles the
+file, the other gets the finished result (or a retryable 409 meanwhile). Chunks live under UPLOAD_CHUNK_PREFIX in the
+default storage, so every app server sees them; purge_expired() removes the
+leftovers of abandoned sessions.
+"""
+import hashlib
+import io
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UploadSession
+from .targets import TARGETS, resolve
+
+logger = logging.getLogger(__name__)
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class UploadNotFound(UploadError):
+    status = 404
+
+
+class OffsetMismatch(UploadError):
+    status = 409
+
+    def __init__(self, offset):
+        super().__init__(f"Expected a chunk at offset {offset}.")
+        self.offset = offset
+
+
+class UploadClosed(UploadError):
+    status = 410
+
+
+class UploadAssembling(UploadError):
+    status = 409
+
+    def __init__(self):
+        super().__init__("The file is being assembled; repeat the empty request at the final offset shortly.")
+
+
+def open_session(owner, purpose, filename, size, sha256, content_type='', target_id=None):
+    if purpose not in TARGETS:
+        raise UploadError(f"Unknown upload purpose '{purpose}'.")
+    if size <= 0 or size > settings.UPLOAD_MAX_BYTES:
+        raise UploadError(f"File size must be between 1 and {settings.UPLOAD_MAX_BYTES} bytes.")
+    if resolve(purpose, owner, target_id) is None:
+        raise UploadNotFound("Upload target not found.")
+    return UploadSession.objects.create(
+        owner=owner,
+        purpose=purpose,
+        target_id=target_id,
+        filename=filename,
+        content_type=content_type,
+        size=size,
+        sha256=sha256.lower(),
+        expires_at=timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL),
+    )
+
+
+def _chunk_name(session, offset):
+    return f"{settings.UPLOAD_CHUNK_PREFIX}/{session.id}/{offset:012d}"
+
+
+def append_chunk(session, offset, data, checksum, request=None):
+    """
+    Store one chunk. Returns the attach() result of the target once the last
+    chunk completed the file, None otherwise. Raises UploadError.
+    """
+    if offset == session.size and not data:
+        # The last chunk was stored but its request died before the file was
+        # assembled, or is still assembling it
+        return _complete(session, request)
+    if session.status != 'uploading' or session.expires_at <= timezone.now():
+        raise UploadClosed("This upload is no longer accepting chunks.")
+    if offset != session.offset:
+        raise OffsetMismatch(session.offset)
+    if not data or len(data) > settings.UPLOAD_CHUNK_MAX_BYTES or offset + len(data) > session.size:
+        raise UploadError(f"Chunks must be 1 to {settings.UPLOAD_CHUNK_MAX_BYTES} bytes and end within the file.")
+    if hashlib.sha256(data).hexdigest() != (checksum or '').lower():
+        raise UploadError("Chunk checksum does not match.")
+
+    name = default_storage.save(_chunk_name(session, offset), io.BytesIO(data))
+    # Only the request that still sees the expected offset may append
+    advanced = UploadSession.objects.filter(id=session.id, offset=offset, status='uploading').update(
+        offset=offset + len(data), chunks=session.chunks + [name],
+    )
+    if not advanced:
+        default_storage.delete(name)
+        session.refresh_from_db(fields=['offset', 'status'])
+        raise OffsetMismatch(session.offset)
+
+    session.offset += len(data)
+    session.chunks = session.chunks + [name]
+    if session.offset < session.size:
+        return None
+    return _complete(session, request)
+
+
+class _ChunkReader(io.RawIOBase):
+    """Reads the stored chunks back to back, hashing what it reads."""
+
+    def __init__(self, names):
+        self._names = iter(names)
+        self._current = None
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self._current is None:
+                name = next(self._names, None)
+                if name is None:
+                    return 0
+                self._current = default_storage.open(name, 'rb')
+            data = self._current.read(len(buffer))
+            if data:
+                buffer[:len(data)] = data
+                self.digest.update(data)
+                return len(data)
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+        super().close()
+
+
+def _complete(session, request=None):
+    # Only one request assembles the file
+    claimed = UploadSession.objects.filter(
+        id=session.id, status='uploading', offset=session.size, expires_at__gt=timezone.now(),
+    ).update(status='assembling')
+    if not claimed:
+        return _finished(session, request)
+    session.status = 'assembling'
+
+    target = TARGETS[session.purpose]
+    instance = resolve(session.purpose, session.owner, session.target_id)
+    if instance is None:
+        _fail(session, "upload target disappeared")
+        raise UploadNotFound("Upload target not found.")
+
+    reader = _ChunkReader(session.chunks)
+    field = target.field(instance)
+    name = field.field.generate_filename(instance, session.filename)
+    with io.BufferedReader(reader) as stream:
+        stored = default_storage.save(name, File(stream, name=session.filename))
+
+    if reader.digest.hexdigest() != session.sha256:
+        default_storage.delete(stored)
+        _fail(session, "checksum mismatch")
+        raise UploadError("File checksum does not match; start a new upload.")
+
+    with transaction.atomic():
+        result = target.attach(instance, stored, request)
+        UploadSession.objects.filter(id=session.id).update(status='complete', stored_name=stored, chunks=[])
+    _delete_chunks(session.chunks)
+    session.status, session.stored_name = 'complete', stored
+    return result
+
+
+def _finished(session, request=None):
+    """What a request that did not claim the assembly gets, from the session's current state."""
+    session.refresh_from_db(fields=['status', 'offset', 'chunks', 'stored_name', 'expires_at'])
+    if session.status == 'complete':
+        instance = resolve(session.purpose, session.owner, session.target_id)
+        if instance is None:
+            raise UploadNotFound("Upload target not found.")
+        return TARGETS[session.purpose].result(instance, request)
+    if session.status == 'assembling':
+        raise UploadAssembling()
+    if session.status == 'uploading' and session.offset != session.size:
+        raise OffsetMismatch(session.offset)
+    raise UploadClosed("This upload is no longer accepting chunks.")
+
+
+def _fail(session, reason):
+    logger.warning("Upload %s failed: %s", session.id, reason)
+    UploadSession.objects.filter(id=session.id).update(status='failed', chunks=[])
+    _delete_chunks(session.chunks)
+    session.status = 'failed'
+
+
+def _delete_chunks(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except Exception:
+            logger.exception("Could not delete upload chunk %s", name)
+
+
+def purge_expired(batch_size=500):
+    """Delete the chunks of expired unfinished sessions and the sessions. Returns how many were purged."""
+    purged = 0
+    while True:
+        sessions = list(
+            UploadSession.objects
+            .filter(status__in=('uploading', 'assembling', 'failed'), expires_at__lte=timezone.now())
+            .only('id', 'chunks')[:batch_size]
+        )
+        if not sessions:
+            return purged
+        for session in sessions:
+            _delete_chunks(session.chunks)
+        UploadSession.objects.filter(id__in=[s.id for s in sessions]).delete()
+        purged += len(sessions)
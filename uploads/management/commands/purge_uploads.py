@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from uploads.chunks import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired, unfinished upload sessions and their stored chunks."
+
+    def handle(self, *args, **options):
+        purged = purge_expired()
+        self.stdout.write(f"Purged {purged} upload sessions")
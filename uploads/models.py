@@ -0,0 +1,46 @@
+import uuid
+
+from django.db import models
+from userProfile.models import Profile
+
+
+class UploadSession(models.Model):
+    """
+    A resumable upload in progress (uploads.chunks). Each received chunk is
+    stored as its own object; `chunks` lists their storage names in order and
+    `offset` is the number of bytes received so far.
+    """
+    PURPOSE_CHOICES = [
+        ('payment_proof', 'Payment proof'),
+        ('profile_picture', 'Profile picture'),
+    ]
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('assembling', 'Assembling'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='upload_sessions')
+    purpose = models.CharField(max_length=32, choices=PURPOSE_CHOICES)
+    # The object the file is attached to, when the purpose needs one (the Payment of a proof)
+    target_id = models.UUIDField(null=True, blank=True)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    offset = models.PositiveBigIntegerField(default=0)
+    chunks = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='uploading')
+    stored_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='upload_status_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_purpose_display()} upload {self.id} ({self.offset}/{self.size})"
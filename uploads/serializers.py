@@ -0,0 +1,18 @@
+from rest_framework import serializers
+
+from .models import UploadSession
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    purpose = serializers.ChoiceField(choices=UploadSession.PURPOSE_CHOICES)
+    target_id = serializers.UUIDField(required=False, allow_null=True)
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    size = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'purpose', 'target_id', 'filename', 'size', 'offset', 'status', 'expires_at']
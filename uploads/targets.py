@@ -0,0 +1,69 @@
+# uploads/targets.py
+"""
+What a finished upload is attached to, per UploadSession.purpose.
+
+Each target checks on session creation that the owner may upload for it,
+names the FileField the file goes into, attaches the stored file and
+describes the attached file in the response.
+"""
+from django.core.exceptions import ObjectDoesNotExist
+
+from payment.models import Payment
+
+
+class PaymentProofTarget:
+    needs_target_id = True
+
+    def get(self, owner, target_id):
+        return Payment.objects.get(id=target_id, uploaded_by=owner)
+
+    def field(self, instance):
+        return instance.proof
+
+    def attach(self, instance, name, request=None):
+        instance.proof.name = name
+        instance.save(update_fields=['proof'])
+        return self.result(instance, request)
+
+    def result(self, instance, request=None):
+        url = instance.proof.url
+        return {'proof_url': request.build_absolute_uri(url) if request else url}
+
+
+class ProfilePictureTarget:
+    needs_target_id = False
+
+    def get(self, owner, target_id):
+        return owner
+
+    def field(self, instance):
+        return instance.profile_picture
+
+    def attach(self, instance, name, request=None):
+        # Remove old image if exists
+        if instance.profile_picture:
+            instance.profile_picture.delete(save=False)
+        instance.profile_picture.name = name
+        instance.save(update_fields=['profile_picture'])
+        return self.result(instance, request)
+
+    def result(self, instance, request=None):
+        url = instance.profile_picture.url
+        return {'profile_picture_url': request.build_absolute_uri(url) if request else url}
+
+
+TARGETS = {
+    'payment_proof': PaymentProofTarget(),
+    'profile_picture': ProfilePictureTarget(),
+}
+
+
+def resolve(purpose, owner, target_id):
+    """The instance a session uploads into, or None when the owner may not upload for it."""
+    target = TARGETS[purpose]
+    if target.needs_target_id and target_id is None:
+        return None
+    try:
+        return target.get(owner, target_id)
+    except ObjectDoesNotExist:
+        return None
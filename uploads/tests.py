@@ -0,0 +1,116 @@
+import hashlib
+import io
+
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from helpers.testing import TemporaryMediaMixin, client_for, make_profile
+from .chunks import UploadAssembling, append_chunk
+from .models import UploadSession
+
+CONTENT = b"resumable upload content!"
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@override_settings(UPLOAD_CHUNK_MAX_BYTES=10)
+class ChunkedUploadTests(TemporaryMediaMixin, TestCase):
+    def setUp(self):
+        self.profile = make_profile("uploader")
+        self.client = client_for(self.profile)
+        response = self.client.post("/uploads/", {
+            "purpose": "profile_picture", "filename": "me.jpg",
+            "size": len(CONTENT), "sha256": sha256(CONTENT),
+        }, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.session_id = response.data["id"]
+
+    def patch(self, offset, data, checksum=None):
+        return self.client.generic(
+            "PATCH", f"/uploads/{self.session_id}/", data,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_UPLOAD_CHECKSUM=f"sha256 {checksum or sha256(data)}",
+        )
+
+    def session(self):
+        return UploadSession.objects.get(id=self.session_id)
+
+    def upload(self, until=len(CONTENT)):
+        for offset in range(0, until, 10):
+            response = self.patch(offset, CONTENT[offset:min(offset + 10, until)])
+        return response
+
+    def test_chunks_are_assembled_into_the_target_file(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["status"], "complete")
+        self.assertIn("profile_picture_url", response.data)
+
+        session = self.session()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.profile_picture.name, session.stored_name)
+        with default_storage.open(session.stored_name) as f:
+            self.assertEqual(f.read(), CONTENT)
+        self.assertEqual(session.chunks, [])
+        self.assertEqual(default_storage.listdir(f"upload_chunks/{session.id}")[1], [])
+
+    def test_wrong_offset_gets_the_expected_one(self):
+        self.patch(0, CONTENT[:10])
+        for offset in (0, 15):
+            response = self.patch(offset, CONTENT[offset:offset + 5])
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.data["offset"], 10)
+        self.assertEqual(self.session().offset, 10)
+
+    def test_bad_chunk_checksum_is_rejected(self):
+        response = self.patch(0, CONTENT[:10], checksum=sha256(b"other"))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.session().offset, 0)
+
+    def test_bad_file_checksum_fails_the_session(self):
+        UploadSession.objects.filter(id=self.session_id).update(sha256=sha256(b"other"))
+        response = self.upload()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.session().status, "failed")
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.profile_picture)
+
+    def test_finish_request_after_a_dropped_last_chunk(self):
+        self.upload(until=20)
+        # The last chunk was stored but its request died before assembling the file
+        session = self.session()
+        name = default_storage.save(f"upload_chunks/{session.id}/{20:012d}", io.BytesIO(CONTENT[20:]))
+        UploadSession.objects.filter(id=session.id).update(offset=len(CONTENT), chunks=session.chunks + [name])
+
+        response = self.patch(len(CONTENT), b"")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["status"], "complete")
+        with default_storage.open(self.session().stored_name) as f:
+            self.assertEqual(f.read(), CONTENT)
+
+    def test_finish_request_losing_to_the_last_chunk_gets_its_result(self):
+        finished = self.upload()
+        stored_name = self.session().stored_name
+
+        response = self.patch(len(CONTENT), b"")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["status"], "complete")
+        self.assertEqual(response.data["profile_picture_url"], finished.data["profile_picture_url"])
+        # Not assembled a second time
+        self.assertEqual(self.session().stored_name, stored_name)
+
+    def test_finish_request_while_another_assembles(self):
+        self.upload(until=20)
+        session = self.session()
+        self.patch(20, CONTENT[20:])
+        UploadSession.objects.filter(id=session.id).update(status="assembling", stored_name="")
+
+        # A request that loaded the session before the claim does not assemble again
+        session.offset = len(CONTENT)
+        with self.assertRaises(UploadAssembling):
+            append_chunk(session, len(CONTENT), b"", None)
+        self.assertEqual(self.patch(len(CONTENT), b"").status_code, 409)
+        self.assertEqual(self.session().status, "assembling")
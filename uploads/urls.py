@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .views import UploadSessionCreateView, UploadSessionView
+
+urlpatterns = [
+    path('', UploadSessionCreateView.as_view(), name='upload-session-create'),
+    path('<uuid:session_id>/', UploadSessionView.as_view(), name='upload-session'),
+]
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .chunks import OffsetMismatch, UploadError, append_chunk, open_session
+from .models import UploadSession
+from .serializers import UploadSessionCreateSerializer, UploadSessionSerializer
+
+
+class UploadSessionCreateView(APIView):
+    """
+    POST /uploads/
+    Start a resumable upload (see uploads.chunks).
+    Expects: {
+        "purpose": "payment_proof" | "profile_picture",
+        "target_id": "<payment id>",          # payment_proof only
+        "filename": "proof.jpg", "content_type": "image/jpeg",
+        "size": 1234567, "sha256": "<hex digest of the whole file>"
+    }
+    Returns the session with its id, offset (0) and the largest chunk accepted.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = UploadSessionCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            session = open_session(request.user.profile, **serializer.validated_data)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status)
+        return Response({
+            **UploadSessionSerializer(session).data,
+            "chunk_size": settings.UPLOAD_CHUNK_MAX_BYTES,
+        }, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    """
+    GET   /uploads/<id>/  → the session; "offset" is where the next chunk starts.
+    PATCH /uploads/<id>/  raw chunk bytes (application/octet-stream) with headers
+          Upload-Offset: <offset of the first byte>
+          Upload-Checksum: sha256 <hex digest of the chunk>
+    A chunk at the wrong offset gets 409 with the expected offset. The response
+    to the last chunk carries the attached file's URL. After a failed last
+    request, an empty PATCH at the final offset finishes the file (409 while
+    another request is still assembling it, the URL once it is attached).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id):
+        session = get_object_or_404(UploadSession, id=session_id, owner=request.user.profile)
+        return Response(UploadSessionSerializer(session).data)
+
+    def patch(self, request, session_id):
+        session = get_object_or_404(UploadSession, id=session_id, owner=request.user.profile)
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+        except ValueError:
+            return Response({"error": "Upload-Offset header is required."}, status=status.HTTP_400_BAD_REQUEST)
+        algorithm, _, checksum = request.headers.get("Upload-Checksum", "").partition(" ")
+        if algorithm.lower() != "sha256":
+            return Response({"error": "Upload-Checksum must be 'sha256 <hex digest>'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            attached = append_chunk(session, offset, request.body, checksum.strip(), request)
+        except OffsetMismatch as e:
+            return Response({"error": str(e), "offset": e.offset}, status=e.status)
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status)
+
+        return Response({**UploadSessionSerializer(session).data, **(attached or {})})
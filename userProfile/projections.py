@@ -0,0 +1,62 @@
+# userProfile/projections.py
+"""
+values()-based read paths for hot list endpoints.
+
+These return plain dicts with the same keys and values as the matching
+serializer, without building model instances or serializer fields per row.
+"""
+from django.db.models import F
+
+from .models import Profile
+
+_profile_picture_storage = Profile._meta.get_field('profile_picture').storage
+
+
+def _picture_url(name):
+    return _profile_picture_storage.url(name) if name else None
+
+
+def dashboard_profiles(profile_ids):
+    """
+    ProfileFastSerializer output for profile_ids, in one query.
+    Returns a list of dicts (ids are UUIDs, dob a date; the renderer encodes them).
+    """
+    rows = (
+        Profile.objects
+        .filter(id__in=profile_ids)
+        .values(
+            'id', 'member_id', 'user_type', 'first_name', 'last_name', 'dob',
+            'gender', 'mobile', 'center', 'is_initiated', 'initiated_name',
+            'no_of_chanting_rounds', 'profile_picture', 'mentor_id',
+            email=F('user__email'),
+            mentor_member_id=F('mentor__member_id'),
+            mentor_first_name=F('mentor__first_name'),
+            mentor_last_name=F('mentor__last_name'),
+        )
+    )
+
+    return [
+        {
+            'id': row['id'],
+            'member_id': row['member_id'],
+            'user_type': row['user_type'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'full_name': f"{row['first_name'] or ''} {row['last_name'] or ''}".strip(),
+            'dob': row['dob'],
+            'gender': row['gender'],
+            'mobile': row['mobile'],
+            'email': row['email'],
+            'center': row['center'],
+            'mentor_member_id': row['mentor_member_id'],
+            'mentor_name': (
+                f"{row['mentor_first_name'] or ''} {row['mentor_last_name'] or ''}".strip()
+                if row['mentor_id'] else None
+            ),
+            'is_initiated': row['is_initiated'],
+            'initiated_name': row['initiated_name'],
+            'no_of_chanting_rounds': row['no_of_chanting_rounds'],
+            'profile_picture': _picture_url(row['profile_picture']),
+        }
+        for row in rows
+    ]
@@ -1,3 +1,42 @@
+import json
+
+from django.core.files.base import ContentFile
 from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from helpers.instrumentation.testing import assert_view_query_budget
+from helpers.testing import TemporaryMediaMixin, YatraTestCase, make_profile
+from .models import MentorRequest
+from .projections import dashboard_profiles
+from .serializers import ProfileFastSerializer
+from .views import MentorRequestView
+
+
+class MentorRequestBudgetTests(YatraTestCase):
+    mentee_count = 2
+
+    def test_get_within_budget_for_any_number_of_mentees(self):
+        for size in (2, 15):
+            with self.subTest(mentees=size):
+                self.add_mentees(size - len(self.mentees), prefix=f"m{size}_")
+                pending = make_profile(f"pending{size}")
+                MentorRequest.objects.create(from_user=pending, to_mentor=self.mentor, is_approved=False)
+                with assert_view_query_budget(MentorRequestView, 'GET'):
+                    response = self.client.get("/api/mentor/requests/")
+                self.assertEqual(response.status_code, 200)
+
+
+class DashboardProfilesTests(TemporaryMediaMixin, TestCase):
+    def test_matches_the_fast_serializer(self):
+        mentor = make_profile("mentor", last_name=None)
+        mentee = make_profile("mentee", mentor=mentor)
+        pictured = make_profile("pictured", last_name="")
+        pictured.profile_picture.save("face.png", ContentFile(b"png"))
 
-# Create your tests here.
+        projected = {row['id']: row for row in dashboard_profiles([mentor.id, mentee.id, pictured.id])}
+        for profile in (mentor, mentee, pictured):
+            with self.subTest(profile=profile.user.username):
+                self.assertEqual(
+                    json.loads(JSONRenderer().render(projected[profile.id])),
+                    json.loads(JSONRenderer().render(ProfileFastSerializer(profile).data)),
+                )
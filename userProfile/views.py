@@ -138,6 +138,8 @@ class MentorRequestView(APIView):
     - Includes stats
     """
     permission_classes = [IsAuthenticated]
+    # see helpers.instrumentation; includes token auth
+    query_budget = {'GET': 4}
 
     def get(self, request):
         mentor_profile = request.user.profile
@@ -148,7 +150,7 @@ class MentorRequestView(APIView):
         approved_requests = MentorRequest.objects.filter(
             to_mentor=mentor_profile,
             is_approved=True
-        ).select_related('from_user__user')
+        ).select_related('from_user__user', 'from_user__mentor')
 
         approved_mentees_data = [
             ProfileFastSerializer(req.from_user, context={'request': request}).data
@@ -161,7 +163,7 @@ class MentorRequestView(APIView):
         pending_requests = MentorRequest.objects.filter(
             to_mentor=mentor_profile,
             is_approved=False
-        ).select_related('from_user__user')
+        ).select_related('from_user__user', 'from_user__mentor')
 
         pending_requests_data = [
             {
@@ -33,6 +33,7 @@ class YatraSerializer(serializers.ModelSerializer):
     installments = YatraInstallmentSerializer(many=True, read_only=True)
     contact_categories  = YatraContactCategorySerializer(many=True, read_only=True)
     important_notes = YatraImportantNoteSerializer(many=True,read_only=True)
+    remaining_seats = serializers.SerializerMethodField()
 
     class Meta:
         model = Yatra
@@ -45,8 +46,14 @@ class YatraSerializer(serializers.ModelSerializer):
             'accept_full_payment_only_date',
             'contact_categories',
             'important_notes',
+            'remaining_seats',
         ]
 
+    def get_remaining_seats(self, obj):
+        # Read from the seat counter row (select_related('seat_counter') in list views)
+        from yatra_registration.admission import remaining_seats
+        return remaining_seats(obj)
+
 class AccommodationSerializer(serializers.ModelSerializer):
     class Meta:
         model = YatraAccommodation
@@ -45,7 +45,7 @@ class YatraListView(APIView):
     
 
     def get(self, request):
-        yatras = Yatra.objects.all()
+        yatras = Yatra.objects.select_related('seat_counter')
         serializer = YatraSerializer(yatras, many=True)
         return Response(serializer.data)
 
@@ -144,6 +144,48 @@ class YatraEligibilityAdmin(admin.ModelAdmin):
         return True  # Still show in admin menu
 
 
+@admin.register(YatraWaitlistEntry)
+class YatraWaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('yatra', 'profile', 'requested_by', 'created_at')
+    list_filter = ('yatra',)
+    search_fields = ('profile__first_name', 'profile__last_name', 'yatra__title')
+    list_select_related = ('yatra', 'profile', 'requested_by')
+    ordering = ('yatra', 'id')
+
+    def has_add_permission(self, request):
+        return False
+
+
+class RefundItemInline(admin.TabularInline):
+    model = RefundItem
+    fields = ('registration', 'verified_amount', 'refund_amount', 'transaction_ids')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RefundBatch)
+class RefundBatchAdmin(admin.ModelAdmin):
+    """Batches are created by the refund engine (yatra_registration.refunds), never edited."""
+    list_display = ('yatra', 'created_at', 'created_by', 'registrations_count', 'payments_refunded', 'total_amount', 'payout_file')
+    list_filter = ('yatra',)
+    list_select_related = ('yatra', 'created_by')
+    ordering = ('-created_at',)
+    inlines = [RefundItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 class RegistrationAccommodationInline(admin.TabularInline):
     model = RegistrationAccommodation
     extra = 0
@@ -425,12 +467,15 @@ class YatraRegistrationAdmin(admin.ModelAdmin):
         if not event or event.count == 0:
             return "0"
 
+        # recent_downloads is bounded; see yatra_registration.rcs_downloads.rollup
         times = [
             timezone.localtime(
                 timezone.datetime.fromisoformat(ts)
             ).strftime("%d %b %Y %H:%M")
-            for ts in reversed(event.timestamps)
+            for ts in event.recent_downloads
         ]
+        if event.count > len(times):
+            times.append(f"… {event.count - len(times)} more")
         tooltip_html= "HISTORY\n──────────\n" + "\n".join(times)
         last = timezone.localtime(event.last_downloaded_at).strftime(
             "%d %b %Y %H:%M"
@@ -14,6 +14,7 @@ from .models import (
     YatraRegistration, RegistrationAccommodation,
     RegistrationJourney, RegistrationCustomFieldValue
 )
+from .signals import registrations_changed
 
 
 @staff_member_required
@@ -80,6 +81,7 @@ def bulk_edit_view(request, yatra_id):
         cf_val_objs = YatraCustomFieldValue.objects.filter(id__in=new_cf_val_ids)
         cf_val_map = {str(c.id): c for c in cf_val_objs}
 
+        changed_reg_ids = []
         with transaction.atomic():
             for reg in target_regs:
                 changed = False
@@ -235,6 +237,10 @@ def bulk_edit_view(request, yatra_id):
 
                 if changed:
                     updated += 1
+                    changed_reg_ids.append(reg.id)
+
+            # bulk_create/bulk_update skip signals; refresh dashboards explicitly
+            registrations_changed(changed_reg_ids)
 
         messages.success(request, f"Successfully updated {updated} devotee(s)!")
         return redirect(
@@ -0,0 +1,102 @@
+# yatra_registration/admission.py
+"""
+Capacity admission for yatras.
+
+Every yatra has one YatraSeatCounter row holding the number of seats taken.
+Registrations reserve seats with a conditional UPDATE on that row, so two
+workers can never both take the last seat and the remaining count is read
+without COUNT(*) over registrations.
+
+Registrations created through the registration API reserve seats explicitly
+(reserve_seats); status changes and deletes made with save()/delete() are
+accounted by yatra_registration.signals through adjust_seats().
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SEAT_HOLDING_STATUSES, YatraRegistration, YatraSeatCounter
+
+
+def count_held_seats(yatra_id):
+    return YatraRegistration.objects.filter(
+        yatra_id=yatra_id, status__in=SEAT_HOLDING_STATUSES
+    ).count()
+
+
+def ensure_seat_counter(yatra_id):
+    """The yatra's counter row, created from the current registrations if missing."""
+    counter, _ = YatraSeatCounter.objects.get_or_create(
+        yatra_id=yatra_id,
+        defaults={'seats_taken': count_held_seats(yatra_id)},
+    )
+    return counter
+
+
+def reserve_seats(yatra, count):
+    """
+    Take up to `count` seats on the yatra and return how many were granted.
+
+    The common case is one conditional UPDATE. When fewer seats remain than
+    requested, the counter row is locked and the remainder is granted. Call it
+    inside the transaction that writes the registrations so that a rollback
+    gives the seats back.
+    """
+    if count <= 0:
+        return 0
+
+    counters = YatraSeatCounter.objects.filter(pk=yatra.pk)
+    if counters.filter(seats_taken__lte=yatra.capacity - count).update(
+        seats_taken=F('seats_taken') + count, updated_at=timezone.now()
+    ):
+        return count
+
+    with transaction.atomic():
+        ensure_seat_counter(yatra.pk)
+        taken = counters.select_for_update().values_list('seats_taken', flat=True).get()
+        granted = max(0, min(count, yatra.capacity - taken))
+        if granted:
+            counters.update(seats_taken=F('seats_taken') + granted, updated_at=timezone.now())
+        return granted
+
+
+def release_seats(yatra_id, count):
+    """Give back `count` seats (never going below zero)."""
+    if count <= 0:
+        return
+    counters = YatraSeatCounter.objects.filter(pk=yatra_id)
+    if not counters.filter(seats_taken__gte=count).update(
+        seats_taken=F('seats_taken') - count, updated_at=timezone.now()
+    ):
+        counters.update(seats_taken=0, updated_at=timezone.now())
+
+
+def adjust_seats(yatra_id, delta):
+    """
+    Apply a seat change made outside reserve_seats() (admin edits, imports,
+    substitutions, cancellations). Increments are not checked against capacity.
+    """
+    if delta < 0:
+        release_seats(yatra_id, -delta)
+    elif delta > 0:
+        if not YatraSeatCounter.objects.filter(pk=yatra_id).update(
+            seats_taken=F('seats_taken') + delta, updated_at=timezone.now()
+        ):
+            # A new counter is seeded from the registrations, which already include this change
+            ensure_seat_counter(yatra_id)
+
+
+def recount_seats(yatra_id):
+    """Reset the counter from the registrations table; repairs any drift."""
+    if not YatraSeatCounter.objects.filter(pk=yatra_id).update(
+        seats_taken=count_held_seats(yatra_id), updated_at=timezone.now()
+    ):
+        ensure_seat_counter(yatra_id)
+
+
+def remaining_seats(yatra):
+    try:
+        taken = yatra.seat_counter.seats_taken
+    except YatraSeatCounter.DoesNotExist:
+        taken = ensure_seat_counter(yatra.pk).seats_taken
+    return max(0, yatra.capacity - taken)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class YatraRegistrationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'yatra_registration'
+
+    def ready(self):
+        import yatra_registration.signals
@@ -0,0 +1,190 @@
+# yatra_registration/attendance.py
+"""
+Batch attendance sync for gate scanners.
+
+Scanner devices queue scans while offline and upload them in batches, per
+yatra. apply_scans() resolves a whole batch with a fixed number of queries: one
+locked read of the registrations, one substitution lookup, one conditional
+UPDATE marking the admissible registrations attended and one bulk insert of
+AttendanceScan rows. Scans already recorded for (registration, scanner_id,
+scanned_at) return their recorded outcome, so re-uploads are idempotent.
+
+attendance_manifest() streams what a scanner caches to check QR tokens
+offline: the paid registrations with their status_version, the attended ones
+and the ones with a substitution fee to collect at the gate.
+"""
+import json
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from yatra_substitution.models import SubstitutionRequest
+from .models import AttendanceScan, YatraRegistration
+from .signals import registrations_changed
+
+MAX_SCANS_PER_SYNC = 1000
+
+
+def _participant(registration):
+    return {
+        'name': f"{registration['first_name'] or ''} {registration['last_name'] or ''}".strip(),
+        'member_id': registration['member_id'],
+    }
+
+
+def apply_scans(yatra_id, scans):
+    """
+    Apply validated scans (AttendanceScanSerializer data) at the gate of one
+    yatra. Returns (applied, conflicts): one result dict per scan, in upload
+    order. Registrations of other yatras are not_found, and slips signed for
+    another yatra are wrong_yatra.
+    """
+    # The earliest scan of a registration decides; later ones share its outcome
+    first_scan = {}
+    for scan in sorted(scans, key=lambda s: s['scanned_at']):
+        first_scan.setdefault(scan['registration_id'], scan)
+    ids = list(first_scan)
+
+    with transaction.atomic():
+        registrations = {
+            r['id']: r
+            for r in YatraRegistration.objects
+            .filter(id__in=ids, yatra_id=yatra_id)
+            .select_for_update(of=('self',))
+            .values(
+                'id', 'status', 'status_version',
+                first_name=F('registered_for__first_name'),
+                last_name=F('registered_for__last_name'),
+                member_id=F('registered_for__member_id'),
+                cancellation_fee=F('yatra__cancellation_fee'),
+                substitution_fee=F('yatra__substitution_fee'),
+            )
+        }
+        recorded = {
+            (s['registration_id'], s['scanner_id'], s['scanned_at']): s['outcome']
+            for s in AttendanceScan.objects
+            .filter(registration_id__in=registrations.keys())
+            .values('registration_id', 'scanner_id', 'scanned_at', 'outcome')
+        }
+        fee_due = set(
+            SubstitutionRequest.objects
+            .filter(new_registration_id__in=registrations.keys(), status='accepted', fee_collected=False)
+            .values_list('new_registration_id', flat=True)
+        )
+
+        outcomes, replayed, to_mark, fee_collected = {}, set(), [], []
+        for registration_id, scan in first_scan.items():
+            registration = registrations.get(registration_id)
+            key = (registration_id, scan['scanner_id'], scan['scanned_at'])
+            if scan.get('yatra_id', yatra_id) != yatra_id:
+                outcome = 'wrong_yatra'
+            elif registration is None:
+                outcome = 'not_found'
+            elif key in recorded:
+                outcome = recorded[key]
+                replayed.add(registration_id)
+            elif registration['status'] == 'attended':
+                outcome = 'already_attended'
+            elif registration['status'] != 'paid':
+                outcome = 'not_paid'
+            elif scan.get('status_version', registration['status_version']) < registration['status_version']:
+                outcome = 'stale_token'
+            elif registration_id in fee_due and not scan['fee_collected']:
+                outcome = 'substitution_fee_due'
+            else:
+                outcome = 'marked'
+                to_mark.append(registration_id)
+                if registration_id in fee_due:
+                    fee_collected.append(registration_id)
+            outcomes[registration_id] = outcome
+
+        if to_mark:
+            # queryset.update() skips the signals; paid -> attended keeps the seat
+            YatraRegistration.objects.filter(id__in=to_mark, status='paid').update(
+                status='attended', status_version=F('status_version') + 1, updated_at=timezone.now()
+            )
+        if fee_collected:
+            SubstitutionRequest.objects.filter(
+                new_registration_id__in=fee_collected, status='accepted', fee_collected=False
+            ).update(fee_collected=True)
+
+        AttendanceScan.objects.bulk_create(
+            [
+                AttendanceScan(
+                    registration_id=registration_id,
+                    scanner_id=scan['scanner_id'],
+                    scanned_at=scan['scanned_at'],
+                    outcome=outcomes[registration_id],
+                )
+                for registration_id, scan in first_scan.items()
+                if registration_id in registrations and registration_id not in replayed
+            ],
+            ignore_conflicts=True,
+        )
+        registrations_changed(to_mark)
+
+    applied, conflicts = [], []
+    for scan in scans:
+        registration_id = scan['registration_id']
+        registration = registrations.get(registration_id)
+        result = {
+            'registration_id': str(registration_id),
+            'scanner_id': scan['scanner_id'],
+            'scanned_at': scan['scanned_at'].isoformat(),
+            'outcome': outcomes[registration_id],
+            'replayed': registration_id in replayed,
+            'participant': _participant(registration) if registration else None,
+        }
+        if result['outcome'] == 'substitution_fee_due':
+            result['amount_to_collect'] = float(
+                (registration['cancellation_fee'] or 0) + (registration['substitution_fee'] or 0)
+            )
+        (applied if result['outcome'] == 'marked' else conflicts).append(result)
+    return applied, conflicts
+
+
+def _fee_due_ids(yatra):
+    return (
+        SubstitutionRequest.objects
+        .filter(new_registration__yatra=yatra, status='accepted', fee_collected=False)
+        .values_list('new_registration_id', flat=True)
+    )
+
+
+def attendance_manifest(yatra, chunk_size=2000):
+    """
+    The yatra's attendance manifest as chunks of JSON text (for a streaming
+    response). Registrations are keyed by their hex id, as in the QR token:
+
+        {"yatra_id": ..., "generated_at": ..., "amount_to_collect": ...,
+         "paid": [[id, status_version, name, member_id], ...],
+         "attended": [id, ...], "substitution_fee_due": [id, ...]}
+    """
+    registrations = YatraRegistration.objects.filter(yatra=yatra).order_by('id')
+    amount = (yatra.cancellation_fee or 0) + (yatra.substitution_fee or 0)
+
+    yield json.dumps({
+        'yatra_id': str(yatra.id),
+        'generated_at': timezone.now().isoformat(),
+        'amount_to_collect': float(amount),
+    })[:-1]
+
+    yield ', "paid": ['
+    paid = (
+        registrations.filter(status='paid')
+        .values_list('id', 'status_version', 'registered_for__first_name',
+                     'registered_for__last_name', 'registered_for__member_id')
+    )
+    for i, (registration_id, version, first_name, last_name, member_id) in enumerate(paid.iterator(chunk_size)):
+        name = f"{first_name or ''} {last_name or ''}".strip()
+        yield (', ' if i else '') + json.dumps([registration_id.hex, version, name, member_id])
+
+    yield '], "attended": ['
+    attended = registrations.filter(status='attended').values_list('id', flat=True)
+    for i, registration_id in enumerate(attended.iterator(chunk_size)):
+        yield (', ' if i else '') + json.dumps(registration_id.hex)
+
+    yield '], "substitution_fee_due": '
+    yield json.dumps([registration_id.hex for registration_id in _fee_due_ids(yatra)])
+    yield '}'
@@ -6,6 +6,7 @@ from django.urls import reverse
 from django.utils import timezone
 from yatra.models import Yatra
 from yatra_registration.models import YatraEligibility, YatraRegistration, YatraRegistrationInstallment
+from payment.ledger import track
 from payment.models import Payment
 from userProfile.models import Profile
 import openpyxl
@@ -155,19 +156,20 @@ def yatra_bulk_offline_import(request, yatra_id):
                     )
                 print(f"[DEBUG] Payment record created WITHOUT uploading proof file: {payment.transaction_id}")
 
-                for inst in target_installments:
-                    reg_inst, _ = YatraRegistrationInstallment.objects.get_or_create(
-                        registration=reg, installment=inst
-                    )
-                    print(f"[DEBUG] Processing installment: {inst.label} (ID: {inst.id})")
+                with track(reg.installments.all()):
+                    for inst in target_installments:
+                        reg_inst, _ = YatraRegistrationInstallment.objects.get_or_create(
+                            registration=reg, installment=inst
+                        )
+                        print(f"[DEBUG] Processing installment: {inst.label} (ID: {inst.id})")
                     
-                    reg_inst.payment = payment
-                    reg_inst.is_paid = True
-                    reg_inst.paid_at = timezone.now()   
-                    reg_inst.verified_by = request.user.profile
-                    reg_inst.verified_at = timezone.now()
-                    reg_inst.save()
-                    print(f"Payment recorded for installment {inst.label} of profile {profile_id}")
+                        reg_inst.payment = payment
+                        reg_inst.is_paid = True
+                        reg_inst.paid_at = timezone.now()   
+                        reg_inst.verified_by = request.user.profile
+                        reg_inst.verified_at = timezone.now()
+                        reg_inst.save()
+                        print(f"Payment recorded for installment {inst.label} of profile {profile_id}")
 
                 reg.update_status()
                 success_count += 1
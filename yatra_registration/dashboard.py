@@ -0,0 +1,385 @@
+# yatra_registration/dashboard.py
+"""
+Read model behind the mentor registration dashboard (YatraRegistrationView.get).
+
+Each RegistrationDashboardRow holds the per-profile part of the dashboard payload
+for one yatra, once per approved mentor of the profile. Rows are rebuilt in batches by refresh_dashboard_rows() whenever
+yatra_registration.signals sees a change, so the GET only has to read them back.
+Rebuilds read values() projections; no model instances or serializers per row.
+
+Rows also carry the filter/sort columns of the paginated dashboards
+(dashboard_row_filter(), DASHBOARD_ORDERINGS); those pages are read with
+helpers.pagination.KeysetPaginator over the row indexes.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, FilteredRelation, Q
+
+from helpers.pagination import InvalidPageRequest
+from userProfile.models import Profile
+from yatra.models import Yatra
+from yatra.serializers import AccommodationSerializer, JourneySerializer
+from .models import (
+    RegistrationAccommodation, RegistrationCustomFieldValue, RegistrationDashboardRow,
+    RegistrationJourney, YatraEligibility, YatraRegistration,
+    YatraRegistrationInstallment, YatraWaitlistEntry,
+)
+
+
+def _installment_tag(reg_installment):
+    if not reg_installment:
+        return "due"
+    if reg_installment['is_paid']:
+        return "verified"
+    if reg_installment['payment_id'] and reg_installment['verified_by_id']:
+        return reg_installment['payment_status']
+    if reg_installment['payment_id']:
+        return "verification pending"
+    return "due"
+
+
+def _group_by_registration(rows):
+    grouped = defaultdict(list)
+    for row in rows:
+        grouped[row.pop('registration_id')].append(row)
+    return grouped
+
+
+def _registered_data(yatra, yatra_installments, registration, related, has_sub_req):
+    reg_installments = related['installments'].get(registration['id'], [])
+    inst_map = {i['installment_id']: i for i in reg_installments}
+    labels = {inst.id: inst.label for inst in yatra_installments}
+
+    paid, pending = [], []
+    for inst in reg_installments:
+        (paid if inst['is_paid'] else pending).append(labels.get(inst['installment_id']))
+
+    for inst in yatra_installments:
+        if inst.label not in paid and inst.label not in pending:
+            pending.append(inst.label)
+
+    return {
+        'is_registered': True,
+        'is_waitlisted': False,
+        'registration_id': str(registration['id']),
+        'registration_status': registration['status'],
+        'form_data': registration['form_data'],
+        'installments_paid': paid,
+        'installments_pending': pending,
+        'installments_info': [
+            {
+                "label": inst.label,
+                "amount": float(inst.amount),
+                "tag": _installment_tag(inst_map.get(inst.id)),
+            }
+            for inst in yatra_installments
+        ],
+        'accommodation': [
+            {
+                "accommodation": related['accommodation_table'].get(str(a['accommodation_id'])),
+                "room_number": a['room_number'],
+                "bed_number": a['bed_number'],
+            }
+            for a in related['accommodations'].get(registration['id'], [])
+        ],
+        'journey': [
+            {
+                "journey": related['journey_table'].get(str(j['journey_id'])),
+                "vehicle_number": j['vehicle_number'],
+                "seat_number": j['seat_number'],
+            }
+            for j in related['journeys'].get(registration['id'], [])
+        ],
+        'custom_fields': related['custom_fields'].get(registration['id'], []),
+        'is_substitution': has_sub_req,
+        'pending_substitution_fees': (
+            {
+                "cancellation_fee": float(yatra.cancellation_fee or 0),
+                "substitution_fee": float(yatra.substitution_fee or 0),
+                "total": float(
+                    (yatra.cancellation_fee or 0) +
+                    (yatra.substitution_fee or 0)
+                ),
+            } if has_sub_req else None
+        ),
+    }
+
+
+def _unregistered_data(yatra_installments, is_waitlisted):
+    return {
+        'is_registered': False,
+        'is_waitlisted': is_waitlisted,
+        'registration_status': "pending",
+        'form_data': {},
+        'paid_amount': 0,
+        'pending_amount': float(sum(i.amount for i in yatra_installments)),
+        'installments_paid': [],
+        'installments_pending': [i.label for i in yatra_installments],
+        'installments_info': [
+            {'label': i.label, 'amount': float(i.amount), 'tag': 'due'}
+            for i in yatra_installments
+        ],
+        'accommodation': [],
+        'journey': [],
+        'custom_fields': [],
+        'is_substitution': False,
+        'pending_substitution_fees': None,
+    }
+
+
+def _registration_related(yatra, registration_ids):
+    """
+    Per-registration child rows as values() projections, plus the yatra's
+    accommodation/journey details serialized once (they are the same for every mentee).
+    """
+    accommodations = _group_by_registration(
+        RegistrationAccommodation.objects
+        .filter(registration_id__in=registration_ids)
+        .values('registration_id', 'accommodation_id', 'room_number', 'bed_number')
+    )
+    journeys = _group_by_registration(
+        RegistrationJourney.objects
+        .filter(registration_id__in=registration_ids)
+        .values('registration_id', 'journey_id', 'vehicle_number', 'seat_number')
+    )
+    return {
+        'installments': _group_by_registration(
+            YatraRegistrationInstallment.objects
+            .filter(registration_id__in=registration_ids)
+            .values(
+                'registration_id', 'installment_id', 'is_paid', 'payment_id',
+                'verified_by_id', payment_status=F('payment__status'),
+            )
+        ),
+        'accommodations': accommodations,
+        'journeys': journeys,
+        'custom_fields': _group_by_registration(
+            RegistrationCustomFieldValue.objects
+            .filter(registration_id__in=registration_ids)
+            .values(
+                'registration_id',
+                field=F('custom_field_value__custom_field__field_name'),
+                value=F('custom_field_value__value'),
+            )
+        ),
+        'accommodation_table': {
+            a['id']: a
+            for a in AccommodationSerializer(yatra.accommodations.all(), many=True).data
+        } if accommodations else {},
+        'journey_table': {
+            j['id']: j
+            for j in JourneySerializer(yatra.journeys.all(), many=True).data
+        } if journeys else {},
+    }
+
+
+def build_dashboard_data(yatra, profile_ids, skip_empty=False):
+    """
+    Compute the dashboard payload for profile_ids in a fixed number of queries.
+    Returns {profile_id: data}. With skip_empty, profiles that have no
+    eligibility, registration or waitlist entry are left out.
+    """
+    from yatra_substitution.models import SubstitutionRequest
+
+    profile_ids = list(profile_ids)
+    if not profile_ids:
+        return {}
+
+    eligibility_map = {
+        e['profile_id']: e
+        for e in YatraEligibility.objects
+        .filter(yatra=yatra, profile_id__in=profile_ids)
+        .values('profile_id', 'is_approved', approved_by_member_id=F('approved_by__member_id'))
+    }
+
+    registration_map = {
+        r['registered_for_id']: r
+        for r in YatraRegistration.objects
+        .filter(yatra=yatra, registered_for_id__in=profile_ids)
+        .values('id', 'registered_for_id', 'status', 'form_data')
+    }
+    yatra_installments = list(yatra.installments.all())
+
+    waitlisted_ids = set()
+    if len(registration_map) < len(profile_ids):
+        waitlisted_ids = set(
+            YatraWaitlistEntry.objects
+            .filter(yatra=yatra, profile_id__in=[pid for pid in profile_ids if pid not in registration_map])
+            .values_list('profile_id', flat=True)
+        )
+
+    related = {}
+    substituted_ids = set()
+    if registration_map:
+        registration_ids = [r['id'] for r in registration_map.values()]
+        related = _registration_related(yatra, registration_ids)
+        substituted_ids = set(
+            SubstitutionRequest.objects.filter(
+                new_registration_id__in=registration_ids,
+                status="accepted",
+                fee_collected=False
+            ).values_list('new_registration_id', flat=True)
+        )
+
+    data = {}
+    for pid in profile_ids:
+        eligibility = eligibility_map.get(pid)
+        registration = registration_map.get(pid)
+        if skip_empty and not (eligibility or registration or pid in waitlisted_ids):
+            continue
+
+        row = {
+            'is_eligible': eligibility['is_approved'] if eligibility else False,
+            'approved_by': str(eligibility['approved_by_member_id']) if eligibility else None,
+        }
+        if registration:
+            row.update(_registered_data(
+                yatra, yatra_installments, registration, related,
+                registration['id'] in substituted_ids,
+            ))
+        else:
+            row.update(_unregistered_data(yatra_installments, pid in waitlisted_ids))
+        data[pid] = row
+
+    return data
+
+
+def sort_name(first_name, last_name):
+    return f"{first_name or ''} {last_name or ''}".strip().lower()
+
+
+def _row_columns(profile, data):
+    if data['is_registered']:
+        status = data['registration_status']
+    else:
+        status = 'waitlisted' if data['is_waitlisted'] else 'not_registered'
+    return {
+        'sort_name': sort_name(profile['first_name'], profile['last_name']),
+        'member_id': profile['member_id'] or 0,
+        'registration_status': status,
+        'is_eligible': data['is_eligible'],
+        'has_installment_due': data['is_registered'] and any(
+            i['tag'] == 'due' for i in data['installments_info']
+        ),
+        'substitution_pending': data['is_substitution'],
+    }
+
+
+def refresh_dashboard_rows(yatra, profile_ids, drop_empty=False):
+    """
+    Rebuild the dashboard rows of profile_ids for one yatra, one per approved
+    mentor of each profile. Accepts a Yatra or its id. Returns {profile_id: data}.
+
+    drop_empty leaves out the rows of profiles with nothing to show instead of
+    rewriting them; those profiles may have been deleted in the meantime, and
+    the next dashboard read rebuilds the rest.
+    """
+    if not isinstance(yatra, Yatra):
+        yatra = Yatra.objects.filter(id=yatra).first()
+        if yatra is None:
+            return {}
+
+    # One row per (profile, approved mentor); the mentor is None for profiles without one
+    profiles, mentors = {}, defaultdict(set)
+    for p in (
+        Profile.objects
+        .filter(id__in=set(profile_ids))
+        .annotate(approved=FilteredRelation('sent_requests', condition=Q(sent_requests__is_approved=True)))
+        .values('id', 'first_name', 'last_name', 'member_id', approved_mentor_id=F('approved__to_mentor_id'))
+    ):
+        profiles[p['id']] = p
+        mentors[p['id']].add(p['approved_mentor_id'])
+
+    data = build_dashboard_data(yatra, profiles.keys(), skip_empty=drop_empty)
+    with transaction.atomic(savepoint=False):
+        # Replaced rather than upserted: the profile's mentors may have changed
+        RegistrationDashboardRow.objects.filter(yatra=yatra, profile_id__in=set(profile_ids)).delete()
+        if data:
+            RegistrationDashboardRow.objects.bulk_create(
+                [
+                    RegistrationDashboardRow(
+                        yatra=yatra, profile_id=pid, mentor_id=mentor_id, data=row,
+                        **_row_columns(profiles[pid], row)
+                    )
+                    for pid, row in data.items()
+                    for mentor_id in mentors[pid]
+                ],
+                # A concurrent refresh of the same rows already wrote them
+                ignore_conflicts=True,
+            )
+    return data
+
+
+def ensure_dashboard_rows(yatra, profile_ids):
+    """Build the rows of profile_ids that do not exist yet. Returns {profile_id: data} of the new rows."""
+    existing = set(
+        RegistrationDashboardRow.objects
+        .filter(yatra=yatra, profile_id__in=profile_ids)
+        .values_list('profile_id', flat=True)
+    )
+    missing = [pid for pid in profile_ids if pid not in existing]
+    return refresh_dashboard_rows(yatra, missing) if missing else {}
+
+
+# Public ?ordering= names -> (row column, tiebreak) for helpers.pagination.KeysetPaginator
+DASHBOARD_ORDERINGS = {
+    'name': ('sort_name', 'profile_id'),
+    'member_id': ('member_id', 'profile_id'),
+}
+
+DASHBOARD_QUERY_PARAMS = (
+    'cursor', 'page_size', 'ordering',
+    'status', 'eligible', 'installment_due', 'substitution_pending',
+)
+
+REGISTRATION_STATUS_FILTERS = {
+    choice for choice, _ in YatraRegistration._meta.get_field('status').choices
+} | {'waitlisted', 'not_registered'}
+
+
+def _bool_param(params, name):
+    value = params[name].lower()
+    if value not in ('true', 'false', '1', '0'):
+        raise InvalidPageRequest(f"{name} must be true or false.")
+    return value in ('true', '1')
+
+
+def dashboard_row_filter(params):
+    """
+    Q over RegistrationDashboardRow from the dashboard query parameters:
+    status (comma separated), eligible, installment_due, substitution_pending.
+    """
+    q = Q()
+    if params.get('status'):
+        statuses = {s.strip() for s in params['status'].split(',') if s.strip()}
+        unknown = statuses - REGISTRATION_STATUS_FILTERS
+        if unknown:
+            raise InvalidPageRequest(
+                f"Invalid status '{', '.join(sorted(unknown))}'. "
+                f"Use one of: {', '.join(sorted(REGISTRATION_STATUS_FILTERS))}"
+            )
+        q &= Q(registration_status__in=statuses)
+    if 'eligible' in params:
+        q &= Q(is_eligible=_bool_param(params, 'eligible'))
+    if 'installment_due' in params:
+        q &= Q(has_installment_due=_bool_param(params, 'installment_due'))
+    if 'substitution_pending' in params:
+        q &= Q(substitution_pending=_bool_param(params, 'substitution_pending'))
+    return q
+
+
+def schedule_dashboard_refresh(yatra_id, profile_ids):
+    """Refresh the given rows once the surrounding transaction commits."""
+    profile_ids = {pid for pid in profile_ids if pid}
+    if not yatra_id or not profile_ids:
+        return
+    transaction.on_commit(lambda: refresh_dashboard_rows(yatra_id, profile_ids, drop_empty=True))
+
+
+def invalidate_yatra_dashboard(yatra_id):
+    """
+    Drop every row of a yatra after yatra-wide changes (installments, fees,
+    accommodation/journey details). Rows are rebuilt lazily on the next read.
+    """
+    RegistrationDashboardRow.objects.filter(yatra_id=yatra_id).delete()
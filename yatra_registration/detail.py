@@ -0,0 +1,112 @@
+# yatra_registration/detail.py
+"""
+Cached payload of YatraRegistrationDetailView.
+
+A registration's detail is built with one select_related/prefetch plan (two
+queries) and cached under registration_detail_key(). yatra_registration.signals
+deletes the key after commit whenever the registration, its installments or
+their payments change, and yatra-wide edits (title, installments) drop every
+key of the yatra. Profiles without a registration get the blank structure,
+which is cheap and not cached.
+
+Caching is off (REGISTRATION_DETAIL_CACHE_TTL = 0) unless the default cache
+is shared by every process: with a per-process cache the admin process and
+the other workers would never see the invalidations.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+
+from yatra.models import Yatra
+from .models import YatraRegistration, YatraRegistrationInstallment
+from .serializers import YatraRegistrationDetailSerializer
+
+
+def registration_detail_key(yatra_id, profile_id):
+    return f"registration-detail:{yatra_id}:{profile_id}"
+
+
+def _registration(yatra_id, profile_id):
+    return (
+        YatraRegistration.objects
+        .select_related('yatra', 'registered_for__user')
+        .prefetch_related(
+            Prefetch(
+                'installments',
+                queryset=YatraRegistrationInstallment.objects.select_related(
+                    'installment', 'payment__uploaded_by__user', 'payment__processed_by__user',
+                ),
+            )
+        )
+        .filter(yatra_id=yatra_id, registered_for_id=profile_id)
+        .first()
+    )
+
+
+def _blank_detail(yatra, profile_id):
+    return {
+        "id": None,
+        "yatra": yatra.title,
+        "registered_for": profile_id,
+        "form_data": {},  # empty form
+        "status": "not_registered",
+        "registered_at": None,
+        "updated_at": None,
+        "installments": [
+            {
+                "id": None,
+                "label": inst.label,
+                "amount": inst.amount,
+                "is_paid": False,
+                "paid_at": None,
+                "verified_by": None,
+                "verified_at": None,
+                "notes": None,
+                "payment": None,
+            }
+            for inst in yatra.installments.all()
+        ],
+    }
+
+
+def registration_detail(yatra_id, profile_id, request):
+    """
+    The detail payload for (yatra, profile), from the cache when possible.
+    Returns None when neither a registration nor the yatra exists.
+    """
+    ttl = settings.REGISTRATION_DETAIL_CACHE_TTL
+    key = registration_detail_key(yatra_id, profile_id)
+    data = cache.get(key) if ttl else None
+    if data is not None:
+        return data
+
+    registration = _registration(yatra_id, profile_id)
+    if registration is None:
+        # User not registered yet — return blank structure
+        yatra = Yatra.objects.filter(id=yatra_id).first()
+        return _blank_detail(yatra, profile_id) if yatra else None
+
+    data = dict(YatraRegistrationDetailSerializer(registration, context={"request": request}).data)
+    if ttl:
+        cache.set(key, data, ttl)
+    return data
+
+
+def invalidate_registration_details(pairs):
+    """Drop the cached details of (yatra_id, profile_id) pairs after commit."""
+    keys = {registration_detail_key(yatra_id, profile_id) for yatra_id, profile_id in pairs}
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(list(keys)))
+
+
+def invalidate_yatra_details(yatra_id):
+    """Drop the cached details of every registration of a yatra after commit."""
+    def delete():
+        cache.delete_many([
+            registration_detail_key(yatra_id, profile_id)
+            for profile_id in YatraRegistration.objects
+            .filter(yatra_id=yatra_id)
+            .values_list('registered_for_id', flat=True)
+        ])
+    transaction.on_commit(delete)
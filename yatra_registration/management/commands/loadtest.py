@@ -0,0 +1,352 @@
+"""
+Simulate the registration-open rush against a locally running server.
+
+    python manage.py loadtest seed --mentors 50 --mentees 10
+    python manage.py loadtest run --base-url http://127.0.0.1:8000 --concurrency 32
+    python manage.py loadtest cleanup
+
+Every seeded mentor runs the mentor flow: approve mentees -> register them ->
+read the dashboard -> batch payment proof -> upload screenshot. Start the
+server with MEDIA_STORAGE=local so uploads stay on disk; SQLite (DEBUG=True)
+or a local MySQL/Postgres (DATABASE_URL, DB_SSL_REQUIRE=False) both work.
+
+The report gives p50/p95/p99 latency per endpoint, the error rate and the
+database's lock waits over the run.
+"""
+import datetime
+import math
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import requests
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from rest_framework.authtoken.models import Token
+
+from userProfile.models import MentorRequest, Profile
+from yatra.models import Yatra, YatraInstallment
+
+PREFIX = "loadtest_"
+YATRA_TITLE = f"{PREFIX}yatra"
+INSTALLMENTS = (("A", Decimal("3000")), ("B", Decimal("3500")))
+BATCH_SIZE = 500
+
+
+def _tiny_png():
+    """A valid 1x1 PNG, so upload validation sees a real image."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(b"\x00\xff\xff\xff"))
+        + chunk(b"IEND", b"")
+    )
+
+
+SCREENSHOT = _tiny_png()
+
+
+def _summary(response):
+    """One line describing an error response (the exception title of Django's debug page)."""
+    match = re.search(r"<title>(.*?)</title>", response.text, re.S)
+    text = match.group(1) if match else response.text
+    return " ".join(text.split())[:160]
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class LockMonitor:
+    """
+    Lock waits on the server's database over the run.
+
+    MySQL: deltas of the Innodb_row_lock_* status counters.
+    PostgreSQL: ungranted pg_locks sampled from a side connection, plus deadlocks.
+    SQLite has no lock statistics; writers serialize on the file and lock
+    timeouts surface as 5xx errors.
+    """
+
+    SAMPLE_INTERVAL = 0.1
+
+    def __init__(self, using="default"):
+        self.using = using
+        self.vendor = connections[using].vendor
+        self._before = {}
+        self._samples = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _mysql_status(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute("SHOW GLOBAL STATUS LIKE 'Innodb_row_lock%'")
+            return {name: int(value) for name, value in cursor.fetchall()}
+
+    def _pg_deadlocks(self):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")
+            return cursor.fetchone()[0]
+
+    def _pg_sample(self):
+        try:
+            while not self._stop.wait(self.SAMPLE_INTERVAL):
+                with connections[self.using].cursor() as cursor:
+                    cursor.execute("SELECT count(*) FROM pg_locks WHERE NOT granted")
+                    self._samples.append(cursor.fetchone()[0])
+        finally:
+            connections[self.using].close()
+
+    def start(self):
+        if self.vendor == "mysql":
+            self._before = self._mysql_status()
+        elif self.vendor == "postgresql":
+            self._before = {"deadlocks": self._pg_deadlocks()}
+            self._thread = threading.Thread(target=self._pg_sample, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self.vendor == "mysql":
+            after = self._mysql_status()
+            return {
+                "row lock waits": after["Innodb_row_lock_waits"] - self._before["Innodb_row_lock_waits"],
+                "row lock time (ms)": after["Innodb_row_lock_time"] - self._before["Innodb_row_lock_time"],
+                "max row lock wait since server start (ms)": after["Innodb_row_lock_time_max"],
+            }
+        if self.vendor == "postgresql":
+            self._stop.set()
+            self._thread.join()
+            samples = self._samples or [0]
+            return {
+                "max waiting locks": max(samples),
+                "mean waiting locks": round(sum(samples) / len(samples), 2),
+                "deadlocks": self._pg_deadlocks() - self._before["deadlocks"],
+            }
+        return {"lock statistics": f"not available on {self.vendor}"}
+
+
+class Command(BaseCommand):
+    help = "Seed load-test mentors/mentees and replay the registration rush against a running server."
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="action", required=True)
+
+        seed = sub.add_parser("seed", help="Create the load-test yatra, mentors, mentees and tokens")
+        seed.add_argument("--mentors", type=int, default=20)
+        seed.add_argument("--mentees", type=int, default=10, help="Mentees per mentor")
+        seed.add_argument("--capacity", type=int, default=None,
+                          help="Yatra capacity (default: room for every mentee)")
+
+        run = sub.add_parser("run", help="Run the mentor flows concurrently")
+        run.add_argument("--base-url", default="http://127.0.0.1:8000")
+        run.add_argument("--concurrency", type=int, default=16)
+        run.add_argument("--timeout", type=float, default=30.0)
+
+        sub.add_parser("cleanup", help="Delete everything created by seed and run")
+
+    def handle(self, *args, action, **options):
+        getattr(self, f"_{action}")(**options)
+
+    # -----------------------------------------------------------------
+    # seed / cleanup
+    # -----------------------------------------------------------------
+    @transaction.atomic
+    def _seed(self, mentors, mentees, capacity, **options):
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError("Load-test data already exists; run `loadtest cleanup` first.")
+
+        today = datetime.date.today()
+        yatra = Yatra.objects.create(
+            title=YATRA_TITLE,
+            description="Load test",
+            start_date=today + datetime.timedelta(days=30),
+            end_date=today + datetime.timedelta(days=35),
+            location="Load test",
+            capacity=capacity if capacity is not None else mentors * mentees,
+        )
+        YatraInstallment.objects.bulk_create(
+            YatraInstallment(yatra=yatra, label=label, amount=amount, order=order)
+            for order, (label, amount) in enumerate(INSTALLMENTS, 1)
+        )
+
+        password = make_password("loadtest")
+        usernames = []
+        for m in range(mentors):
+            usernames.append(f"{PREFIX}mentor{m}")
+            usernames.extend(f"{PREFIX}mentor{m}_mentee{d}" for d in range(mentees))
+
+        # bulk_create skips the post_save signal that creates profiles
+        User.objects.bulk_create(
+            [User(username=u, email=f"{u}@loadtest.invalid", password=password) for u in usernames],
+            batch_size=BATCH_SIZE,
+        )
+        users = {u.username: u for u in User.objects.filter(username__in=usernames)}
+
+        mentor_profiles = Profile.objects.bulk_create(
+            [
+                Profile(user=users[f"{PREFIX}mentor{m}"], username=f"{PREFIX}mentor{m}",
+                        first_name=f"Mentor{m}", last_name="Loadtest", user_type="mentor")
+                for m in range(mentors)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        mentee_profiles = Profile.objects.bulk_create(
+            [
+                Profile(user=users[f"{PREFIX}mentor{m}_mentee{d}"], username=f"{PREFIX}mentor{m}_mentee{d}",
+                        first_name=f"Mentee{m}x{d}", last_name="Loadtest", user_type="devotee",
+                        mentor=mentor_profiles[m])
+                for m in range(mentors)
+                for d in range(mentees)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        MentorRequest.objects.bulk_create(
+            [
+                MentorRequest(from_user=p, to_mentor=p.mentor, is_approved=True)
+                for p in mentee_profiles
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        Token.objects.bulk_create(
+            [Token(user=p.user, key=Token.generate_key()) for p in mentor_profiles],
+            batch_size=BATCH_SIZE,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {mentors} mentors x {mentees} mentees for yatra {yatra.id} "
+            f"(capacity {yatra.capacity})."
+        ))
+
+    def _cleanup(self, **options):
+        deleted, _ = User.objects.filter(username__startswith=PREFIX).delete()
+        Yatra.objects.filter(title=YATRA_TITLE).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} load-test rows."))
+
+    # -----------------------------------------------------------------
+    # run
+    # -----------------------------------------------------------------
+    def _run(self, base_url, concurrency, timeout, **options):
+        yatra = Yatra.objects.filter(title=YATRA_TITLE).first()
+        if yatra is None:
+            raise CommandError("No load-test data; run `loadtest seed` first.")
+
+        mentees = defaultdict(list)
+        for mentee_id, mentor_id in Profile.objects.filter(
+            username__startswith=PREFIX, user_type="devotee"
+        ).values_list("id", "mentor_id"):
+            mentees[mentor_id].append(str(mentee_id))
+        flows = [
+            (key, mentees[mentor_id])
+            for key, mentor_id in Token.objects.filter(
+                user__username__startswith=PREFIX
+            ).values_list("key", "user__profile__id")
+        ]
+        # The server owns the database from here on
+        connection.close()
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.yatra_id = str(yatra.id)
+        self.run_id = int(time.time())
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(list)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        monitor = LockMonitor()
+        monitor.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(self._mentor_flow, range(len(flows)), flows))
+        elapsed = time.perf_counter() - started
+        locks = monitor.stop()
+
+        self._report(len(flows), elapsed, locks)
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _call(self, endpoint, token, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self._session().request(
+                method, self.base_url + path,
+                headers={"Authorization": f"Token {token}"},
+                timeout=self.timeout, **kwargs
+            )
+            error = None if response.status_code < 400 else f"HTTP {response.status_code}: {_summary(response)}"
+        except requests.RequestException as exc:
+            response, error = None, f"{type(exc).__name__}: {exc}"
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.timings[endpoint].append(elapsed)
+            if error:
+                self.errors[endpoint].append(error)
+        return None if error else response
+
+    def _mentor_flow(self, index, flow):
+        token, mentee_ids = flow
+        yatra = self.yatra_id
+        installment = INSTALLMENTS[0]
+
+        if not self._call("eligibility", token, "post", f"/yatras/{yatra}/eligibility/",
+                          json={"profile_ids": mentee_ids, "action": "approve"}):
+            return
+        if not self._call("register", token, "post", f"/yatras/{yatra}/register/",
+                          json={pid: {"form_fields": {}, "installments_selected": [installment[0]]}
+                                for pid in mentee_ids}):
+            return
+        self._call("dashboard", token, "get", f"/yatras/{yatra}/register/")
+
+        response = self._call("batch-payment-proof", token, "post", f"/payments/{yatra}/batch-payment-proof/", json={
+            "transaction_id": f"LOADTEST-{self.run_id}-{index}",
+            "total_amount": str(installment[1] * len(mentee_ids)),
+            "registration_installments": [
+                {"profile_id": pid, "installments": [installment[0]]} for pid in mentee_ids
+            ],
+        })
+        if not response:
+            return
+        self._call("upload-screenshot", token, "post",
+                   f"/payments/{response.json()['payment_id']}/upload-screenshot/",
+                   files={"screenshot": ("proof.png", SCREENSHOT, "image/png")})
+
+    def _report(self, flows, elapsed, locks):
+        total = sum(len(t) for t in self.timings.values())
+        failed = sum(len(e) for e in self.errors.values())
+
+        self.stdout.write(f"\n{flows} mentor flows, {total} requests in {elapsed:.1f}s "
+                          f"({total / elapsed if elapsed else 0:.1f} req/s)\n")
+        self.stdout.write(f"{'endpoint':<22}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for endpoint, timings in self.timings.items():
+            timings = sorted(timings)
+            self.stdout.write(
+                f"{endpoint:<22}{len(timings):>7}{len(self.errors[endpoint]):>8}"
+                + "".join(f"{_percentile(timings, p) * 1000:>10.1f}" for p in (50, 95, 99))
+                + f"{timings[-1] * 1000:>10.1f}"
+            )
+
+        self.stdout.write(f"\nerror rate: {failed / total * 100 if total else 0:.2f}% ({failed}/{total})")
+        for endpoint, errors in self.errors.items():
+            for error in errors[:3]:
+                self.stdout.write(f"  {endpoint}: {error}")
+
+        self.stdout.write(f"\nlock waits ({connection.vendor}):")
+        for name, value in locks.items():
+            self.stdout.write(f"  {name}: {value}")
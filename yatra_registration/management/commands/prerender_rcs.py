@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yatra.models import Yatra
+from yatra_registration.rcs import prerender_yatra
+
+
+class Command(BaseCommand):
+    help = "Render and store the RCS PDFs of every confirmed registration of the given yatras."
+
+    def add_arguments(self, parser):
+        parser.add_argument("yatra_ids", nargs="*", help="Yatras to render (default: those with RCS download open)")
+
+    def handle(self, *args, yatra_ids, **options):
+        if not settings.BACKEND_BASE_URL:
+            raise CommandError("Set BACKEND_BASE_URL; it is encoded in the RCS QR codes.")
+
+        yatras = Yatra.objects.all()
+        yatras = yatras.filter(id__in=yatra_ids) if yatra_ids else yatras.filter(is_rcs_download_open=True)
+        for yatra in yatras:
+            count = prerender_yatra(yatra.id)
+            self.stdout.write(f"{yatra.title}: {count} RCS slips ready")
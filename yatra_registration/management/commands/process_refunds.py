@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from userProfile.models import Profile
+from yatra_registration.refunds import RefundError, refund_batch
+
+
+class Command(BaseCommand):
+    help = "Refund a yatra's cancelled registrations in one batch and write the payout file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("yatra_id")
+        parser.add_argument("--processed-by", help="Username recorded on the refunded payments (required unless --dry-run)")
+        parser.add_argument("--dry-run", action="store_true", help="List the refunds without recording them")
+
+    def handle(self, *args, yatra_id, processed_by, dry_run, **options):
+        profile = None
+        if not dry_run:
+            if not processed_by:
+                raise CommandError("--processed-by is required to record refunds.")
+            profile = Profile.objects.filter(user__username=processed_by).first()
+            if profile is None:
+                raise CommandError(f"No profile for user '{processed_by}'.")
+
+        try:
+            batch, rows = refund_batch(yatra_id, profile, apply=not dry_run)
+        except RefundError as e:
+            raise CommandError(str(e))
+
+        total = sum(row["refund_amount"] for row in rows)
+        if dry_run:
+            for row in rows:
+                self.stdout.write(f"  {row['member_id']} {row['name']}: {row['refund_amount']} ({row['transaction_ids']})")
+            self.stdout.write(f"{len(rows)} registrations would be refunded, {total} in total")
+        elif batch is None:
+            self.stdout.write("No cancelled registrations to refund.")
+        else:
+            self.stdout.write(
+                f"Batch {batch.id}: {batch.registrations_count} registrations refunded, {batch.total_amount} in total, "
+                f"{batch.payments_refunded} payments marked refunded. Payout file: {batch.payout_file.name}"
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from yatra.models import Yatra
+from yatra_registration.status import recompute_yatra_statuses
+
+
+class Command(BaseCommand):
+    help = "Recompute pending/partial/paid registration statuses from their installments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("yatra_ids", nargs="*", help="Yatras to recompute (default: all)")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, yatra_ids, batch_size, **options):
+        yatras = Yatra.objects.all()
+        if yatra_ids:
+            yatras = yatras.filter(id__in=yatra_ids)
+
+        for yatra in yatras:
+            changed = recompute_yatra_statuses(yatra.id, batch_size=batch_size)
+            self.stdout.write(f"{yatra.title}: {len(changed)} registration statuses fixed")
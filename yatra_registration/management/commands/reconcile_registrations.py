@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from yatra.models import Yatra
+from yatra_registration.reconcile import reconcile_yatra
+
+
+class Command(BaseCommand):
+    help = "Report registrations whose status or installment flags disagree with their payments (and fix them with --repair)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("yatra_ids", nargs="*", help="Yatras to check (default: all)")
+        parser.add_argument("--repair", action="store_true", help="Apply the fixes after reporting")
+        parser.add_argument("--json", action="store_true", help="Print the full drift report as JSON")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, yatra_ids, repair, batch_size, **options):
+        yatras = Yatra.objects.all()
+        if yatra_ids:
+            yatras = yatras.filter(id__in=yatra_ids)
+
+        for yatra in yatras:
+            report = reconcile_yatra(yatra.id, repair=repair, batch_size=batch_size)
+            if options["json"]:
+                self.stdout.write(json.dumps(report, cls=DjangoJSONEncoder, indent=2))
+                continue
+
+            self.stdout.write(
+                f"{yatra.title}: {report['registrations_checked']} registrations checked, "
+                f"{len(report['registrations'])} drifted, {len(report['installments'])} installment flags drifted"
+            )
+            for row in report["registrations"]:
+                self.stdout.write(
+                    f"  {row['id']} (member {row['member_id']}): status {row['status']} -> {row['expected_status']}, "
+                    f"paid {row['paid_amount']} -> {row['expected_paid_amount']}"
+                )
+            if report["repaired"]:
+                self.stdout.write(
+                    f"  repaired {report['repaired']['installments']} installments, "
+                    f"{report['repaired']['statuses']} statuses"
+                )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from yatra.models import Yatra
+from yatra_registration.admission import recount_seats
+from yatra_registration.models import YatraSeatCounter
+
+
+class Command(BaseCommand):
+    help = "Reset yatra seat counters from the registrations table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("yatra_ids", nargs="*", help="Yatras to recount (default: all)")
+
+    def handle(self, *args, yatra_ids, **options):
+        yatras = Yatra.objects.all()
+        if yatra_ids:
+            yatras = yatras.filter(id__in=yatra_ids)
+
+        for yatra in yatras:
+            recount_seats(yatra.id)
+            taken = YatraSeatCounter.objects.get(pk=yatra.id).seats_taken
+            self.stdout.write(f"{yatra.title}: {taken}/{yatra.capacity} seats taken")
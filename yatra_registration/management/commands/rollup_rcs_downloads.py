@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from yatra_registration.rcs_downloads import rollup
+
+
+class Command(BaseCommand):
+    """
+    Not run by the app itself; schedule it, e.g. every 10 minutes:
+
+        */10 * * * *  python manage.py rollup_rcs_downloads
+    """
+    help = (
+        "Copy the latest RCS downloads of each registration into its RCSDownloadEvent for the admin. "
+        "Schedule it (cron / platform scheduler) to keep the admin's download lists current."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, batch_size, **options):
+        updated = rollup(batch_size=batch_size)
+        self.stdout.write(f"Rolled up RCS downloads of {updated} registrations")
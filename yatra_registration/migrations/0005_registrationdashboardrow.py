@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:41
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userProfile', '0004_mentorrequest_mentorreq_from_to_created_idx'),
+        ('yatra', '0006_yatraimportantnote_yatracontactcategory'),
+        ('yatra_registration', '0004_remove_rcsdownloadevent_yatra_regis_created_ff6a53_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationDashboardRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_rows', to='userProfile.profile')),
+                ('yatra', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_rows', to='yatra.yatra')),
+            ],
+            options={
+                'unique_together': {('yatra', 'profile')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+SEAT_HOLDING_STATUSES = ('pending', 'partial', 'paid', 'attended')
+
+
+def seed_seat_counters(apps, schema_editor):
+    Yatra = apps.get_model('yatra', 'Yatra')
+    YatraSeatCounter = apps.get_model('yatra_registration', 'YatraSeatCounter')
+    yatras = Yatra.objects.annotate(
+        held=Count('yatraregistration', filter=Q(yatraregistration__status__in=SEAT_HOLDING_STATUSES))
+    )
+    YatraSeatCounter.objects.bulk_create(
+        YatraSeatCounter(yatra_id=y.id, seats_taken=y.held) for y in yatras
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yatra', '0006_yatraimportantnote_yatracontactcategory'),
+        ('yatra_registration', '0005_registrationdashboardrow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YatraSeatCounter',
+            fields=[
+                ('yatra', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='seat_counter', serialize=False, to='yatra.yatra')),
+                ('seats_taken', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(seed_seat_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userProfile', '0004_mentorrequest_mentorreq_from_to_created_idx'),
+        ('yatra', '0006_yatraimportantnote_yatracontactcategory'),
+        ('yatra_registration', '0006_yatraseatcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YatraWaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('form_data', models.JSONField(blank=True, default=dict)),
+                ('installments_selected', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='userProfile.profile')),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries_made', to='userProfile.profile')),
+                ('yatra', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='yatra.yatra')),
+            ],
+            options={
+                'verbose_name_plural': 'Yatra Waitlist Entries',
+                'indexes': [models.Index(fields=['yatra', 'id'], name='yatra_regis_yatra_i_0e670a_idx')],
+                'unique_together': {('yatra', 'profile')},
+            },
+        ),
+    ]
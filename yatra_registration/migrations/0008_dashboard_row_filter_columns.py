@@ -0,0 +1,73 @@
+# Generated by Django 5.2.7 on 2026-10-18 06:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def drop_dashboard_rows(apps, schema_editor):
+    # Rows are a cache; the next dashboard read rebuilds them with the new columns
+    apps.get_model('yatra_registration', 'RegistrationDashboardRow').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userProfile', '0004_mentorrequest_mentorreq_from_to_created_idx'),
+        ('yatra', '0006_yatraimportantnote_yatracontactcategory'),
+        ('yatra_registration', '0007_yatrawaitlistentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='registrationdashboardrow',
+            name='has_installment_due',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='registrationdashboardrow',
+            name='is_eligible',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='registrationdashboardrow',
+            name='member_id',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='registrationdashboardrow',
+            name='mentor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='userProfile.profile'),
+        ),
+        migrations.AddField(
+            model_name='registrationdashboardrow',
+            name='registration_status',
+            field=models.CharField(default='not_registered', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='registrationdashboardrow',
+            name='sort_name',
+            field=models.CharField(blank=True, default='', max_length=201),
+        ),
+        migrations.AddField(
+            model_name='registrationdashboardrow',
+            name='substitution_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='registrationdashboardrow',
+            index=models.Index(fields=['yatra', 'mentor', 'sort_name', 'profile'], name='dashrow_mentor_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrationdashboardrow',
+            index=models.Index(fields=['yatra', 'mentor', 'member_id', 'profile'], name='dashrow_mentor_member_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrationdashboardrow',
+            index=models.Index(fields=['yatra', 'mentor', 'registration_status', 'sort_name', 'profile'], name='dashrow_mentor_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrationdashboardrow',
+            index=models.Index(fields=['yatra', 'mentor', 'is_eligible', 'sort_name', 'profile'], name='dashrow_mentor_elig_idx'),
+        ),
+        migrations.RunPython(drop_dashboard_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+RECENT_DOWNLOADS = 10
+
+
+def move_timestamps_to_log(apps, schema_editor):
+    RCSDownloadEvent = apps.get_model('yatra_registration', 'RCSDownloadEvent')
+    RCSDownloadLog = apps.get_model('yatra_registration', 'RCSDownloadLog')
+    for event in RCSDownloadEvent.objects.exclude(timestamps=[]).iterator():
+        times = [t for t in map(parse_datetime, event.timestamps) if t]
+        RCSDownloadLog.objects.bulk_create(
+            RCSDownloadLog(registration_id=event.registration_id, downloaded_at=t) for t in times
+        )
+        event.recent_downloads = sorted(event.timestamps, reverse=True)[:RECENT_DOWNLOADS]
+        event.rolled_up_at = max(times, default=None)
+        event.save(update_fields=['recent_downloads', 'rolled_up_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yatra_registration', '0008_dashboard_row_filter_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rcsdownloadevent',
+            name='recent_downloads',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='rcsdownloadevent',
+            name='rolled_up_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RCSDownloadLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('downloaded_at', models.DateTimeField()),
+                ('registration', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='rcs_download_logs', to='yatra_registration.yatraregistration')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['registration', 'downloaded_at'], name='rcslog_reg_downloaded_idx')],
+            },
+        ),
+        migrations.RunPython(move_timestamps_to_log, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='rcsdownloadevent',
+            name='timestamps',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yatra_registration', '0009_rcs_download_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scanner_id', models.CharField(max_length=64)),
+                ('scanned_at', models.DateTimeField()),
+                ('outcome', models.CharField(choices=[('marked', 'Attendance marked'), ('already_attended', 'Already attended'), ('not_paid', 'Not paid'), ('substitution_fee_due', 'Substitution fee due')], max_length=32)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('registration', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_scans', to='yatra_registration.yatraregistration')),
+            ],
+            options={
+                'unique_together': {('registration', 'scanner_id', 'scanned_at')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yatra_registration', '0010_attendancescan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='yatraregistration',
+            name='status_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='attendancescan',
+            name='outcome',
+            field=models.CharField(choices=[('marked', 'Attendance marked'), ('already_attended', 'Already attended'), ('not_paid', 'Not paid'), ('substitution_fee_due', 'Substitution fee due'), ('stale_token', 'QR printed before a status change')], max_length=32),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 07:32
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userProfile', '0004_mentorrequest_mentorreq_from_to_created_idx'),
+        ('yatra', '0006_yatraimportantnote_yatracontactcategory'),
+        ('yatra_registration', '0011_attendance_qr_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefundBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('cancellation_fee', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('registrations_count', models.PositiveIntegerField(default=0)),
+                ('payments_refunded', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payout_file', models.FileField(blank=True, upload_to='refunds/')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='userProfile.profile')),
+                ('yatra', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refund_batches', to='yatra.yatra')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RefundItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verified_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('refund_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('transaction_ids', models.TextField(blank=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='yatra_registration.refundbatch')),
+                ('registration', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='refund', to='yatra_registration.yatraregistration')),
+            ],
+        ),
+    ]
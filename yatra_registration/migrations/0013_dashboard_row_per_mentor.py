@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 08:24
+
+from django.db import migrations
+
+
+def drop_dashboard_rows(apps, schema_editor):
+    # Rows are a cache; the next dashboard read rebuilds them with a row per approved mentor
+    apps.get_model('yatra_registration', 'RegistrationDashboardRow').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userProfile', '0004_mentorrequest_mentorreq_from_to_created_idx'),
+        ('yatra', '0006_yatraimportantnote_yatracontactcategory'),
+        ('yatra_registration', '0012_refund_batches'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_dashboard_rows, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='registrationdashboardrow',
+            unique_together={('yatra', 'profile', 'mentor')},
+        ),
+    ]
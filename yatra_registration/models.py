@@ -1,8 +1,12 @@
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact, GreaterThan
 import uuid
 from userProfile.models import Profile
 from payment.models import Payment
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from yatra.models import *
 from django.utils import timezone
 
@@ -27,6 +31,12 @@ class YatraEligibility(models.Model):
         return f"{self.profile} - {self.yatra.title} ({'Approved' if self.is_approved else 'Pending'})"
 
 
+# Registration statuses that occupy one of Yatra.capacity seats
+SEAT_HOLDING_STATUSES = ('pending', 'partial', 'paid', 'attended')
+# Statuses derived from the installments (payment_status); the others are set explicitly
+RECOMPUTED_STATUSES = ('pending', 'partial', 'paid')
+
+
 class YatraRegistration(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     yatra = models.ForeignKey(Yatra, on_delete=models.CASCADE)
@@ -46,6 +56,8 @@ class YatraRegistration(models.Model):
         default='pending'
     )
     form_data = models.JSONField(default=dict, blank=True)
+    # Bumped on every status change; signed into the RCS QR token (yatra_registration.qr_tokens)
+    status_version = models.PositiveIntegerField(default=1)
     registered_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     #the following fields are for substitution and cancellation tracking
@@ -68,6 +80,23 @@ class YatraRegistration(models.Model):
     def __str__(self):
         return f"Registration {self.id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # status as loaded, so seat accounting can see transitions on save()
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and self.status != getattr(self, '_loaded_status', self.status):
+            self.status_version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'status_version'}
+        super().save(*args, **kwargs)
+
+    @property
+    def holds_seat(self):
+        return self.status in SEAT_HOLDING_STATUSES
 
     @property
     def total_amount(self):
@@ -92,18 +121,66 @@ class YatraRegistration(models.Model):
         return self.total_amount - self.paid_amount
 
     def update_status(self):
-        """Update registration status based on payments"""
-        total_installments = self.yatra.installments.count()
+        """
+        Update registration status based on payments (one query; saves only when it changed).
+        Only pending/partial/paid registrations follow their payments; attended,
+        substituted, cancelled and refunded ones are left as they are.
+        """
+        if self.status not in RECOMPUTED_STATUSES:
+            return
+        # Same rule as yatra_registration.status.recompute_statuses()
+        status = (
+            YatraRegistration.objects
+            .filter(pk=self.pk)
+            .annotate(expected_status=payment_status())
+            .filter(status_drift())
+            .values_list('expected_status', flat=True)
+            .first()
+        )
+        if status is not None:
+            self.status = status
+            self.save(update_fields=['status', 'updated_at'])
 
-        paid_installments = self.installments.filter(is_paid=True).count()
-        initiated_installments = self.installments.filter(payment__isnull=False).count()
-        if initiated_installments == 0:
-            self.status = 'pending'
-        elif paid_installments == total_installments:
-            self.status = 'paid'
-        else:
-            self.status = 'partial'
-        self.save()
+
+def _count(queryset, group_by):
+    return Coalesce(
+        Subquery(queryset.order_by().values(group_by).annotate(n=Count('pk')).values('n')),
+        0,
+    )
+
+
+def payment_status(paid=Q(is_paid=True)):
+    """
+    The status a registration's installments imply, as one expression:
+    pending until a payment is attached to an installment (or one is marked
+    paid by hand), paid once every installment of the yatra is paid, partial
+    otherwise. `paid` selects the installments counted as paid
+    (yatra_registration.reconcile counts verified and manually paid ones).
+    """
+    installments = YatraRegistrationInstallment.objects.filter(registration=OuterRef('pk'))
+    initiated = _count(installments.filter(Q(payment__isnull=False) | paid), 'registration')
+    paid = _count(installments.filter(paid), 'registration')
+    total = _count(YatraInstallment.objects.filter(yatra=OuterRef('yatra')), 'yatra')
+    return Case(
+        When(GreaterThan(initiated, 0) & Exact(paid, total), then=Value('paid')),
+        When(GreaterThan(initiated, 0), then=Value('partial')),
+        default=Value('pending'),
+        output_field=models.CharField(),
+    )
+
+
+def status_drift():
+    """
+    Q over registrations annotated with expected_status (payment_status())
+    whose stored status is wrong. Registration marks a registration partial
+    as soon as installments are selected, before any payment is attached;
+    that is not drift.
+    """
+    return (
+        Q(status__in=RECOMPUTED_STATUSES)
+        & ~Q(status=F('expected_status'))
+        & ~Q(status='partial', expected_status='pending')
+    )
 
 
 class YatraRegistrationInstallment(models.Model):
@@ -194,14 +271,21 @@ class RegistrationCustomFieldValue(models.Model):
         unique_together = ('registration', 'custom_field')
 
 class RCSDownloadEvent(models.Model):
+    """
+    Per-registration RCS download rollup: an atomic counter plus the last few
+    download times for the admin. Every download is also logged as an
+    RCSDownloadLog row; see yatra_registration.rcs_downloads.
+    """
     registration = models.OneToOneField(
         "YatraRegistration",
         on_delete=models.CASCADE,
         related_name="rcs_download_event"
     )
     count = models.PositiveIntegerField(default=0)
-    timestamps = models.JSONField(default=list, blank=True)
     last_downloaded_at = models.DateTimeField(null=True, blank=True)
+    # Newest first, at most rcs_downloads.RECENT_DOWNLOADS ISO timestamps; written by the rollup
+    recent_downloads = models.JSONField(default=list, blank=True)
+    rolled_up_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -210,12 +294,171 @@ class RCSDownloadEvent(models.Model):
             models.Index(fields=["last_downloaded_at"]),
         ]
 
-    def record_download(self):
-        now = timezone.now()
-        self.count += 1
-        self.timestamps.append(now.isoformat())
-        self.last_downloaded_at = now
-        self.save(update_fields=["count", "timestamps", "last_downloaded_at"])
+    def __str__(self):
+        return f"RCS downloads: {self.count} for {self.registration_id}"
+
+
+class RCSDownloadLog(models.Model):
+    """
+    One row per RCS download. Rows are inserted in batches from a per-process
+    buffer, so the foreign key has no database constraint: a batch never fails
+    because one registration was deleted meanwhile (Django still cascades).
+    """
+    registration = models.ForeignKey(
+        "YatraRegistration",
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name="rcs_download_logs",
+    )
+    downloaded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["registration", "downloaded_at"], name="rcslog_reg_downloaded_idx"),
+        ]
+
+    def __str__(self):
+        return f"RCS download {self.registration_id} @ {self.downloaded_at}"
+
+
+class RegistrationDashboardRow(models.Model):
+    """
+    Denormalized per-(yatra, profile) slice of the mentor registration dashboard
+    (eligibility, registration status, installment tags, allocations, substitution fees).
+    Kept current by yatra_registration.signals and read by YatraRegistrationView.get.
+
+    A profile has one row per approved mentor (one row with no mentor when it
+    has none), so a mentor's page is a seek on the (yatra, mentor, ...) indexes.
+    The columns next to `data` copy the fields the paginated dashboards filter
+    and sort on, so a page is read in key order from those rows alone.
+    """
+    yatra = models.ForeignKey(Yatra, on_delete=models.CASCADE, related_name='dashboard_rows')
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='dashboard_rows')
+    data = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # to_mentor of one of the profile's approved MentorRequests
+    mentor = models.ForeignKey(Profile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    sort_name = models.CharField(max_length=201, blank=True, default='')
+    member_id = models.PositiveIntegerField(default=0)
+    # YatraRegistration.status, or 'waitlisted' / 'not_registered'
+    registration_status = models.CharField(max_length=20, default='not_registered')
+    is_eligible = models.BooleanField(default=False)
+    has_installment_due = models.BooleanField(default=False)
+    substitution_pending = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('yatra', 'profile', 'mentor')
+        indexes = [
+            models.Index(fields=['yatra', 'mentor', 'sort_name', 'profile'], name='dashrow_mentor_name_idx'),
+            models.Index(fields=['yatra', 'mentor', 'member_id', 'profile'], name='dashrow_mentor_member_idx'),
+            models.Index(
+                fields=['yatra', 'mentor', 'registration_status', 'sort_name', 'profile'],
+                name='dashrow_mentor_status_idx',
+            ),
+            models.Index(
+                fields=['yatra', 'mentor', 'is_eligible', 'sort_name', 'profile'],
+                name='dashrow_mentor_elig_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Dashboard row {self.profile_id} @ {self.yatra_id}"
+
+
+class YatraSeatCounter(models.Model):
+    """
+    Seats currently held on a yatra (registrations in SEAT_HOLDING_STATUSES).
+    Admission reserves seats with a conditional UPDATE on this row instead of
+    counting registrations; see yatra_registration.admission.
+    """
+    yatra = models.OneToOneField(Yatra, on_delete=models.CASCADE, primary_key=True, related_name='seat_counter')
+    seats_taken = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.seats_taken} seats taken @ {self.yatra_id}"
+
+
+class YatraWaitlistEntry(models.Model):
+    """
+    A profile waiting for a seat on a full yatra. Entries are served in arrival
+    (id) order by yatra_registration.waitlist.promote_from_waitlist.
+    """
+    yatra = models.ForeignKey(Yatra, on_delete=models.CASCADE, related_name='waitlist_entries')
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='waitlist_entries')
+    requested_by = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='waitlist_entries_made')
+    # Registration payload to apply on promotion
+    form_data = models.JSONField(default=dict, blank=True)
+    installments_selected = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('yatra', 'profile')
+        indexes = [
+            # head of a yatra's queue: WHERE yatra_id = ? ORDER BY id LIMIT n
+            models.Index(fields=['yatra', 'id']),
+        ]
+        verbose_name_plural = "Yatra Waitlist Entries"
+
+    def __str__(self):
+        return f"{self.profile} waiting for {self.yatra_id}"
+
+
+class AttendanceScan(models.Model):
+    """
+    A gate scan applied by the batch attendance sync (yatra_registration.attendance).
+    (registration, scanner_id, scanned_at) identifies a scan, so a device that
+    re-uploads a batch after a lost response gets the original outcomes back.
+    """
+    OUTCOME_CHOICES = [
+        ('marked', 'Attendance marked'),
+        ('already_attended', 'Already attended'),
+        ('not_paid', 'Not paid'),
+        ('substitution_fee_due', 'Substitution fee due'),
+        ('stale_token', 'QR printed before a status change'),
+    ]
+
+    registration = models.ForeignKey(YatraRegistration, on_delete=models.CASCADE, related_name='attendance_scans')
+    scanner_id = models.CharField(max_length=64)
+    scanned_at = models.DateTimeField()
+    outcome = models.CharField(max_length=32, choices=OUTCOME_CHOICES)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('registration', 'scanner_id', 'scanned_at')
+
+    def __str__(self):
+        return f"{self.registration_id} scanned by {self.scanner_id}: {self.outcome}"
+
+
+class RefundBatch(models.Model):
+    """
+    One run of the refund engine (yatra_registration.refunds) over a yatra's
+    cancelled registrations, with its payout file.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    yatra = models.ForeignKey(Yatra, on_delete=models.CASCADE, related_name='refund_batches')
+    created_by = models.ForeignKey(Profile, null=True, blank=True, related_name='+', on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    cancellation_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    registrations_count = models.PositiveIntegerField(default=0)
+    payments_refunded = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payout_file = models.FileField(upload_to='refunds/', blank=True)
+
+    def __str__(self):
+        return f"Refund batch of {self.yatra} ({self.registrations_count} registrations, ₹{self.total_amount})"
+
+
+class RefundItem(models.Model):
+    """What one registration is refunded: its verified installments minus the cancellation fee."""
+    batch = models.ForeignKey(RefundBatch, on_delete=models.CASCADE, related_name='items')
+    # One refund per registration, so a registration can never be paid out twice
+    registration = models.OneToOneField(YatraRegistration, on_delete=models.CASCADE, related_name='refund')
+    verified_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    refund_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_ids = models.TextField(blank=True)
 
     def __str__(self):
-        return f"RCS downloads: {self.count} for {self.registration_id}"
\ No newline at end of file
+        return f"{self.registration} refund ₹{self.refund_amount}"
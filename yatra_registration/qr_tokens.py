@@ -0,0 +1,39 @@
+# yatra_registration/qr_tokens.py
+"""
+Signed attendance tokens printed in RCS QR codes.
+
+A token is "<registration hex>.<yatra hex>.<status_version>:<signature>",
+signed with Django's Signer (HMAC-SHA256) under ATTENDANCE_QR_SIGNING_KEY.
+A scanner holding that key and the yatra's attendance manifest
+(yatra_registration.attendance.attendance_manifest) checks a slip without
+calling the server: the signature proves the slip is genuine, and a
+status_version lower than the manifest's means the slip was printed before
+the registration's last status change.
+"""
+import uuid
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'yatra_registration.attendance-qr'
+
+
+class InvalidAttendanceToken(ValueError):
+    pass
+
+
+def _signer():
+    return signing.Signer(key=settings.ATTENDANCE_QR_SIGNING_KEY, salt=TOKEN_SALT, algorithm='sha256')
+
+
+def attendance_token(registration):
+    return _signer().sign(f"{registration.id.hex}.{registration.yatra_id.hex}.{registration.status_version}")
+
+
+def read_attendance_token(token):
+    """(registration_id, yatra_id, status_version) of a token; raises InvalidAttendanceToken."""
+    try:
+        registration_id, yatra_id, version = _signer().unsign(token).split('.')
+        return uuid.UUID(registration_id), uuid.UUID(yatra_id), int(version)
+    except (signing.BadSignature, ValueError):
+        raise InvalidAttendanceToken("Invalid attendance token.")
@@ -0,0 +1,293 @@
+# yatra_registration/rcs.py
+"""
+Server-side RCS (registration confirmation slip) PDFs.
+
+Everything printed on a slip is first collected into a plain dict
+(registration_rcs_inputs). The PDF is stored under the SHA-256 of that dict,
+rcs/<yatra>/<registration>/<digest>.pdf, so a repeat download with unchanged
+inputs is served from storage and any change (allocation, status, notes, ...)
+renders a new file. prerender_yatra() renders every confirmed registration of
+a yatra; it is started in the background when is_rcs_download_open is
+switched on, so the download rush mostly reads stored files.
+"""
+import hashlib
+import json
+import logging
+import threading
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models import Prefetch
+from django.utils import timezone
+from reportlab.graphics.barcode.qr import QrCodeWidget
+from reportlab.graphics.shapes import Drawing
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+from xml.sax.saxutils import escape
+
+from yatra.models import Yatra
+from .models import RegistrationAccommodation, RegistrationJourney, YatraRegistration
+from .qr_tokens import attendance_token
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so stored slips are re-rendered
+RCS_LAYOUT_VERSION = 1
+RCS_STATUSES = ('paid', 'attended')
+
+
+def _dt(value):
+    return timezone.localtime(value).strftime("%d %b %Y, %I:%M %p") if value else ""
+
+
+def attendance_url(registration, request=None):
+    """Absolute MarkAttendanceView URL encoded in the QR, carrying the signed attendance token."""
+    path = settings.ATTENDANCE_URL_PATH.format(registration_id=registration.id)
+    path = f"{path}?{urlencode({'t': attendance_token(registration)})}"
+    if settings.BACKEND_BASE_URL:
+        return settings.BACKEND_BASE_URL.rstrip('/') + path
+    return request.build_absolute_uri(path) if request else None
+
+
+def rcs_registrations():
+    """Registrations with everything a slip needs, in three queries per batch."""
+    return (
+        YatraRegistration.objects
+        .select_related('registered_for', 'yatra')
+        .prefetch_related(
+            Prefetch(
+                'accommodation_allocations',
+                queryset=RegistrationAccommodation.objects.select_related('accommodation'),
+            ),
+            Prefetch(
+                'journey_allocations',
+                queryset=RegistrationJourney.objects.select_related('journey').order_by('journey__start_datetime'),
+            ),
+        )
+    )
+
+
+def yatra_rcs_context(yatra):
+    """The part of the slip shared by every registration of the yatra."""
+    return {
+        'title': yatra.title,
+        'location': yatra.location,
+        'start_date': str(yatra.start_date),
+        'end_date': str(yatra.end_date),
+        'contacts': [
+            {'title': c.title, 'numbers': c.numbers}
+            for c in yatra.contact_categories.filter(show_in_rcs=True)
+        ],
+        'notes': [n.note for n in yatra.important_notes.filter(show_in_rcs=True)],
+    }
+
+
+def registration_rcs_inputs(registration, yatra_context, qr_url):
+    profile = registration.registered_for
+    return {
+        'version': RCS_LAYOUT_VERSION,
+        'registration_id': str(registration.id),
+        'status': registration.status,
+        'qr_url': qr_url,
+        'participant': {
+            'name': f"{profile.first_name or ''} {profile.last_name or ''}".strip(),
+            'initiated_name': profile.initiated_name or '',
+            'member_id': profile.member_id,
+            'mobile': profile.mobile or '',
+            'center': profile.center or '',
+        },
+        'journeys': [
+            {
+                'type': a.journey.get_type_display(),
+                'from': a.journey.from_location,
+                'to': a.journey.to_location,
+                'start': _dt(a.journey.start_datetime),
+                'end': _dt(a.journey.end_datetime),
+                'mode': a.journey.mode_of_travel or '',
+                'vehicle_number': a.vehicle_number or '',
+                'seat_number': a.seat_number or '',
+            }
+            for a in registration.journey_allocations.all()
+        ],
+        'accommodations': [
+            {
+                'place': a.accommodation.place_name,
+                'address': a.accommodation.address or '',
+                'checkin': _dt(a.accommodation.checkin_datetime),
+                'checkout': _dt(a.accommodation.checkout_datetime),
+                'contact': " ".join(filter(None, [a.accommodation.contact_person, a.accommodation.contact_number])),
+                'room_number': a.room_number or '',
+                'bed_number': a.bed_number or '',
+            }
+            for a in registration.accommodation_allocations.all()
+        ],
+        'yatra': yatra_context,
+    }
+
+
+def rcs_digest(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# ---------------------------------------------------------------------
+# Rendering
+# ---------------------------------------------------------------------
+def _qr(url, size=40 * mm):
+    widget = QrCodeWidget(url)
+    x1, y1, x2, y2 = widget.getBounds()
+    drawing = Drawing(size, size, transform=[size / (x2 - x1), 0, 0, size / (y2 - y1), 0, 0])
+    drawing.add(widget)
+    return drawing
+
+
+def _table(header, rows):
+    table = Table([header] + rows, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#eeeeee')),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]))
+    return table
+
+
+def render_rcs_pdf(inputs):
+    styles = getSampleStyleSheet()
+    yatra, person = inputs['yatra'], inputs['participant']
+
+    def p(text, style='Normal'):
+        return Paragraph(escape(str(text)), styles[style])
+
+    story = [
+        p(yatra['title'], 'Title'),
+        p(f"{yatra['location']}, {yatra['start_date']} to {yatra['end_date']}"),
+        Spacer(1, 6 * mm),
+        Table(
+            [[
+                [
+                    p("Registration Confirmation Slip", 'Heading2'),
+                    p(f"Name: {person['name']}"),
+                    p(f"Initiated name: {person['initiated_name']}") if person['initiated_name'] else Spacer(1, 0),
+                    p(f"Member ID: {person['member_id'] or '-'}"),
+                    p(f"Mobile: {person['mobile'] or '-'}"),
+                    p(f"Center: {person['center'] or '-'}"),
+                    p(f"Registration: {inputs['registration_id']}"),
+                ],
+                _qr(inputs['qr_url']),
+            ]],
+            colWidths=[None, 45 * mm],
+            style=[('VALIGN', (0, 0), (-1, -1), 'TOP')],
+        ),
+    ]
+
+    if inputs['journeys']:
+        story += [Spacer(1, 5 * mm), p("Journey", 'Heading3'), _table(
+            ["Type", "From - To", "Departure", "Arrival", "Mode", "Vehicle", "Seat"],
+            [
+                [j['type'], p(f"{j['from']} - {j['to']}"), j['start'], j['end'], j['mode'], j['vehicle_number'], j['seat_number']]
+                for j in inputs['journeys']
+            ],
+        )]
+
+    if inputs['accommodations']:
+        story += [Spacer(1, 5 * mm), p("Accommodation", 'Heading3'), _table(
+            ["Place", "Check-in", "Check-out", "Room", "Bed", "Contact"],
+            [
+                [p(f"{a['place']}\n{a['address']}".strip()), a['checkin'], a['checkout'], a['room_number'], a['bed_number'], p(a['contact'])]
+                for a in inputs['accommodations']
+            ],
+        )]
+
+    if yatra['contacts']:
+        story += [Spacer(1, 5 * mm), p("Contacts", 'Heading3')]
+        story += [p(f"{c['title']}: {c['numbers']}") for c in yatra['contacts']]
+
+    if yatra['notes']:
+        story += [Spacer(1, 5 * mm), p("Important Notes", 'Heading3')]
+        story += [p(f"- {note}") for note in yatra['notes']]
+
+    buffer = BytesIO()
+    SimpleDocTemplate(
+        buffer, pagesize=A4, title=f"RCS {person['name']}",
+        leftMargin=15 * mm, rightMargin=15 * mm, topMargin=15 * mm, bottomMargin=15 * mm,
+        # Fixed metadata keeps identical inputs byte-identical
+        invariant=1,
+    ).build(story)
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------------------
+# Content-addressed storage
+# ---------------------------------------------------------------------
+def rcs_path(registration, digest):
+    return f"rcs/{registration.yatra_id}/{registration.id}/{digest}.pdf"
+
+
+def get_or_render_rcs(registration, yatra_context, qr_url):
+    """Storage name of the slip for the registration's current inputs, rendering it if needed."""
+    inputs = registration_rcs_inputs(registration, yatra_context, qr_url)
+    path = rcs_path(registration, rcs_digest(inputs))
+    cache_key = f"rcs-stored:{path}"
+    if cache.get(cache_key) or default_storage.exists(path):
+        cache.set(cache_key, True, None)
+        return path
+
+    pdf = render_rcs_pdf(inputs)
+    if not default_storage.exists(path):
+        path = default_storage.save(path, ContentFile(pdf))
+    cache.set(cache_key, True, None)
+    return path
+
+
+def prerender_yatra(yatra_id, batch_size=200):
+    """Render the slips of every confirmed registration of a yatra. Returns how many were checked."""
+    yatra = Yatra.objects.get(id=yatra_id)
+    yatra_context = yatra_rcs_context(yatra)
+    registrations = rcs_registrations().filter(yatra=yatra, status__in=RCS_STATUSES).order_by('id')
+
+    done, last_id = 0, None
+    while True:
+        batch = registrations.filter(id__gt=last_id) if last_id else registrations
+        batch = list(batch[:batch_size])
+        if not batch:
+            return done
+        for registration in batch:
+            get_or_render_rcs(registration, yatra_context, attendance_url(registration))
+        done += len(batch)
+        last_id = batch[-1].id
+
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+def prerender_in_background(yatra_id):
+    """Start prerender_yatra in a daemon thread (once per yatra per process)."""
+    if not settings.BACKEND_BASE_URL:
+        logger.warning("BACKEND_BASE_URL is not set; RCS slips of yatra %s are rendered on demand", yatra_id)
+        return
+    with _running_lock:
+        if yatra_id in _running:
+            return
+        _running.add(yatra_id)
+
+    def run():
+        try:
+            count = prerender_yatra(yatra_id)
+            logger.info("Pre-rendered %s RCS slips for yatra %s", count, yatra_id)
+        except Exception:
+            logger.exception("RCS pre-render failed for yatra %s", yatra_id)
+        finally:
+            with _running_lock:
+                _running.discard(yatra_id)
+            connections.close_all()
+
+    threading.Thread(target=run, name=f"rcs-prerender-{yatra_id}", daemon=True).start()
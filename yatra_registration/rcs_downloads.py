@@ -0,0 +1,164 @@
+# yatra_registration/rcs_downloads.py
+"""
+RCS download tracking.
+
+record_download() bumps the registration's RCSDownloadEvent counter with one
+conditional UPDATE (no read-modify-write, so concurrent downloads never lose
+increments) and queues an RCSDownloadLog row in a per-process buffer. The
+buffer is written with one bulk INSERT once it holds RCS_LOG_BUFFER_SIZE rows
+or its oldest row is RCS_LOG_FLUSH_SECONDS old, checked on every download and
+after every request the process serves, and when the process exits. A failed
+INSERT is logged and its rows stay buffered for the next flush; it never
+fails the download.
+
+rollup() (the rollup_rcs_downloads command) copies the newest log rows of
+every registration downloaded since its last rollup into
+RCSDownloadEvent.recent_downloads, so the admin reads a bounded list per
+registration instead of the whole history. Downloads newer than
+RCS_LOG_FLUSH_SECONDS may still sit in a process's buffer, so they are left
+for the next run. Nothing runs it automatically:
+schedule the command (cron or the platform scheduler, e.g. every 10 minutes)
+wherever the admin's download lists should stay current.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import RCSDownloadEvent, RCSDownloadLog, YatraRegistration
+
+logger = logging.getLogger(__name__)
+
+RECENT_DOWNLOADS = 10
+# Rows kept for retry while the database refuses them, in buffer sizes
+MAX_BUFFERED_FLUSHES = 10
+
+
+class _LogBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = []
+        self._oldest = None
+
+    def add(self, registration_id, downloaded_at):
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(RCSDownloadLog(registration_id=registration_id, downloaded_at=downloaded_at))
+            due = self._due()
+        if due:
+            self.flush()
+
+    def _due(self):
+        return bool(self._rows) and (
+            len(self._rows) >= settings.RCS_LOG_BUFFER_SIZE
+            or time.monotonic() - self._oldest >= settings.RCS_LOG_FLUSH_SECONDS
+        )
+
+    def flush_if_due(self):
+        # Unlocked read: an empty buffer, the common case, costs nothing
+        if self._rows and self._due():
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            oldest = self._oldest
+        if not rows:
+            return
+        try:
+            # Own savepoint: a failure must not break the caller's transaction
+            with transaction.atomic():
+                RCSDownloadLog.objects.bulk_create(rows)
+        except DatabaseError:
+            logger.exception("Could not write %d buffered RCS download log rows; keeping them for retry", len(rows))
+            self._requeue(rows, oldest)
+
+    def _requeue(self, rows, oldest):
+        with self._lock:
+            self._rows = rows + self._rows
+            self._oldest = oldest
+            limit = MAX_BUFFERED_FLUSHES * settings.RCS_LOG_BUFFER_SIZE
+            if len(self._rows) > limit:
+                logger.error("Dropping %d buffered RCS download log rows", len(self._rows) - limit)
+                self._rows = self._rows[-limit:]
+
+
+_buffer = _LogBuffer()
+flush_download_log = _buffer.flush
+
+
+@receiver(request_finished)
+def _flush_after_request(sender, **kwargs):
+    # Rows of the last downloads before a quiet spell would otherwise wait for the next download
+    _buffer.flush_if_due()
+
+
+atexit.register(flush_download_log)
+
+
+def record_download(registration_id):
+    """
+    Count one download. Returns (count, created), or (None, False) when the
+    registration does not exist.
+    """
+    now = timezone.now()
+    events = RCSDownloadEvent.objects.filter(registration_id=registration_id)
+    created = False
+    if not events.update(count=F('count') + 1, last_downloaded_at=now):
+        # First download of this registration
+        if not YatraRegistration.objects.filter(id=registration_id).exists():
+            return None, False
+        _, created = RCSDownloadEvent.objects.get_or_create(registration_id=registration_id)
+        events.update(count=F('count') + 1, last_downloaded_at=now)
+
+    _buffer.add(registration_id, now)
+    return events.values_list('count', flat=True).get(), created
+
+
+def rollup(batch_size=500):
+    """
+    Refresh recent_downloads of the registrations downloaded since their last
+    rollup, up to RCS_LOG_FLUSH_SECONDS ago.
+    """
+    settled = timezone.now() - timedelta(seconds=settings.RCS_LOG_FLUSH_SECONDS)
+    pending = (
+        RCSDownloadEvent.objects
+        .filter(Q(rolled_up_at__isnull=True) | Q(last_downloaded_at__gt=F('rolled_up_at')))
+        .filter(last_downloaded_at__lte=settled)
+        .only('id', 'registration_id', 'last_downloaded_at')
+        .order_by('id')
+    )
+    updated = 0
+    last_id = 0
+    while True:
+        events = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not events:
+            return updated
+        last_id = events[-1].id
+
+        recent = {}
+        for row in (
+            RCSDownloadLog.objects
+            .filter(registration_id__in=[e.registration_id for e in events])
+            .annotate(rank=Window(RowNumber(), partition_by=F('registration_id'), order_by=F('downloaded_at').desc()))
+            .filter(rank__lte=RECENT_DOWNLOADS)
+            .order_by('registration_id', '-downloaded_at')
+            .values_list('registration_id', 'downloaded_at')
+        ):
+            recent.setdefault(row[0], []).append(row[1])
+
+        for event in events:
+            event.recent_downloads = [t.isoformat() for t in recent.get(event.registration_id, [])]
+            event.rolled_up_at = event.last_downloaded_at
+        RCSDownloadEvent.objects.bulk_update(events, ['recent_downloads', 'rolled_up_at'])
+        updated += len(events)
@@ -0,0 +1,137 @@
+# yatra_registration/reconcile.py
+"""
+Registration/payment consistency check.
+
+A registration's installment flags and status are derived data: an
+installment is paid exactly when its payment is verified, or when staff
+marked it paid by hand without attaching a payment (offline or manual
+payments), and the status follows from the installments
+(YatraRegistration.payment_status). Admin
+edits and half-applied payment updates can leave the stored values behind.
+reconcile_yatra() computes the expected values for every registration of a
+yatra in two queries (one over installments, one over registrations with
+correlated aggregates), reports the differences and, with repair=True,
+fixes them in batched UPDATEs.
+
+Attended, substituted, cancelled and refunded registrations are reported
+when their installments disagree but their status is never rewritten.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    BooleanField, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import YatraRegistration, YatraRegistrationInstallment, payment_status
+from .signals import registrations_changed
+from .status import recompute_statuses, status_drift
+
+VERIFIED = Q(payment__status='verified')
+# Paid by hand, with no payment to check against
+MANUALLY_PAID = Q(is_paid=True, payment__isnull=True)
+# What the report and the repair both count as paid
+PAID = VERIFIED | MANUALLY_PAID
+
+
+def _amount(installments):
+    return Coalesce(
+        Subquery(
+            installments.order_by().values('registration')
+            .annotate(total=Sum('installment__amount')).values('total')
+        ),
+        Value(Decimal('0')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def installment_drift(yatra_id):
+    """Installments whose is_paid disagrees with their payment's verification."""
+    return (
+        YatraRegistrationInstallment.objects
+        .filter(registration__yatra_id=yatra_id)
+        .filter(Q(is_paid=True) & ~PAID | Q(is_paid=False) & VERIFIED)
+    )
+
+
+def registration_drift(yatra_id):
+    """Registrations whose status or paid amount disagrees with their paid installments."""
+    installments = YatraRegistrationInstallment.objects.filter(registration=OuterRef('pk'))
+    return (
+        YatraRegistration.objects
+        .filter(yatra_id=yatra_id)
+        .annotate(
+            expected_status=payment_status(paid=PAID),
+            paid_amount_stored=_amount(installments.filter(is_paid=True)),
+            paid_amount_expected=_amount(installments.filter(PAID)),
+        )
+        .annotate(status_drifted=ExpressionWrapper(status_drift(), output_field=BooleanField()))
+        .filter(status_drift() | ~Q(paid_amount_stored=F('paid_amount_expected')))
+    )
+
+
+def reconcile_yatra(yatra_id, repair=False, batch_size=1000):
+    """
+    Drift report for one yatra:
+
+        {"yatra_id": ..., "registrations_checked": n, "installments": [...],
+         "registrations": [...], "repaired": {...} or None}
+    """
+    installments = [
+        {
+            'id': str(row['id']),
+            'registration_id': str(row['registration_id']),
+            'installment': row['installment__label'],
+            'is_paid': row['is_paid'],
+            'payment_status': row['payment__status'],
+        }
+        for row in installment_drift(yatra_id).values(
+            'id', 'registration_id', 'installment__label', 'is_paid', 'payment__status',
+        )
+    ]
+    registrations = [
+        {
+            'id': str(row['id']),
+            'member_id': row['registered_for__member_id'],
+            'status': row['status'],
+            'expected_status': row['expected_status'] if row['status_drifted'] else row['status'],
+            'paid_amount': row['paid_amount_stored'],
+            'expected_paid_amount': row['paid_amount_expected'],
+        }
+        for row in registration_drift(yatra_id).values(
+            'id', 'registered_for__member_id', 'status', 'expected_status', 'status_drifted',
+            'paid_amount_stored', 'paid_amount_expected',
+        )
+    ]
+    report = {
+        'yatra_id': str(yatra_id),
+        'registrations_checked': YatraRegistration.objects.filter(yatra_id=yatra_id).count(),
+        'installments': installments,
+        'registrations': registrations,
+        'repaired': None,
+    }
+    if repair:
+        report['repaired'] = repair_yatra(yatra_id, batch_size=batch_size)
+    return report
+
+
+def repair_yatra(yatra_id, batch_size=1000):
+    """Apply the fixes reconcile_yatra() reports. Returns how many rows each step changed."""
+    now = timezone.now()
+    drifted = list(installment_drift(yatra_id).values_list('id', 'registration_id', 'is_paid'))
+    for start in range(0, len(drifted), batch_size):
+        batch = drifted[start:start + batch_size]
+        with transaction.atomic():
+            # is_paid drifted, so flipping it gives the expected value
+            YatraRegistrationInstallment.objects.filter(id__in=[i for i, _, paid in batch if not paid]).update(
+                is_paid=True, paid_at=Coalesce(F('paid_at'), Value(now)),
+            )
+            YatraRegistrationInstallment.objects.filter(id__in=[i for i, _, paid in batch if paid]).update(
+                is_paid=False, paid_at=None,
+            )
+            registrations_changed({registration_id for _, registration_id, _ in batch})
+
+    statuses = recompute_statuses(YatraRegistration.objects.filter(yatra_id=yatra_id), batch_size=batch_size)
+    return {'installments': len(drifted), 'statuses': len(statuses)}
@@ -0,0 +1,172 @@
+# yatra_registration/refunds.py
+"""
+Batch refunds for cancelled registrations.
+
+Once a yatra's payment_refund_date has arrived, refund_batch() selects every
+cancelled registration that has not been refunded yet, with its verified
+installment total and refund amount (verified total minus the yatra's
+cancellation fee) computed in one query. Registrations with nothing left to
+refund stay cancelled. The selected registrations get a RefundItem each and
+a payout CSV is stored on the RefundBatch. One UPDATE then moves them to
+refunded.
+
+A payment moves to refunded (Payment.bulk_transition) only when every
+registration it paid for has been refunded. A payment shared with
+registrations that are still active stays verified.
+"""
+import csv
+import io
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import DecimalField, Exists, ExpressionWrapper, F, OuterRef, Value
+from django.utils import timezone
+
+from payment.models import Payment
+from yatra.models import Yatra
+from .models import RefundBatch, RefundItem, YatraRegistration, YatraRegistrationInstallment
+from .reconcile import VERIFIED, _amount
+from .signals import registrations_changed
+
+PAYOUT_COLUMNS = [
+    'registration_id', 'member_id', 'name', 'mobile', 'email', 'transaction_ids',
+    'verified_amount', 'cancellation_fee', 'refund_amount',
+]
+
+
+class RefundError(Exception):
+    pass
+
+
+def refundable_registrations(yatra):
+    """The yatra's cancelled, not yet refunded registrations, annotated with verified_amount and refund_amount."""
+    installments = YatraRegistrationInstallment.objects.filter(VERIFIED, registration=OuterRef('pk'))
+    fee = Value(yatra.cancellation_fee or Decimal('0'))
+    return (
+        YatraRegistration.objects
+        .filter(yatra=yatra, status='cancelled', refund__isnull=True)
+        .annotate(verified_amount=_amount(installments))
+        .annotate(refund_amount=ExpressionWrapper(
+            F('verified_amount') - fee, output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+        .filter(refund_amount__gt=0)
+    )
+
+
+def _payout_rows(registrations, fee):
+    rows = list(
+        registrations.values(
+            'id', 'verified_amount', 'refund_amount',
+            member_id=F('registered_for__member_id'),
+            first_name=F('registered_for__first_name'),
+            last_name=F('registered_for__last_name'),
+            mobile=F('registered_for__mobile'),
+            email=F('registered_for__user__email'),
+        ).order_by('registered_for__member_id', 'id')
+    )
+    # The refund goes back to the account each verified payment came from
+    transactions = defaultdict(list)
+    for registration_id, transaction_id in (
+        YatraRegistrationInstallment.objects
+        .filter(VERIFIED, registration_id__in=[row['id'] for row in rows])
+        .order_by('payment__uploaded_at')
+        .values_list('registration_id', 'payment__transaction_id')
+        .distinct()
+    ):
+        transactions[registration_id].append(transaction_id)
+
+    return [
+        {
+            'registration_id': str(row['id']),
+            'member_id': row['member_id'],
+            'name': f"{row['first_name'] or ''} {row['last_name'] or ''}".strip(),
+            'mobile': row['mobile'] or '',
+            'email': row['email'] or '',
+            'transaction_ids': ' '.join(transactions[row['id']]),
+            'verified_amount': row['verified_amount'],
+            'cancellation_fee': fee,
+            'refund_amount': row['refund_amount'],
+        }
+        for row in rows
+    ]
+
+
+def payout_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=PAYOUT_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            **row,
+            **{column: f"{Decimal(row[column]):.2f}" for column in ('verified_amount', 'cancellation_fee', 'refund_amount')},
+        })
+    return out.getvalue().encode('utf-8')
+
+
+def refund_batch(yatra_id, user_profile, apply=True, today=None):
+    """
+    Refund the yatra's eligible cancelled registrations. Returns
+    (batch, rows): the RefundBatch (None when apply=False or nothing is
+    eligible) and the payout rows.
+    """
+    yatra = Yatra.objects.get(id=yatra_id)
+    today = today or timezone.localdate()
+    if yatra.payment_refund_date is None:
+        raise RefundError("The yatra has no payment_refund_date.")
+    if today < yatra.payment_refund_date:
+        raise RefundError(f"Refunds for this yatra start on {yatra.payment_refund_date}.")
+    fee = yatra.cancellation_fee or Decimal('0')
+
+    with transaction.atomic():
+        registrations = refundable_registrations(yatra)
+        if apply:
+            # Lock the selection so a concurrent run cannot refund the same registrations
+            locked = list(registrations.select_for_update(of=('self',)).values_list('id', flat=True))
+            registrations = registrations.filter(id__in=locked)
+        rows = _payout_rows(registrations, fee)
+        if not apply or not rows:
+            return None, rows
+
+        ids = [row['registration_id'] for row in rows]
+        batch = RefundBatch.objects.create(
+            yatra=yatra,
+            created_by=user_profile,
+            cancellation_fee=fee,
+            registrations_count=len(rows),
+            total_amount=sum(row['refund_amount'] for row in rows),
+        )
+        RefundItem.objects.bulk_create([
+            RefundItem(
+                batch=batch,
+                registration_id=row['registration_id'],
+                verified_amount=row['verified_amount'],
+                refund_amount=row['refund_amount'],
+                transaction_ids=row['transaction_ids'],
+            )
+            for row in rows
+        ])
+        # queryset.update() skips the signals; cancelled -> refunded holds no seat either way
+        YatraRegistration.objects.filter(id__in=ids, status='cancelled').update(
+            status='refunded', status_version=F('status_version') + 1, updated_at=timezone.now(),
+        )
+
+        unrefunded = (
+            YatraRegistrationInstallment.objects
+            .filter(payment=OuterRef('pk'))
+            .exclude(registration__status='refunded')
+        )
+        payments = (
+            Payment.objects
+            .filter(status='verified', installments__registration_id__in=ids)
+            .exclude(Exists(unrefunded))
+        )
+        batch.payments_refunded = Payment.bulk_transition(
+            Payment.objects.filter(id__in=payments.values('id')), 'refunded', user_profile,
+            f"Refunded in batch {batch.id}",
+        )
+        batch.payout_file.save(f"{yatra.id}/{batch.id}.csv", ContentFile(payout_csv(rows)), save=False)
+        batch.save(update_fields=['payments_refunded', 'payout_file'])
+        registrations_changed(ids)
+    return batch, rows
@@ -2,6 +2,7 @@
 from rest_framework import serializers
 from .models import *
 from payment.serializers import PaymentSerializer
+from .qr_tokens import InvalidAttendanceToken, read_attendance_token
 
 
 class YatraEligibilitySerializer(serializers.ModelSerializer):
@@ -87,3 +88,43 @@ class YatraRegistrationDetailSerializer(serializers.ModelSerializer):
         ]
 
 
+
+
+class AttendanceScanSerializer(serializers.Serializer):
+    """
+    One offline gate scan uploaded by a scanner device. Scanners send the QR
+    token they read (or a bare registration_id); the token's status_version
+    lets the sync reject slips printed before a status change.
+    """
+    registration_id = serializers.UUIDField(required=False)
+    token = serializers.CharField(required=False, write_only=True)
+    scanned_at = serializers.DateTimeField()
+    scanner_id = serializers.CharField(max_length=64)
+    # Set when the gate collected a pending substitution fee before letting the person in
+    fee_collected = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        token = attrs.pop('token', None)
+        if token is None:
+            if 'registration_id' not in attrs:
+                raise serializers.ValidationError("Send a token or a registration_id.")
+            return attrs
+        try:
+            registration_id, yatra_id, status_version = read_attendance_token(token)
+        except InvalidAttendanceToken as exc:
+            raise serializers.ValidationError({'token': str(exc)})
+        if attrs.get('registration_id', registration_id) != registration_id:
+            raise serializers.ValidationError({'token': "Token belongs to another registration."})
+        attrs.update(registration_id=registration_id, yatra_id=yatra_id, status_version=status_version)
+        return attrs
+
+
+class RefundBatchSerializer(serializers.ModelSerializer):
+    created_by = serializers.StringRelatedField()
+
+    class Meta:
+        model = RefundBatch
+        fields = [
+            'id', 'created_by', 'created_at', 'cancellation_fee', 'registrations_count',
+            'payments_refunded', 'total_amount', 'payout_file',
+        ]
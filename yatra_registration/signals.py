@@ -0,0 +1,249 @@
+# yatra_registration/signals.py
+"""
+Keep the registration dashboard read model (RegistrationDashboardRow), the
+cached registration details (yatra_registration.detail) and the yatra seat
+counters (YatraSeatCounter) current.
+
+Row-level changes schedule a batched refresh of the affected (yatra, profile)
+rows after commit; yatra-wide changes drop the yatra's rows so they are rebuilt
+on the next read. Code paths that write with queryset.update()/bulk_create()
+bypass these receivers and must call registrations_changed() themselves (and
+account seats with yatra_registration.admission).
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from payment.models import Payment
+from userProfile.models import MentorRequest, Profile
+from yatra.models import (
+    Yatra, YatraAccommodation, YatraCustomField, YatraCustomFieldValue,
+    YatraInstallment, YatraJourney,
+)
+from yatra_substitution.models import SubstitutionRequest
+from .admission import adjust_seats
+from .detail import invalidate_registration_details, invalidate_yatra_details
+from .dashboard import (
+    invalidate_yatra_dashboard, schedule_dashboard_refresh, sort_name,
+)
+from .models import (
+    SEAT_HOLDING_STATUSES, RegistrationAccommodation, RegistrationCustomFieldValue,
+    RegistrationDashboardRow,
+    RegistrationJourney, YatraEligibility, YatraRegistration,
+    YatraRegistrationInstallment, YatraSeatCounter, YatraWaitlistEntry,
+)
+from .rcs import prerender_in_background
+from .waitlist import promote_from_waitlist
+
+
+def _schedule(pairs):
+    by_yatra = defaultdict(set)
+    for yatra_id, profile_id in pairs:
+        by_yatra[yatra_id].add(profile_id)
+    for yatra_id, profile_ids in by_yatra.items():
+        schedule_dashboard_refresh(yatra_id, profile_ids)
+        invalidate_registration_details((yatra_id, profile_id) for profile_id in profile_ids)
+
+
+def registrations_changed(registration_ids):
+    """Refresh the dashboard rows behind a set of registrations after commit."""
+    registration_ids = [rid for rid in registration_ids if rid]
+    if not registration_ids:
+        return
+    _schedule(
+        YatraRegistration.objects
+        .filter(id__in=registration_ids)
+        .values_list('yatra_id', 'registered_for_id')
+    )
+
+
+# ---------------------------------------------------------------------
+# Row-level changes
+# ---------------------------------------------------------------------
+@receiver(post_save, sender=YatraRegistration)
+@receiver(post_delete, sender=YatraRegistration)
+def registration_changed(sender, instance, **kwargs):
+    _schedule([(instance.yatra_id, instance.registered_for_id)])
+
+
+@receiver(post_save, sender=YatraEligibility)
+@receiver(post_delete, sender=YatraEligibility)
+def eligibility_changed(sender, instance, **kwargs):
+    _schedule([(instance.yatra_id, instance.profile_id)])
+
+
+@receiver(post_save, sender=YatraRegistrationInstallment)
+@receiver(post_delete, sender=YatraRegistrationInstallment)
+@receiver(post_save, sender=RegistrationAccommodation)
+@receiver(post_delete, sender=RegistrationAccommodation)
+@receiver(post_save, sender=RegistrationJourney)
+@receiver(post_delete, sender=RegistrationJourney)
+@receiver(post_save, sender=RegistrationCustomFieldValue)
+@receiver(post_delete, sender=RegistrationCustomFieldValue)
+def registration_child_changed(sender, instance, **kwargs):
+    registrations_changed([instance.registration_id])
+
+
+@receiver(post_save, sender=Payment)
+@receiver(pre_delete, sender=Payment)
+def payment_changed(sender, instance, **kwargs):
+    # pre_delete: the installments are unlinked (SET_NULL) during the delete.
+    registrations_changed(
+        instance.installments.values_list('registration_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=SubstitutionRequest)
+@receiver(post_delete, sender=SubstitutionRequest)
+def substitution_changed(sender, instance, **kwargs):
+    registrations_changed([instance.registration_id, instance.new_registration_id])
+
+
+# ---------------------------------------------------------------------
+# Profile columns of the rows (sorting / mentor scoping)
+# ---------------------------------------------------------------------
+@receiver(post_save, sender=Profile)
+def profile_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields and not {'first_name', 'last_name', 'member_id'} & set(update_fields)):
+        return
+    RegistrationDashboardRow.objects.filter(profile=instance).update(
+        sort_name=sort_name(instance.first_name, instance.last_name),
+        member_id=instance.member_id or 0,
+    )
+    # registered_for in the cached details is the profile's name
+    invalidate_registration_details(
+        (yatra_id, instance.id)
+        for yatra_id in YatraRegistration.objects.filter(registered_for=instance).values_list('yatra_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=MentorRequest)
+@receiver(post_delete, sender=MentorRequest)
+def mentor_request_changed(sender, instance, **kwargs):
+    # The profile has one row per approved mentor; rebuild the rows it already has
+    _schedule(
+        (yatra_id, instance.from_user_id)
+        for yatra_id in RegistrationDashboardRow.objects
+        .filter(profile_id=instance.from_user_id)
+        .values_list('yatra_id', flat=True)
+        .distinct()
+    )
+
+
+# ---------------------------------------------------------------------
+# Yatra-wide changes
+# ---------------------------------------------------------------------
+# Yatra fields copied into the dashboard rows and the cached details
+YATRA_DASHBOARD_FIELDS = ('cancellation_fee', 'substitution_fee')
+YATRA_DETAIL_FIELDS = ('title',)
+# Stored values the post_save receivers below compare against
+YATRA_SNAPSHOT_FIELDS = ('capacity', 'is_rcs_download_open') + YATRA_DASHBOARD_FIELDS + YATRA_DETAIL_FIELDS
+
+
+@receiver(pre_save, sender=Yatra)
+def yatra_snapshot(sender, instance, **kwargs):
+    # One query per save, shared by every Yatra receiver; None for new yatras
+    instance._stored = None if instance._state.adding else (
+        Yatra.objects.filter(pk=instance.pk).values(*YATRA_SNAPSHOT_FIELDS).first()
+    )
+
+
+def _yatra_changed_fields(instance):
+    """Snapshot fields the save changed (all of them when nothing was stored before)."""
+    stored = getattr(instance, '_stored', None)
+    if stored is None:
+        return set(YATRA_SNAPSHOT_FIELDS)
+    return {field for field in YATRA_SNAPSHOT_FIELDS if getattr(instance, field) != stored[field]}
+
+
+@receiver(post_save, sender=Yatra)
+def yatra_changed(sender, instance, created, **kwargs):
+    if not created and _yatra_changed_fields(instance) & set(YATRA_DASHBOARD_FIELDS):
+        invalidate_yatra_dashboard(instance.id)
+
+
+@receiver(post_save, sender=YatraInstallment)
+@receiver(post_delete, sender=YatraInstallment)
+@receiver(post_save, sender=YatraAccommodation)
+@receiver(post_delete, sender=YatraAccommodation)
+@receiver(post_save, sender=YatraJourney)
+@receiver(post_delete, sender=YatraJourney)
+def yatra_detail_changed(sender, instance, **kwargs):
+    invalidate_yatra_dashboard(instance.yatra_id)
+
+
+@receiver(post_save, sender=Yatra)
+@receiver(post_save, sender=YatraInstallment)
+@receiver(post_delete, sender=YatraInstallment)
+def yatra_detail_cache_changed(sender, instance, created=False, **kwargs):
+    # The cached details show the yatra title and installment labels/amounts
+    if sender is Yatra:
+        if not created and _yatra_changed_fields(instance) & set(YATRA_DETAIL_FIELDS):
+            invalidate_yatra_details(instance.id)
+    elif sender is YatraInstallment:
+        invalidate_yatra_details(instance.yatra_id)
+
+
+@receiver(post_save, sender=YatraCustomFieldValue)
+@receiver(post_delete, sender=YatraCustomFieldValue)
+def yatra_custom_value_changed(sender, instance, **kwargs):
+    yatra_id = (
+        YatraCustomField.objects
+        .filter(id=instance.custom_field_id)
+        .values_list('yatra_id', flat=True)
+        .first()
+    )
+    if yatra_id:
+        invalidate_yatra_dashboard(yatra_id)
+
+
+# ---------------------------------------------------------------------
+# Seat accounting
+# ---------------------------------------------------------------------
+@receiver(post_save, sender=Yatra)
+def yatra_seats_changed(sender, instance, created, **kwargs):
+    if created:
+        YatraSeatCounter.objects.create(yatra=instance)
+        return
+    stored = getattr(instance, '_stored', None)
+    if stored is None or instance.capacity > stored['capacity']:
+        # Seats freed up for the waitlist
+        transaction.on_commit(lambda: promote_from_waitlist(instance))
+
+
+@receiver(post_save, sender=YatraRegistration)
+def registration_seat_saved(sender, instance, created, **kwargs):
+    if created:
+        held_before = False
+    elif getattr(instance, '_loaded_status', None) is not None:
+        held_before = instance._loaded_status in SEAT_HOLDING_STATUSES
+    else:
+        # Saved from an instance that was not loaded with its status; nothing to compare
+        held_before = instance.holds_seat
+
+    if held_before != instance.holds_seat:
+        adjust_seats(instance.yatra_id, 1 if instance.holds_seat else -1)
+    instance._loaded_status = instance.status
+
+    if created:
+        YatraWaitlistEntry.objects.filter(
+            yatra_id=instance.yatra_id, profile_id=instance.registered_for_id
+        ).delete()
+
+
+@receiver(post_delete, sender=YatraRegistration)
+def registration_seat_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_loaded_status', instance.status) in SEAT_HOLDING_STATUSES:
+        adjust_seats(instance.yatra_id, -1)
+
+
+# ---------------------------------------------------------------------
+# RCS pre-render
+# ---------------------------------------------------------------------
+@receiver(post_save, sender=Yatra)
+def yatra_rcs_opened(sender, instance, **kwargs):
+    if instance.is_rcs_download_open and 'is_rcs_download_open' in _yatra_changed_fields(instance):
+        yatra_id = instance.id
+        transaction.on_commit(lambda: prerender_in_background(yatra_id))
@@ -0,0 +1,46 @@
+# yatra_registration/status.py
+"""
+Set-based recompute of payment-derived registration statuses.
+
+recompute_statuses() evaluates YatraRegistration's payment_status()
+expression in the database for a whole set of registrations: one SELECT
+finds the rows whose stored status disagrees (status_drift, the rule
+YatraRegistration.update_status() applies to one row), one UPDATE per batch
+fixes them. Only pending/partial/paid registrations are touched; attended,
+substituted, cancelled and refunded are decided elsewhere. All three
+recomputed statuses hold a seat, so seat counters are unaffected.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import RECOMPUTED_STATUSES, YatraRegistration, payment_status, status_drift
+from .signals import registrations_changed
+
+
+def recompute_statuses(registrations=None, batch_size=1000):
+    """
+    Fix the status of `registrations` (a YatraRegistration queryset, default:
+    all). Returns the ids whose status changed.
+    """
+    if registrations is None:
+        registrations = YatraRegistration.objects.all()
+    stale = registrations.annotate(expected_status=payment_status()).filter(status_drift())
+
+    changed = []
+    ids = list(stale.order_by().values_list('id', flat=True))
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        with transaction.atomic():
+            YatraRegistration.objects.filter(id__in=batch, status__in=RECOMPUTED_STATUSES).update(
+                status=payment_status(),
+                status_version=F('status_version') + 1,
+                updated_at=timezone.now(),
+            )
+            registrations_changed(batch)
+        changed += batch
+    return changed
+
+
+def recompute_yatra_statuses(yatra_id, **kwargs):
+    return recompute_statuses(YatraRegistration.objects.filter(yatra_id=yatra_id), **kwargs)
@@ -1,3 +1,931 @@
-from django.test import TestCase
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlsplit
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from django.urls import clear_url_caches, resolve
+from django.utils import timezone
+
+from helpers.db import upsert_kwargs
+from helpers.instrumentation.testing import assert_view_query_budget
+from helpers.testing import TemporaryMediaMixin, YatraTestCase, client_for, make_profile, make_staff, make_yatra
+from payment.models import Payment
+from userProfile.models import MentorRequest
+from yatra_substitution.models import SubstitutionRequest
+from .admission import recount_seats, reserve_seats
+from .detail import registration_detail_key
+from .models import (
+    AttendanceScan, RCSDownloadEvent, RCSDownloadLog, RefundBatch, RegistrationDashboardRow, YatraRegistration, YatraRegistrationInstallment, YatraSeatCounter,
+    YatraWaitlistEntry, payment_status,
+)
+from .rcs_downloads import flush_download_log, rollup
+from .reconcile import reconcile_yatra
+from .refunds import PAYOUT_COLUMNS, RefundError, refund_batch
+from .qr_tokens import InvalidAttendanceToken, attendance_token, read_attendance_token
+from .rcs import attendance_url, rcs_digest, registration_rcs_inputs, yatra_rcs_context
+from .status import recompute_statuses
+from .views import (
+    AttendanceManifestView, AttendanceSyncView, MarkAttendanceView, RefundBatchView,
+    YatraEligibilityView, YatraRegistrationView,
+)
+
+
+class QueryBudgetTests(TemporaryMediaMixin, YatraTestCase):
+    """Every budgeted view stays within its query_budget however many mentees are involved."""
+    mentee_count = 2
+    SIZES = (2, 12)
+
+    def grow_to(self, size):
+        if len(self.mentees) < size:
+            self.add_mentees(size - len(self.mentees), prefix=f"m{size}_")
+
+    def assert_budget(self, view, method, request):
+        with assert_view_query_budget(view, method):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = request()
+                if getattr(response, 'streaming', False):
+                    b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 300, getattr(response, 'data', None))
+        return response
+
+    def test_eligibility(self):
+        for size in self.SIZES:
+            with self.subTest(mentees=size):
+                self.grow_to(size)
+                self.assert_budget(YatraEligibilityView, 'POST', lambda: self.client.post(
+                    f"/yatras/{self.yatra.id}/eligibility/",
+                    {"profile_ids": [str(m.id) for m in self.mentees], "action": "approve"},
+                    format="json",
+                ))
+                self.assert_budget(YatraEligibilityView, 'GET', lambda: self.client.get(
+                    f"/yatras/{self.yatra.id}/eligibility/"
+                ))
+
+    def test_registration(self):
+        registered = []
+        for size in self.SIZES:
+            with self.subTest(mentees=size):
+                self.grow_to(size)
+                self.approve()
+                new = [m for m in self.mentees if m not in registered]
+                self.assert_budget(YatraRegistrationView, 'POST', lambda: self.client.post(
+                    f"/yatras/{self.yatra.id}/register/",
+                    {str(m.id): {"form_fields": {}, "installments_selected": ["A"]} for m in new},
+                    format="json",
+                ))
+                registered += new
+                self.assert_budget(YatraRegistrationView, 'GET', lambda: self.client.get(
+                    f"/yatras/{self.yatra.id}/register/"
+                ))
+                self.assert_budget(YatraRegistrationView, 'GET', lambda: self.client.get(
+                    f"/yatras/{self.yatra.id}/register/", {"page_size": 5}
+                ))
+
+    def test_attendance(self):
+        staff = self.staff_client()
+        for size in self.SIZES:
+            with self.subTest(mentees=size):
+                self.grow_to(size)
+                self.approve()
+                self.register(labels=["A", "B"])
+                YatraRegistration.objects.filter(yatra=self.yatra).update(status='paid')
+                now = timezone.now()
+                scans = [
+                    {"registration_id": str(r), "scanned_at": (now + datetime.timedelta(seconds=i)).isoformat(),
+                     "scanner_id": f"gate-{size}"}
+                    for i, r in enumerate(YatraRegistration.objects.values_list('id', flat=True))
+                ]
+                self.assert_budget(AttendanceManifestView, 'GET', lambda: staff.get(
+                    f"/yatras/{self.yatra.id}/attendance/manifest/"
+                ))
+                self.assert_budget(AttendanceSyncView, 'POST', lambda: staff.post(
+                    f"/yatras/{self.yatra.id}/attendance/sync/", {"scans": scans}, format="json"
+                ))
+
+    def test_refunds(self):
+        staff = self.staff_client()
+        self.yatra.payment_refund_date = datetime.date(2020, 1, 1)
+        self.yatra.save()
+        refunded = 0
+        for size in self.SIZES:
+            with self.subTest(mentees=size):
+                self.grow_to(size)
+                new = self.mentees[refunded:]
+                self.approve(new)
+                self.register(new)
+                self.pay(f"T{size}", new)
+                Payment.bulk_transition(Payment.objects.filter(transaction_id=f"T{size}"), "verified", self.staff)
+                YatraRegistration.objects.filter(yatra=self.yatra, status='partial').update(status='cancelled')
+                response = self.assert_budget(RefundBatchView, 'POST', lambda: staff.post(
+                    f"/yatras/{self.yatra.id}/refunds/", {}, format="json"
+                ))
+                self.assertEqual(response.data['registrations_count'], len(new))
+                refunded = size
+                self.assert_budget(RefundBatchView, 'GET', lambda: staff.get(
+                    f"/yatras/{self.yatra.id}/refunds/"
+                ))
+
+
+@override_settings(BACKEND_BASE_URL="https://api.example.org")
+class AttendanceUrlTests(YatraTestCase):
+    mentee_count = 1
+
+    def setUp(self):
+        super().setUp()
+        self.approve()
+        self.register()
+        self.registration = YatraRegistration.objects.get(registered_for=self.mentees[0])
+
+    def slip(self, urlconf):
+        with override_settings(ROOT_URLCONF=urlconf):
+            clear_url_caches()
+            url = attendance_url(self.registration)
+            digest = rcs_digest(registration_rcs_inputs(self.registration, yatra_rcs_context(self.yatra), url))
+        clear_url_caches()
+        return url, digest
+
+    def test_admin_and_api_processes_render_the_same_slip(self):
+        self.assertEqual(self.slip("iys_sgd_backend.urls_admin"), self.slip("iys_sgd_backend.urls_api"))
+
+    def test_url_resolves_to_mark_attendance_in_the_api_urlconf(self):
+        url, _ = self.slip("iys_sgd_backend.urls_admin")
+        path = urlsplit(url).path
+        match = resolve(path, urlconf="iys_sgd_backend.urls_api")
+        self.assertIs(match.func.view_class, MarkAttendanceView)
+        self.assertEqual(match.kwargs["registration_id"], self.registration.id)
+
+
+class RegistrationDetailCacheTests(YatraTestCase):
+    mentee_count = 1
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.approve()
+        self.register()
+        self.key = registration_detail_key(self.yatra.id, self.mentees[0].id)
+        self.url = f"/yatras/{self.yatra.id}/{self.mentees[0].id}/registrations/"
+
+    @override_settings(REGISTRATION_DETAIL_CACHE_TTL=0)
+    def test_not_cached_without_a_shared_cache(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertIsNone(cache.get(self.key))
+
+    @override_settings(REGISTRATION_DETAIL_CACHE_TTL=300)
+    def test_cached_and_invalidated_on_change(self):
+        first = self.client.get(self.url).data
+        self.assertEqual(cache.get(self.key)["status"], first["status"])
+        self.assertEqual(self.pay("T1", self.mentees).status_code, 201)
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(self.client.get(self.url).data["installments"][0]["payment"]["transaction_id"], "T1")
+
+
+class DashboardPaginationTests(YatraTestCase):
+    mentee_count = 7
+
+    def setUp(self):
+        super().setUp()
+        self.url = f"/yatras/{self.yatra.id}/register/"
+
+    def full_list(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(self.url)
+        return [str(p["id"]) for p in response.data["profiles"]]
+
+    def walk(self, client=None, url=None, **params):
+        ids, cursor = [], None
+        while True:
+            query = {"page_size": 3, **params, **({"cursor": cursor} if cursor else {})}
+            with self.captureOnCommitCallbacks(execute=True):
+                response = (client or self.client).get(url or self.url, query)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids += [str(p["id"]) for p in response.data["profiles"]]
+            cursor = response.data["next_cursor"]
+            if cursor is None:
+                return ids
+
+    def test_cursor_pages_cover_every_mentee_once_in_order(self):
+        by_name = sorted(self.mentees, key=lambda p: (f"{p.first_name} {p.last_name}".lower(), str(p.id)))
+        self.assertEqual(self.walk(ordering="name"), [str(p.id) for p in by_name])
+        by_member_id = sorted(self.mentees, key=lambda p: (p.member_id or 0, str(p.id)), reverse=True)
+        self.assertEqual(self.walk(ordering="-member_id"), [str(p.id) for p in by_member_id])
+
+    def test_paginated_and_full_lists_have_the_same_members(self):
+        # The mentee's latest approved request is to another mentor; both paths still list them
+        other = make_profile("other_mentor", user_type="mentor")
+        MentorRequest.objects.create(
+            from_user=self.mentees[0], to_mentor=other, is_approved=True,
+            approved_at=timezone.now() + datetime.timedelta(days=1),
+        )
+        self.assertIn(str(self.mentees[0].id), self.full_list())
+        self.assertEqual(sorted(self.walk()), sorted(self.full_list()))
+
+    def test_every_approved_mentor_pages_over_the_mentee(self):
+        mentee = str(self.mentees[0].id)
+        self.approve()
+        self.full_list()
+        other = make_profile("other_mentor", user_type="mentor")
+        with self.captureOnCommitCallbacks(execute=True):
+            MentorRequest.objects.create(from_user=self.mentees[0], to_mentor=other, is_approved=True)
+        self.assertEqual(
+            set(RegistrationDashboardRow.objects.filter(profile=self.mentees[0]).values_list('mentor', flat=True)),
+            {self.mentor.id, other.id},
+        )
+
+        eligibility_url = f"/yatras/{self.yatra.id}/eligibility/"
+        for client in (self.client, client_for(other)):
+            self.assertIn(mentee, self.walk(client))
+            self.assertIn(mentee, self.walk(client, eligibility_url))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MentorRequest.objects.filter(from_user=self.mentees[0], to_mentor=self.mentor).delete()
+        self.assertNotIn(mentee, self.walk())
+        self.assertNotIn(mentee, self.walk(url=eligibility_url))
+        self.assertIn(mentee, self.walk(client_for(other)))
+
+    def test_rejects_bad_cursors(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+        with self.captureOnCommitCallbacks(execute=True):
+            cursor = self.client.get(self.url, {"page_size": 2, "ordering": "name"}).data["next_cursor"]
+        response = self.client.get(self.url, {"cursor": cursor, "ordering": "member_id"})
+        self.assertEqual(response.status_code, 400)
+
+
+class DashboardFreshnessTests(YatraTestCase):
+    """The dashboard rows follow signal-driven writes once the transaction commits."""
+
+    def setUp(self):
+        super().setUp()
+        self.approve()
+        self.register()
+        self.refresh_all()
+
+    def refresh_all(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f"/yatras/{self.yatra.id}/register/")
+
+    def row(self, profile, mentor=None):
+        return RegistrationDashboardRow.objects.get(yatra=self.yatra, profile=profile, mentor=mentor or self.mentor)
+
+    def tags(self, profile):
+        return {i["label"]: i["tag"] for i in self.row(profile).data["installments_info"]}
+
+    def test_payment_approval(self):
+        first = self.mentees[0]
+        self.pay("T1", [first])
+        self.assertEqual(self.tags(first), {"A": "verification pending", "B": "due"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.get(transaction_id="T1").approve(make_staff())
+        row = self.row(first)
+        self.assertEqual(self.tags(first), {"A": "verified", "B": "due"})
+        self.assertEqual(row.data["installments_paid"], ["A"])
+        self.assertTrue(row.has_installment_due)
+
+    def test_substitution(self):
+        first, second, _ = self.mentees
+        with self.captureOnCommitCallbacks(execute=True):
+            SubstitutionRequest.objects.create(
+                registration=YatraRegistration.objects.get(registered_for=first),
+                initiator=first, target_profile=second, status='accepted', two_digit_code="12",
+                new_registration=YatraRegistration.objects.get(registered_for=second),
+            )
+        row = self.row(second)
+        self.assertTrue(row.substitution_pending)
+        self.assertTrue(row.data["is_substitution"])
+        self.assertEqual(row.data["pending_substitution_fees"]["total"], 500.0)
+
+        # Fee changes drop the rows; the next read rebuilds them with the new fee
+        self.yatra.substitution_fee = Decimal("800")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.yatra.save()
+        self.refresh_all()
+        self.assertEqual(self.row(second).data["pending_substitution_fees"]["total"], 800.0)
+
+    def test_profile_rename(self):
+        first = self.mentees[0]
+        first.first_name = "Zed"
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save()
+        self.assertEqual((self.row(first).sort_name, self.row(first).member_id), ("zed das", first.member_id or 0))
+
+    def test_mentor_request_approval_and_delete(self):
+        first = self.mentees[0]
+        other = make_profile("other_mentor", user_type="mentor")
+        request = MentorRequest.objects.create(from_user=first, to_mentor=other)
+        with self.captureOnCommitCallbacks(execute=True):
+            request.is_approved = True
+            request.save()
+        self.assertEqual(self.row(first, mentor=other).data, self.row(first).data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MentorRequest.objects.filter(from_user=first, to_mentor=self.mentor).delete()
+        self.assertEqual(
+            list(RegistrationDashboardRow.objects.filter(profile=first).values_list('mentor', flat=True)),
+            [other.id],
+        )
+
+
+class ReconcileTests(YatraTestCase):
+    def setUp(self):
+        super().setUp()
+        self.approve()
+        self.register()
+        self.pay("T1", self.mentees[:1])
+        self.pay("T2", self.mentees[1:2])
+        self.installments = {
+            i.registration.registered_for_id: i
+            for i in YatraRegistrationInstallment.objects.select_related('registration')
+        }
+
+    def test_repair_follows_payments_but_keeps_manual_paid_flags(self):
+        under_review, verified, manual = (self.installments[m.id] for m in self.mentees)
+        YatraRegistrationInstallment.objects.filter(id__in=[under_review.id, manual.id]).update(is_paid=True)
+        Payment.objects.filter(transaction_id="T2").update(status='verified')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report = reconcile_yatra(self.yatra.id, repair=True)
+
+        self.assertEqual({row['id'] for row in report['installments']}, {str(under_review.id), str(verified.id)})
+        self.assertEqual(report['repaired']['installments'], 2)
+
+        paid = dict(YatraRegistrationInstallment.objects.values_list('id', 'is_paid'))
+        self.assertEqual(paid, {under_review.id: False, verified.id: True, manual.id: True})
+        report = reconcile_yatra(self.yatra.id)
+        self.assertEqual((report['installments'], report['registrations']), ([], []))
+
+    def test_manually_paid_registration_is_not_drift(self):
+        manual = self.installments[self.mentees[2].id]
+        YatraRegistrationInstallment.objects.filter(id=manual.id).update(is_paid=True)
+        YatraRegistrationInstallment.objects.create(
+            registration=manual.registration, installment=self.yatra.installments.get(label="B"), is_paid=True,
+        )
+        YatraRegistration.objects.filter(id=manual.registration_id).update(status='paid')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report = reconcile_yatra(self.yatra.id, repair=True)
+        self.assertEqual((report['installments'], report['registrations']), ([], []))
+        self.assertEqual(report['repaired'], {'installments': 0, 'statuses': 0})
+        self.assertEqual(YatraRegistration.objects.get(id=manual.registration_id).status, 'paid')
+
+
+class PaymentStatusTests(YatraTestCase):
+    def setUp(self):
+        super().setUp()
+        self.approve()
+        self.register(labels=("A", "B"))
+
+    def expected(self):
+        return dict(
+            YatraRegistration.objects
+            .annotate(expected=payment_status())
+            .values_list('registered_for_id', 'expected')
+        )
+
+    def test_expression(self):
+        first, second, third = self.mentees
+        self.pay("T1", [first, second], labels=("A",))
+        self.pay("T2", [second], labels=("B",))
+        YatraRegistrationInstallment.objects.filter(registration__registered_for=second).update(is_paid=True)
+        YatraRegistrationInstallment.objects.filter(
+            registration__registered_for=first, installment__label="A",
+        ).update(is_paid=True)
+        # Paid needs every installment of the yatra paid, pending means no payment attached
+        self.assertEqual(self.expected(), {first.id: 'partial', second.id: 'paid', third.id: 'pending'})
+
+    def test_payment_decisions_leave_cancelled_registrations_alone(self):
+        self.pay("T1", self.mentees[:1], labels=("A", "B"))
+        registration = YatraRegistration.objects.get(registered_for=self.mentees[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            registration.status = 'cancelled'
+            registration.save()
+        seats = YatraSeatCounter.objects.get(yatra=self.yatra).seats_taken
+
+        payment = Payment.objects.get(transaction_id="T1")
+        staff = make_staff()
+        for decide in (payment.approve, payment.mark_under_review, payment.reject):
+            with self.captureOnCommitCallbacks(execute=True):
+                decide(staff)
+            registration.refresh_from_db()
+            self.assertEqual(registration.status, 'cancelled')
+        self.assertEqual(YatraSeatCounter.objects.get(yatra=self.yatra).seats_taken, seats)
+
+    def test_update_status_follows_payments(self):
+        self.pay("T1", self.mentees[:1], labels=("A", "B"))
+        payment = Payment.objects.get(transaction_id="T1")
+        registration = YatraRegistration.objects.get(registered_for=self.mentees[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.approve(make_staff())
+        registration.refresh_from_db()
+        self.assertEqual(registration.status, 'paid')
+
+
+    def test_update_status_and_recompute_agree(self):
+        self.add_mentees(1)
+        nothing_attached, attached, all_paid, stale_paid = self.mentees
+        self.approve(self.mentees[3:])
+        self.register(self.mentees[3:], labels=("A", "B"))
+        self.pay("T1", [attached, stale_paid], labels=("A",))
+        self.pay("T2", [all_paid], labels=("A", "B"))
+        YatraRegistrationInstallment.objects.filter(payment__transaction_id="T2").update(is_paid=True)
+        stored = {nothing_attached.id: 'partial', attached.id: 'pending', all_paid.id: 'partial', stale_paid.id: 'paid'}
+        for profile_id, status in stored.items():
+            YatraRegistration.objects.filter(registered_for_id=profile_id).update(status=status)
+
+        for registration in YatraRegistration.objects.all():
+            registration.update_status()
+        per_row = dict(YatraRegistration.objects.values_list('registered_for_id', 'status'))
+        for profile_id, status in stored.items():
+            YatraRegistration.objects.filter(registered_for_id=profile_id).update(status=status)
+        recompute_statuses()
+
+        self.assertEqual(dict(YatraRegistration.objects.values_list('registered_for_id', 'status')), per_row)
+        self.assertEqual(per_row, {
+            nothing_attached.id: 'partial', attached.id: 'partial', all_paid.id: 'paid', stale_paid.id: 'partial',
+        })
+
+
+class WaitlistTests(YatraTestCase):
+    def setUp(self):
+        super().setUp()
+        self.yatra.capacity = 2
+        self.yatra.save()
+        self.approve()
+        self.first, self.second, self.third = self.mentees
+
+    def registered(self):
+        return set(YatraRegistration.objects.filter(yatra=self.yatra).values_list('registered_for_id', flat=True))
+
+    def test_overflow_is_queued_and_promoted_on_cancellation(self):
+        response = self.register()
+        self.assertEqual(response.data['waitlisted'], [str(self.third.id)])
+        self.assertEqual(self.registered(), {self.first.id, self.second.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                f"/yatras/{self.yatra.id}/register/", {"profile_id": str(self.first.id)}, format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        promoted = YatraRegistration.objects.get(yatra=self.yatra, registered_for=self.third)
+        self.assertEqual(promoted.status, 'partial')
+        self.assertEqual(list(promoted.installments.values_list('installment__label', flat=True)), ["A"])
+        self.assertFalse(YatraWaitlistEntry.objects.filter(yatra=self.yatra).exists())
+        self.assertEqual(YatraSeatCounter.objects.get(yatra=self.yatra).seats_taken, 2)
+
+    def test_promoted_when_capacity_grows(self):
+        self.register()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.yatra.capacity = 3
+            self.yatra.save()
+        self.assertEqual(self.registered(), {m.id for m in self.mentees})
+        self.assertEqual(YatraSeatCounter.objects.get(yatra=self.yatra).seats_taken, 3)
+
+
+class YatraSaveSignalTests(YatraTestCase):
+    def setUp(self):
+        super().setUp()
+        self.approve()
+        self.register()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f"/yatras/{self.yatra.id}/register/")
+        self.rows = RegistrationDashboardRow.objects.filter(yatra=self.yatra)
+        self.assertTrue(self.rows.exists())
+
+    def save(self, **fields):
+        for name, value in fields.items():
+            setattr(self.yatra, name, value)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.yatra.save()
+        return callbacks
+
+    def test_unrelated_change_keeps_dashboard_and_waitlist_alone(self):
+        # The snapshot SELECT and the UPDATE
+        with self.assertNumQueries(2):
+            callbacks = self.save(description="New description", capacity=self.yatra.capacity - 1)
+        self.assertEqual(callbacks, [])
+        self.assertTrue(self.rows.exists())
+
+    def test_fee_change_drops_dashboard_rows(self):
+        self.save(cancellation_fee=Decimal("750"))
+        self.assertFalse(self.rows.exists())
+
+    def test_opening_rcs_downloads_prerenders_once(self):
+        with mock.patch("yatra_registration.signals.prerender_in_background") as prerender:
+            for callback in self.save(is_rcs_download_open=True):
+                callback()
+            for callback in self.save(is_rcs_download_open=True, title="Renamed"):
+                callback()
+        prerender.assert_called_once_with(self.yatra.id)
+
+
+@override_settings(RCS_LOG_BUFFER_SIZE=50, RCS_LOG_FLUSH_SECONDS=60)
+class RCSDownloadLogTests(YatraTestCase):
+    mentee_count = 1
+
+    def setUp(self):
+        super().setUp()
+        self.approve()
+        self.register()
+        self.registration = YatraRegistration.objects.get(registered_for=self.mentees[0])
+        self.url = f"/yatras/{self.registration.id}/rcs-download/"
+        self.addCleanup(flush_download_log)
+
+    def test_buffered_rows_are_written_after_a_later_request(self):
+        self.assertEqual(self.client.post(self.url).status_code, 201)
+        self.assertEqual(self.client.post(self.url).data["count"], 2)
+        self.assertFalse(RCSDownloadLog.objects.exists())
+
+        with override_settings(RCS_LOG_FLUSH_SECONDS=0):
+            self.client.get(f"/yatras/{self.yatra.id}/eligibility/")
+        self.assertEqual(RCSDownloadLog.objects.filter(registration=self.registration).count(), 2)
+
+    @override_settings(RCS_LOG_BUFFER_SIZE=1)
+    def test_failed_flush_keeps_the_rows_and_the_download(self):
+        with mock.patch.object(RCSDownloadLog.objects, 'bulk_create', side_effect=DatabaseError("down")):
+            with self.assertLogs('yatra_registration.rcs_downloads', 'ERROR'):
+                response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(RCSDownloadLog.objects.exists())
+
+        self.client.post(self.url)
+        self.assertEqual(RCSDownloadLog.objects.filter(registration=self.registration).count(), 2)
+
+    def test_rollup_copies_recent_downloads(self):
+        self.client.post(self.url)
+        flush_download_log()
+        # Newer than a flush interval: other processes may still hold downloads of it
+        self.assertEqual(rollup(), 0)
+        with override_settings(RCS_LOG_FLUSH_SECONDS=0):
+            self.assertEqual(rollup(), 1)
+            event = RCSDownloadEvent.objects.get(registration=self.registration)
+            self.assertEqual(len(event.recent_downloads), 1)
+            self.assertEqual(event.rolled_up_at, event.last_downloaded_at)
+            self.assertEqual(rollup(), 0)
+
+
+class EligibilityResponseTests(YatraTestCase):
+    mentee_count = 2
+
+    def post(self, action, profile_ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                f"/yatras/{self.yatra.id}/eligibility/",
+                {"profile_ids": profile_ids, "action": action}, format="json",
+            )
+
+    def test_approve_lists_each_profile_once(self):
+        first, second = (str(m.id) for m in self.mentees)
+        self.post("approve", [first])
+        response = self.post("approve", [first, second, first])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            "message": "Updated eligibility for 2 devotee(s)",
+            "updated": [
+                {"profile_id": first, "action": "approve", "was_created": False, "is_approved": True},
+                {"profile_id": second, "action": "approve", "was_created": True, "is_approved": True},
+            ],
+        })
+
+    def test_errors_keep_the_updated_profiles(self):
+        first = str(self.mentees[0].id)
+        response = self.post("approve", [first, "not-a-uuid", str(self.mentor.id)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], [
+            "Invalid profile ID: not-a-uuid",
+            "You cannot approve yourself. Please ask your mentor to approve you for this Yatra.",
+        ])
+        self.assertEqual([u["profile_id"] for u in response.data["updated"]], [first])
+
+        response = self.post("unapprove", [first, first])
+        self.assertEqual(response.data["updated"], [{"profile_id": first, "action": "unapprove", "status": "removed"}])
+
+
+class AdmissionTests(YatraTestCase):
+    mentee_count = 4
+
+    def setUp(self):
+        super().setUp()
+        self.yatra.capacity = 3
+        self.yatra.save()
+        self.approve()
+
+    def seats_taken(self):
+        return YatraSeatCounter.objects.get(yatra=self.yatra).seats_taken
+
+    def test_admits_up_to_capacity_in_arrival_order(self):
+        response = self.register(self.mentees[:2])
+        self.assertEqual(response.data['waitlisted'], [])
+        response = self.register(self.mentees[2:])
+        self.assertEqual(response.data['waitlisted'], [str(self.mentees[3].id)])
+        self.assertEqual(YatraRegistration.objects.filter(yatra=self.yatra).count(), 3)
+        self.assertEqual(self.seats_taken(), 3)
+
+    def test_updating_a_registration_takes_no_seat(self):
+        self.register(self.mentees[:3])
+        response = self.register(self.mentees[:3], labels=("A", "B"))
+        self.assertEqual(response.data['waitlisted'], [])
+        self.assertEqual(self.seats_taken(), 3)
+
+    def test_concurrently_created_registration_takes_one_seat(self):
+        mentee = self.mentees[0]
+
+        def racing_reserve(yatra, count):
+            # Another request registers the mentee after this one read the existing rows
+            YatraRegistration.objects.create(yatra=yatra, registered_for=mentee, registered_by=self.mentor)
+            return reserve_seats(yatra, count)
+
+        with mock.patch('yatra_registration.views.reserve_seats', side_effect=racing_reserve):
+            response = self.register([mentee])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(YatraRegistration.objects.filter(yatra=self.yatra).count(), 1)
+        self.assertEqual(self.seats_taken(), 1)
+
+    def test_reserve_seats_grants_what_is_left(self):
+        self.register(self.mentees[:2])
+        self.assertEqual(reserve_seats(self.yatra, 5), 1)
+        self.assertEqual(reserve_seats(self.yatra, 1), 0)
+        self.assertEqual(self.seats_taken(), 3)
+
+    def test_counter_follows_status_changes(self):
+        self.register(self.mentees[:3])
+        registration = YatraRegistration.objects.get(registered_for=self.mentees[0])
+        registration.status = 'cancelled'
+        registration.save()
+        self.assertEqual(self.seats_taken(), 2)
+        YatraSeatCounter.objects.filter(yatra=self.yatra).update(seats_taken=0)
+        recount_seats(self.yatra.id)
+        self.assertEqual(self.seats_taken(), 2)
+
+
+class RegistrationUpsertTests(YatraTestCase):
+    mentee_count = 2
+
+    def setUp(self):
+        super().setUp()
+        self.approve()
+
+    def post(self, profiles, form_fields, labels=("A",)):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f"/yatras/{self.yatra.id}/register/", {
+                str(p.id): {"form_fields": form_fields, "installments_selected": list(labels)} for p in profiles
+            }, format="json")
+
+    def test_resubmitting_only_updates_the_form(self):
+        first = self.mentees[0]
+        self.post([first], {"tshirt": "M"})
+        self.pay("T1", [first])
+        registration = YatraRegistration.objects.get(registered_for=first)
+        installments = list(registration.installments.values_list('id', 'installment__label', 'payment__transaction_id'))
+        seats = YatraSeatCounter.objects.get(yatra=self.yatra).seats_taken
+
+        response = self.post([first], {"tshirt": "L"})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["registrations"][0]["id"], str(registration.id))
+
+        stored = YatraRegistration.objects.get(registered_for=first)
+        self.assertEqual(stored.form_data, {"tshirt": "L"})
+        self.assertGreater(stored.updated_at, registration.updated_at)
+        self.assertEqual(
+            (stored.id, stored.status, stored.status_version, stored.registered_at),
+            (registration.id, registration.status, registration.status_version, registration.registered_at),
+        )
+        self.assertEqual(
+            list(stored.installments.values_list('id', 'installment__label', 'payment__transaction_id')),
+            installments,
+        )
+        self.assertEqual(YatraSeatCounter.objects.get(yatra=self.yatra).seats_taken, seats)
+
+    def test_upserts_without_a_conflict_target(self):
+        # MySQL upserts on any unique key and refuses unique_fields
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.assertNotIn('unique_fields', upsert_kwargs(['yatra', 'registered_for'], ['form_data']))
+            response = self.post(self.mentees, {"tshirt": "M"})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(YatraRegistration.objects.filter(yatra=self.yatra).count(), 2)
+        self.assertEqual(
+            upsert_kwargs(['yatra', 'registered_for'], ['form_data'])['unique_fields'], ['yatra', 'registered_for'],
+        )
+
+
+class AttendanceSyncTests(YatraTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff_api = self.staff_client()
+        self.approve()
+        self.register()
+        self.regs = [YatraRegistration.objects.get(registered_for=m) for m in self.mentees]
+        YatraRegistration.objects.filter(id__in=[self.regs[0].id, self.regs[1].id]).update(status='paid')
+        # regs[1] took over a seat through a substitution whose fee is still due
+        self.substitution = SubstitutionRequest.objects.create(
+            registration=self.regs[2], initiator=self.mentees[2], target_profile=self.mentees[1],
+            status='accepted', two_digit_code="12", new_registration=self.regs[1],
+        )
+        self.at = timezone.now()
+
+    def scan(self, registration_id, seconds=0, scanner="gate-1", **fields):
+        return {
+            "registration_id": str(registration_id), "scanner_id": scanner,
+            "scanned_at": (self.at + datetime.timedelta(seconds=seconds)).isoformat(), **fields,
+        }
+
+    def sync(self, *scans):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.staff_api.post(f"/yatras/{self.yatra.id}/attendance/sync/", {"scans": list(scans)}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        return {
+            (r["registration_id"], r["scanner_id"]): r
+            for r in response.data["applied"] + response.data["conflicts"]
+        }
+
+    def test_outcomes(self):
+        missing = uuid.uuid4()
+        results = self.sync(
+            self.scan(self.regs[0].id),
+            self.scan(self.regs[0].id, seconds=5, scanner="gate-2"),
+            self.scan(self.regs[1].id),
+            self.scan(self.regs[2].id),
+            self.scan(missing),
+        )
+        outcomes = {key: r["outcome"] for key, r in results.items()}
+        self.assertEqual(outcomes, {
+            (str(self.regs[0].id), "gate-1"): "marked",
+            # The earliest scan of a registration decides for the later ones
+            (str(self.regs[0].id), "gate-2"): "marked",
+            (str(self.regs[1].id), "gate-1"): "substitution_fee_due",
+            (str(self.regs[2].id), "gate-1"): "not_paid",
+            (str(missing), "gate-1"): "not_found",
+        })
+        self.assertEqual(results[(str(self.regs[1].id), "gate-1")]["amount_to_collect"], 500.0)
+
+        version = self.regs[0].status_version
+        self.regs[0].refresh_from_db()
+        self.assertEqual((self.regs[0].status, self.regs[0].status_version), ('attended', version + 1))
+        later = self.sync(self.scan(self.regs[0].id, seconds=60))
+        self.assertEqual(later[(str(self.regs[0].id), "gate-1")]["outcome"], "already_attended")
+
+    def test_collecting_the_fee_admits(self):
+        results = self.sync(self.scan(self.regs[1].id, fee_collected=True))
+        self.assertEqual(results[(str(self.regs[1].id), "gate-1")]["outcome"], "marked")
+        self.substitution.refresh_from_db()
+        self.assertTrue(self.substitution.fee_collected)
+
+    def test_replayed_upload_returns_the_recorded_outcomes(self):
+        scans = [self.scan(self.regs[0].id), self.scan(self.regs[2].id)]
+        first = self.sync(*scans)
+        recorded = AttendanceScan.objects.count()
+        again = self.sync(*scans)
+
+        self.assertEqual(
+            {key: r["outcome"] for key, r in again.items()},
+            {key: r["outcome"] for key, r in first.items()},
+        )
+        self.assertTrue(all(r["replayed"] for r in again.values()))
+        self.assertFalse(any(r["replayed"] for r in first.values()))
+        self.assertEqual(AttendanceScan.objects.count(), recorded)
+        version = self.regs[0].status_version
+        self.regs[0].refresh_from_db()
+        self.assertEqual(self.regs[0].status_version, version + 1)
+
+
+class AttendanceTokenTests(YatraTestCase):
+    mentee_count = 1
+
+    def setUp(self):
+        super().setUp()
+        self.staff_api = self.staff_client()
+        self.approve()
+        self.register()
+        self.registration = YatraRegistration.objects.get(registered_for=self.mentees[0])
+        self.registration.status = 'paid'
+        self.registration.save()
+
+    def sync(self, token, yatra=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.staff_api.post(f"/yatras/{(yatra or self.yatra).id}/attendance/sync/", {"scans": [
+                {"token": token, "scanned_at": timezone.now().isoformat(), "scanner_id": "gate-1"},
+            ]}, format="json")
+
+    def test_token_round_trip(self):
+        token = attendance_token(self.registration)
+        self.assertEqual(
+            read_attendance_token(token),
+            (self.registration.id, self.yatra.id, self.registration.status_version),
+        )
+        with self.assertRaises(InvalidAttendanceToken):
+            read_attendance_token(token[:-1] + ("0" if token[-1] != "0" else "1"))
+        with override_settings(ATTENDANCE_QR_SIGNING_KEY="another key"), self.assertRaises(InvalidAttendanceToken):
+            read_attendance_token(token)
+
+    def test_slip_printed_before_a_status_change_is_stale(self):
+        stale = attendance_token(self.registration)
+        # paid -> partial -> paid: same status, newer version
+        for status in ('partial', 'paid'):
+            self.registration.status = status
+            self.registration.save()
+
+        response = self.sync(stale)
+        self.assertEqual(response.data["conflicts"][0]["outcome"], "stale_token")
+        response = self.sync(attendance_token(self.registration))
+        self.assertEqual(response.data["applied"][0]["outcome"], "marked")
+
+    def test_manifest_carries_the_current_version(self):
+        response = self.staff_api.get(f"/yatras/{self.yatra.id}/attendance/manifest/")
+        manifest = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(
+            [row[:2] for row in manifest["paid"]],
+            [[self.registration.id.hex, self.registration.status_version]],
+        )
+
+    def test_slip_of_another_yatra_is_refused_at_the_gate(self):
+        other = make_yatra(title="Mayapur Yatra")
+        YatraRegistration.objects.create(
+            yatra=other, registered_for=self.mentees[0], registered_by=self.mentor, status='paid',
+        )
+        response = self.sync(attendance_token(self.registration), yatra=other)
+        self.assertEqual(response.data["conflicts"][0]["outcome"], "wrong_yatra")
+        # A bare registration id of another yatra is not on this gate's list either
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.staff_api.post(f"/yatras/{other.id}/attendance/sync/", {"scans": [
+                {"registration_id": str(self.registration.id), "scanned_at": timezone.now().isoformat(),
+                 "scanner_id": "gate-1"},
+            ]}, format="json")
+        self.assertEqual(response.data["conflicts"][0]["outcome"], "not_found")
+        self.registration.refresh_from_db()
+        self.assertEqual(self.registration.status, 'paid')
+
+    def test_rejects_forged_tokens(self):
+        response = self.sync("forged:token")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["rejected"][0]["index"], 0)
+
+
+class RefundTests(TemporaryMediaMixin, YatraTestCase):
+    mentee_count = 4
+
+    def setUp(self):
+        super().setUp()
+        self.staff = make_staff()
+        self.yatra.cancellation_fee = Decimal("1000")
+        self.yatra.payment_refund_date = datetime.date(2020, 1, 1)
+        self.yatra.save()
+        self.approve()
+        self.register()
+        self.pay("T1", self.mentees[:1])
+        self.pay("T2", self.mentees[1:3])
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.bulk_transition(Payment.objects.all(), "verified", self.staff)
+        self.cancel(*self.mentees[:2], self.mentees[3])
+
+    def cancel(self, *profiles):
+        YatraRegistration.objects.filter(registered_for__in=profiles).update(status='cancelled')
+
+    def refund(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return refund_batch(self.yatra.id, self.staff, **kwargs)
+
+    def test_refunds_verified_amount_minus_fee(self):
+        batch, rows = self.refund()
+        self.assertEqual(
+            {(row['member_id'], row['verified_amount'], row['refund_amount']) for row in rows},
+            {(m.member_id, Decimal("3000"), Decimal("2000")) for m in self.mentees[:2]},
+        )
+        self.assertEqual((batch.registrations_count, batch.total_amount), (2, Decimal("4000")))
+        # Nothing verified to give back: stays cancelled
+        self.assertEqual(
+            dict(YatraRegistration.objects.values_list('registered_for_id', 'status')),
+            {
+                self.mentees[0].id: 'refunded', self.mentees[1].id: 'refunded',
+                self.mentees[2].id: 'partial', self.mentees[3].id: 'cancelled',
+            },
+        )
+        with batch.payout_file.open('rb') as f:
+            lines = f.read().decode().splitlines()
+        self.assertEqual(lines[0].split(','), PAYOUT_COLUMNS)
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(self.refund(), (None, []))
+
+    def test_payment_refunded_once_all_its_registrations_are(self):
+        batch, _ = self.refund()
+        self.assertEqual(batch.payments_refunded, 1)
+        statuses = dict(Payment.objects.values_list('transaction_id', 'status'))
+        # T2 also paid for an active registration
+        self.assertEqual(statuses, {"T1": "refunded", "T2": "verified"})
+
+        self.cancel(self.mentees[2])
+        batch, rows = self.refund()
+        self.assertEqual([row['member_id'] for row in rows], [self.mentees[2].member_id])
+        self.assertEqual(Payment.objects.get(transaction_id="T2").status, "refunded")
+
+    def test_dry_run_and_refund_date(self):
+        _, rows = self.refund(apply=False)
+        self.assertEqual(len(rows), 2)
+        self.assertFalse(RefundBatch.objects.exists())
+        self.assertEqual(YatraRegistration.objects.filter(status='refunded').count(), 0)
+        with self.assertRaises(RefundError):
+            self.refund(today=datetime.date(2019, 12, 31))
@@ -11,5 +11,9 @@ urlpatterns = [
         YatraRegistrationDetailView.as_view(), 
         name='yatra-registration-detail'),
     path('mark-attendance/<uuid:registration_id>/', MarkAttendanceView.as_view(), name='mark-attendance'),
+    path('<uuid:yatra_id>/attendance/sync/', AttendanceSyncView.as_view(), name='attendance-sync'),
+    path('<uuid:yatra_id>/attendance/manifest/', AttendanceManifestView.as_view(), name='attendance-manifest'),
+    path('<uuid:yatra_id>/refunds/', RefundBatchView.as_view(), name='yatra-refunds'),
     path( "<uuid:registration_id>/rcs-download/",TrackRCSDownloadAPIView.as_view(),name="track-rcs-download"),
+    path("<uuid:registration_id>/rcs/", RCSPDFView.as_view(), name="rcs-pdf"),
 ]
\ No newline at end of file
@@ -1,10 +1,13 @@
-from django.http import JsonResponse
+import logging
+
+from django.core.files.storage import default_storage
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.views import View
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from django.shortcuts import get_object_or_404
 from yatra.serializers import *
 from yatra_substitution.models import SubstitutionRequest
@@ -15,13 +18,30 @@ from userProfile.models import *
 from payment.models import *
 from .models import YatraRegistration
 from django.db.models import (
-    F, Value, CharField, OuterRef, Exists
+    F, Value, CharField, OuterRef, Exists, Q
 )
 from django.db.models.functions import Concat
 from uuid import UUID
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
+from django.db import transaction
+from helpers.db import upsert_kwargs
+from helpers.instrumentation.spans import span
+from helpers.pagination import InvalidPageRequest, KeysetPaginator, wants_pagination
+from userProfile.projections import dashboard_profiles
+from .admission import release_seats, reserve_seats
+from .attendance import MAX_SCANS_PER_SYNC, apply_scans, attendance_manifest
+from .dashboard import (
+    DASHBOARD_ORDERINGS, DASHBOARD_QUERY_PARAMS, dashboard_row_filter, ensure_dashboard_rows,
+    refresh_dashboard_rows, schedule_dashboard_refresh,
+)
+from .detail import registration_detail
+from .rcs import RCS_STATUSES, attendance_url, get_or_render_rcs, rcs_registrations, yatra_rcs_context
+from .rcs_downloads import record_download
+from .refunds import RefundError, refund_batch
+from .waitlist import enqueue, promote_from_waitlist
 
+logger = logging.getLogger(__name__)
 
 
 
@@ -39,6 +59,8 @@ class YatraEligibilityView(APIView):
     }
     """
     permission_classes = [IsAuthenticated]
+    # see helpers.instrumentation; includes token auth and the post-commit dashboard refresh
+    query_budget = {'GET': 6, 'POST': 16}
 
     # def get(self, request, yatra_id):
     #     yatra = get_object_or_404(Yatra, id=yatra_id)
@@ -96,21 +118,52 @@ class YatraEligibilityView(APIView):
     # }, status=200)
 
     def get(self, request, yatra_id):
+        """
+        Mentees first, self last. Any of cursor, page_size, ordering, status,
+        eligible, installment_due or substitution_pending switches to a
+        keyset-paginated response (see YatraRegistrationView.get); self is
+        then only on the first page and total_mentees is only counted there.
+        """
         yatra = get_object_or_404(Yatra, id=yatra_id)
         mentor = request.user.profile
 
+        paginator = None
+        if wants_pagination(request, DASHBOARD_QUERY_PARAMS):
+            try:
+                paginator = KeysetPaginator(request, DASHBOARD_ORDERINGS, 'name')
+                row_filter = dashboard_row_filter(request.query_params)
+            except InvalidPageRequest as e:
+                return Response({'error': str(e)}, status=400)
+
         # =====================================================
         # 1. GET APPROVED MENTEE IDS (FAST)
         # =====================================================
-        mentee_ids = list(
-            MentorRequest.objects.filter(
-                to_mentor=mentor,
-                is_approved=True
-            ).values_list('from_user_id', flat=True)
-        )
+        mentee_ids = None
+        if paginator is None or paginator.is_first_page:
+            mentee_ids = list(
+                MentorRequest.objects.filter(
+                    to_mentor=mentor,
+                    is_approved=True
+                ).values_list('from_user_id', flat=True)
+            )
 
-        # Always include self
-        profile_ids = mentee_ids + [mentor.id]
+        if paginator is None:
+            # Always include self
+            profile_ids = mentee_ids + [mentor.id]
+        else:
+            # Filters and sorting run on the dashboard rows' indexed columns
+            if paginator.is_first_page:
+                ensure_dashboard_rows(yatra, mentee_ids)
+            page = paginator.paginate(
+                RegistrationDashboardRow.objects
+                .filter(yatra=yatra, mentor=mentor)
+                .exclude(profile=mentor)
+                .filter(row_filter)
+                .values('profile_id', paginator.key)
+            )
+            profile_ids = [row['profile_id'] for row in page]
+            if paginator.is_first_page:
+                profile_ids.append(mentor.id)
 
         # =====================================================
         # 2. FETCH ALL PROFILES IN ONE QUERY
@@ -168,15 +221,18 @@ class YatraEligibilityView(APIView):
         # =====================================================
         # 6. RESPONSE
         # =====================================================
-        return Response({
+        response = {
             'yatra': {
                 'id': str(yatra.id),
                 'title': yatra.title,
             },
             'profiles': profiles_data,
-            'total_mentees': len(mentee_ids),
-            'includes_self': True,
-        }, status=200)
+            'total_mentees': len(mentee_ids) if mentee_ids is not None else None,
+            'includes_self': mentor.id in profile_ids,
+        }
+        if paginator:
+            response['next_cursor'] = paginator.next_cursor
+        return Response(response, status=200)
 
     def post(self, request, yatra_id):
         yatra = get_object_or_404(Yatra, id=yatra_id)
@@ -243,12 +299,52 @@ class YatraEligibilityView(APIView):
                 'updated': updated
             }, status=200)
 
+        # =====================================================
+        # RESOLVE ALL PROFILES UP FRONT (FIXED NUMBER OF QUERIES)
+        # =====================================================
+        parsed_ids = {}
         for pid in profile_ids:
             try:
-                profile = Profile.objects.get(id=pid)
-            except Profile.DoesNotExist:
+                parsed_ids[pid] = UUID(str(pid))
+            except ValueError:
+                continue
+
+        profiles = Profile.objects.in_bulk(set(parsed_ids.values()))
+        mentee_ids = set(
+            MentorRequest.objects.filter(
+                from_user_id__in=profiles.keys(),
+                to_mentor=devotee,
+                is_approved=True
+            ).values_list('from_user_id', flat=True)
+        )
+        eligibility_map = {
+            e.profile_id: e
+            for e in YatraEligibility.objects.filter(yatra=yatra, profile_id__in=mentee_ids)
+        }
+        registered_ids = set()
+        if action == 'unapprove' and eligibility_map:
+            registered_ids = set(
+                YatraRegistration.objects.filter(
+                    yatra=yatra,
+                    registered_for_id__in=eligibility_map.keys()
+                ).values_list('registered_for_id', flat=True)
+            )
+
+        # =====================================================
+        # VALIDATE PER PROFILE (NO DB)
+        # =====================================================
+        to_approve = []
+        to_remove = []
+        removed_profile_ids = []
+        seen = set()
+        for pid in profile_ids:
+            profile = profiles.get(parsed_ids.get(pid))
+            if profile is None:
                 errors.append(f'Invalid profile ID: {pid}')
                 continue
+            if profile.id in seen:
+                continue
+            seen.add(profile.id)
 
             # BLOCK SELF-APPROVAL
             if profile == devotee:
@@ -258,37 +354,18 @@ class YatraEligibilityView(APIView):
                 continue
 
             # Must be approved mentee via MentorRequest
-            if not MentorRequest.objects.filter(
-                from_user=profile,
-                to_mentor=devotee,
-                is_approved=True
-            ).exists():
-                errors.append(f'{profile.get_full_name()} is not your approved mentee')
+            if profile.id not in mentee_ids:
+                errors.append(f'{profile.full_name()} is not your approved mentee')
                 continue
 
-            # Get or create eligibility
-            eligibility, created = YatraEligibility.objects.get_or_create(
-                yatra=yatra,
-                profile=profile,
-                defaults={'approved_by': devotee}
-            )
-
-            
+            eligibility = eligibility_map.get(profile.id)
 
-            # === 4. UNAPPROVE: BLOCK IF ALREADY REGISTERED ===
+            # === UNAPPROVE: BLOCK IF ALREADY REGISTERED ===
             if action == 'unapprove':
-                eligibility = YatraEligibility.objects.filter(
-                yatra=yatra,
-                profile=profile
-                ).first()
-
                 if not eligibility:
-                    errors.append(f'{profile.get_full_name()} has no eligibility record to unapprove')
+                    errors.append(f'{profile.full_name()} has no eligibility record to unapprove')
                     continue
-                if YatraRegistration.objects.filter(
-                    yatra=yatra,
-                    registered_for=profile
-                ).exists():
+                if profile.id in registered_ids:
                     errors.append(
                         f"Cannot unapprove {profile.first_name}: "
                         "They are already registered for this Yatra."
@@ -299,7 +376,8 @@ class YatraEligibilityView(APIView):
                 if not eligibility.is_approved:
                     errors.append(f'{profile.first_name} is already not approved')
                     continue
-                eligibility.delete()
+                to_remove.append(eligibility.id)
+                removed_profile_ids.append(profile.id)
                 updated.append({
                 'profile_id': str(profile.id),
                 'action': 'unapprove',
@@ -307,33 +385,31 @@ class YatraEligibilityView(APIView):
                 })
                 continue
 
-            if action == 'approve':
-                eligibility, created = YatraEligibility.objects.get_or_create(
-                    yatra=yatra,
-                    profile=profile,
-                    defaults={'approved_by': devotee, 'is_approved': True}
-                )
-            if not created:
-                eligibility.is_approved = True
-                eligibility.approved_by = devotee
-                eligibility.save()
-
+            to_approve.append(
+                YatraEligibility(yatra=yatra, profile=profile, approved_by=devotee, is_approved=True)
+            )
             updated.append({
                 'profile_id': str(profile.id),
                 'action': 'approve',
-                'was_created': created,
+                'was_created': eligibility is None,
                 'is_approved': True
             })
-            # eligibility.is_approved = (action == 'approve')
-            # eligibility.approved_by = devotee
-            # eligibility.save()
 
-            updated.append({
-                'profile_id': str(profile.id),
-                'action': action,
-                'was_created': created,
-                'is_approved': eligibility.is_approved
-            })
+        # =====================================================
+        # WRITE IN BULK
+        # =====================================================
+        with transaction.atomic():
+            if to_remove:
+                YatraEligibility.objects.filter(id__in=to_remove).delete()
+                # Unapproved profiles lose their place on the waitlist too
+                YatraWaitlistEntry.objects.filter(yatra=yatra, profile_id__in=removed_profile_ids).delete()
+            if to_approve:
+                YatraEligibility.objects.bulk_create(
+                    to_approve,
+                    **upsert_kwargs(['yatra', 'profile'], ['is_approved', 'approved_by'])
+                )
+            # bulk_create skips signals; refresh the dashboard rows explicitly
+            schedule_dashboard_refresh(yatra.id, seen)
 
         if errors:
             return Response({'errors': errors, 'updated': updated}, status=400)
@@ -349,272 +425,133 @@ class YatraRegistrationView(APIView):
     Handle registration creation and management
     """
     permission_classes = [IsAuthenticated]
+    # see helpers.instrumentation; GET includes rebuilding the mentor's own
+    # dashboard row, POST the seat reservation and post-commit refresh of the registered rows
+    query_budget = {'GET': 17, 'POST': 26}
 
     def get(self, request, yatra_id):
-            print("STEP 0: ENTER VIEW")
-            # return Response({"detail": "This endpoint is under maintenance."}, status=200)
-
-            try:
-                yatra = get_object_or_404(Yatra, id=yatra_id)
-                user_profile = request.user.profile
-                print("STEP 1: yatra & user_profile OK", yatra.id, user_profile.id)
-
-                # =====================================================
-                # APPROVED MENTEES
-                # =====================================================
-                mentees = list(
-                    MentorRequest.objects
-                    .filter(to_mentor=user_profile, is_approved=True)
-                    .values_list('from_user_id', flat=True)
-                )
-                print("STEP 2: mentees fetched", mentees)
-
-                profile_ids = list(mentees)
+        """
+        The mentor's dashboard: self (when eligible) and all approved mentees.
 
-                # =====================================================
-                # ADD SELF IF ELIGIBLE
-                # =====================================================
-                if YatraEligibility.objects.filter(
-                    yatra=yatra,
-                    profile=user_profile,
-                    is_approved=True
-                ).exists():
-                    profile_ids.insert(0, user_profile.id)
+        Sending any of cursor, page_size, ordering, status, eligible,
+        installment_due or substitution_pending switches to a keyset-paginated
+        response with a `next_cursor`; self is only on the first page.
+        """
+        with span("load_yatra"):
+            yatra = get_object_or_404(Yatra.objects.select_related('seat_counter'), id=yatra_id)
+            user_profile = request.user.profile
 
-                print("STEP 3: profile_ids", profile_ids)
+        paginator = None
+        if wants_pagination(request, DASHBOARD_QUERY_PARAMS):
+            try:
+                paginator = KeysetPaginator(request, DASHBOARD_ORDERINGS, 'name')
+                row_filter = dashboard_row_filter(request.query_params)
+            except InvalidPageRequest as e:
+                return Response({'error': str(e)}, status=400)
+            profile_ids, row_map = self._dashboard_page(yatra, user_profile, paginator, row_filter)
+        else:
+            profile_ids, row_map = self._dashboard_all(yatra, user_profile)
 
-                # =====================================================
-                # FAST PROFILE QUERY (ANNOTATED)
-                # =====================================================
-                approved_req = MentorRequest.objects.filter(
-                    from_user=OuterRef('pk'),
-                    is_approved=True
-                )
+        # =====================================================
+        # PROFILE PROJECTION (values(), NO SERIALIZER PER ROW)
+        # =====================================================
+        with span("profiles"):
+            profile_map = {p['id']: p for p in dashboard_profiles(profile_ids)}
 
-                profiles_qs = (
-                    Profile.objects
-                    .filter(id__in=profile_ids)
-                    .select_related('user', 'mentor')
-                    .annotate(
-                        full_name=Concat(
-                            F('first_name'),
-                            Value(' '),
-                            F('last_name'),
-                            output_field=CharField()
-                        ),
-                        mentor_name=Concat(
-                            F('mentor__first_name'),
-                            Value(' '),
-                            F('mentor__last_name'),
-                            output_field=CharField()
-                        ),
-                        is_profile_approved=Exists(approved_req),
-                    )
-                )
+        # =====================================================
+        # MERGE PROFILE + DASHBOARD ROW
+        # =====================================================
+        profiles = []
+        for pid in profile_ids:
+            pdata = profile_map.get(pid)
+            if not pdata:
+                logger.warning("Profile %s missing from registration dashboard of yatra %s", pid, yatra.id)
+                continue
 
-                print("STEP 4: profiles_qs COUNT =", profiles_qs.count())
+            pdata.update(row_map[pid])
+            pdata['is_self'] = pid == user_profile.id
+            profiles.append(pdata)
 
-                profiles_data = ProfileFastSerializer(profiles_qs, many=True).data
-                print("STEP 5: profiles serialized", len(profiles_data))
+        with span("yatra"):
+            yatra_data = YatraSerializer(yatra, context={'request': request}).data
 
-                # profile_map = {p['id']: p for p in profiles_data}
-                profile_map = {UUID(p['id']): p for p in profiles_data}
+        response = {
+            "yatra": yatra_data,
+            "profiles": profiles,
+        }
+        if paginator:
+            response["next_cursor"] = paginator.next_cursor
+        return Response(response)
 
-                print("STEP 6: profile_map keys", profile_map.keys())
+    def _dashboard_all(self, yatra, user_profile):
+        # =====================================================
+        # APPROVED MENTEES
+        # =====================================================
+        with span("mentees"):
+            mentees = list(
+                MentorRequest.objects
+                .filter(to_mentor=user_profile, is_approved=True)
+                .values_list('from_user_id', flat=True)
+            )
 
-                # =====================================================
-                # ELIGIBILITY MAP
-                # =====================================================
-                eligibilities = (
-                    YatraEligibility.objects
-                    .filter(yatra=yatra, profile_id__in=profile_ids)
-                    .select_related('approved_by')
-                )
-                eligibility_map = {e.profile_id: e for e in eligibilities}
+        # =====================================================
+        # DASHBOARD ROWS (ONE INDEXED READ, MISSING ROWS REBUILT)
+        # =====================================================
+        with span("dashboard_rows"):
+            candidate_ids = [user_profile.id] + mentees
+            row_map = {
+                row.profile_id: row.data
+                for row in RegistrationDashboardRow.objects.filter(
+                    Q(mentor=user_profile) | Q(profile=user_profile),
+                    yatra=yatra, profile_id__in=candidate_ids,
+                ).only('profile_id', 'data')
+            }
+            missing = [pid for pid in candidate_ids if pid not in row_map]
 
-                print("STEP 7: eligibility_map keys", eligibility_map.keys())
+        if missing:
+            with span("dashboard_rebuild"):
+                row_map.update(refresh_dashboard_rows(yatra, missing))
 
-                # =====================================================
-                # REGISTRATIONS (FULLY PREFETCHED)
-                # =====================================================
-                registrations = (
-                    YatraRegistration.objects
-                    .filter(yatra=yatra, registered_for_id__in=profile_ids)
-                    .select_related('registered_for')
-                    .prefetch_related(
-                        'installments__installment',
-                        'installments__payment',
-                        'installments__verified_by',
-                        'accommodation_allocations__accommodation',
-                        'journey_allocations__journey',
-                        'custom_values__custom_field_value__custom_field',
-                    )
+        # =====================================================
+        # ADD SELF IF ELIGIBLE
+        # =====================================================
+        profile_ids = list(mentees)
+        if row_map[user_profile.id]['is_eligible']:
+            profile_ids.insert(0, user_profile.id)
+        return profile_ids, row_map
+
+    def _dashboard_page(self, yatra, user_profile, paginator, row_filter):
+        rows = RegistrationDashboardRow.objects.filter(yatra=yatra).filter(row_filter)
+        profile_ids, row_map = [], {}
+
+        if paginator.is_first_page:
+            # Rows are built lazily; make sure every mentee has one before paging over them
+            with span("mentees"):
+                mentees = list(
+                    MentorRequest.objects
+                    .filter(to_mentor=user_profile, is_approved=True)
+                    .values_list('from_user_id', flat=True)
                 )
-
-                print("STEP 8: registrations COUNT =", registrations.count())
-
-                registration_map = {r.registered_for_id: r for r in registrations}
-                yatra_installments = list(yatra.installments.all())
-
-                print("STEP 9: yatra_installments", [i.label for i in yatra_installments])
-
-                # =====================================================
-                # SUBSTITUTION REQUESTS (BULK)
-                # =====================================================
-                substitution_map = {
-                    s.new_registration_id: s
-                    for s in SubstitutionRequest.objects.filter(
-                        new_registration__in=registrations,
-                        status="accepted",
-                        fee_collected=False
-                    )
-                }
-
-                print("STEP 10: substitution_map keys", substitution_map.keys())
-
-                # =====================================================
-                # MERGE ALL DATA
-                # =====================================================
-                for pid in profile_ids:
-                    print("STEP 11: processing profile", pid)
-
-                    pdata = profile_map.get(pid)
-                    if not pdata:
-                        print("⚠️ WARNING: profile missing in profile_map", pid)
-                        continue
-
-                    eligibility = eligibility_map.get(pid)
-                    registration = registration_map.get(pid)
-
-                    pdata.update({
-                        'is_eligible': eligibility.is_approved if eligibility else False,
-                        'is_self': pid == user_profile.id,
-                        'approved_by': (
-                            str(eligibility.approved_by.member_id)
-                            if eligibility and eligibility.approved_by else None
-                        ),
-                    })
-
-                    if registration:
-                        print("STEP 12: has registration", registration.id)
-
-                        reg_installments = list(registration.installments.all())
-                        inst_map = {i.installment_id: i for i in reg_installments}
-
-                        paid, pending = [], []
-                        for inst in reg_installments:
-                            (paid if inst.is_paid else pending).append(inst.installment.label)
-
-                        for inst in yatra_installments:
-                            if inst.label not in paid and inst.label not in pending:
-                                pending.append(inst.label)
-
-                        installments_info = []
-                        for inst in yatra_installments:
-                            ri = inst_map.get(inst.id)
-                            if ri:
-                                if ri.is_paid:
-                                    tag = "verified"
-                                elif ri.payment and ri.verified_by:
-                                    tag = ri.payment.status
-                                elif ri.payment:
-                                    tag = "verification pending"
-                                else:
-                                    tag = "due"
-                            else:
-                                tag = "due"
-
-                            installments_info.append({
-                                "label": inst.label,
-                                "amount": float(inst.amount),
-                                "tag": tag,
-                            })
-
-                        pdata.update({
-                            'is_registered': True,
-                            'registration_id': str(registration.id),
-                            'registration_status': registration.status,
-                            'form_data': registration.form_data,
-                            # 'paid_amount': float(registration.paid_amount),
-                            # 'pending_amount': float(registration.pending_amount),
-                            'installments_paid': paid,
-                            'installments_pending': pending,
-                            'installments_info': installments_info,
-                            'accommodation': [
-                            {
-                                "accommodation": AccommodationSerializer(
-                                    a.accommodation, context={'request': request}
-                                ).data,
-                                "room_number": a.room_number,
-                                "bed_number": a.bed_number,
-                            }
-                            for a in registration.accommodation_allocations.all()
-                            ],
-                            'journey': [
-                                {
-                                    "journey": JourneySerializer(
-                                        j.journey, context={'request': request}
-                                    ).data,
-                                    "vehicle_number": j.vehicle_number,
-                                    "seat_number": j.seat_number,
-                                }
-                                for j in registration.journey_allocations.all()
-                            ],
-                            'custom_fields': [
-                                {
-                                    "field": v.custom_field_value.custom_field.field_name,
-                                    "value": v.custom_field_value.value,
-                                }
-                                for v in registration.custom_values.all()
-                            ],
-                        })
-
-                        sub_req = substitution_map.get(registration.id)
-                        pdata.update({
-                            'is_substitution': bool(sub_req),
-                            'pending_substitution_fees': (
-                                {
-                                    "cancellation_fee": float(yatra.cancellation_fee or 0),
-                                    "substitution_fee": float(yatra.substitution_fee or 0),
-                                    "total": float(
-                                        (yatra.cancellation_fee or 0) +
-                                        (yatra.substitution_fee or 0)
-                                    ),
-                                } if sub_req else None
-                            )
-                        })
-
-                    else:
-                        print("STEP 13: NOT registered", pid)
-                        pdata.update({
-                            'is_registered': False,
-                            'registration_status': "pending",
-                            'form_data': {},
-                            'paid_amount': 0,
-                            'pending_amount': float(sum(i.amount for i in yatra_installments)),
-                            'installments_paid': [],
-                            'installments_pending': [i.label for i in yatra_installments],
-                            'installments_info': [
-                                {'label': i.label, 'amount': float(i.amount), 'tag': 'due'}
-                                for i in yatra_installments
-                            ],
-                            'accommodation': [],
-                            'journey': [],
-                            'custom_fields': [],
-                            'is_substitution': False,
-                            'pending_substitution_fees': None,
-                        })
-
-                print("STEP 14: RESPONSE READY")
-
-                return Response({
-                    "yatra": YatraSerializer(yatra, context={'request': request}).data,
-                    "profiles": list(profile_map.values()),
-                })
-
-            except Exception as e:
-                print("❌ ERROR OCCURRED:", type(e).__name__, str(e))
-                raise
+            with span("dashboard_rebuild"):
+                ensure_dashboard_rows(yatra, [user_profile.id] + mentees)
+
+            # Self leads the first page when eligible and matching the filters
+            own = rows.filter(profile=user_profile).values_list('data', flat=True).first()
+            if own and own['is_eligible']:
+                profile_ids.append(user_profile.id)
+                row_map[user_profile.id] = own
+
+        # Every approved mentee has a row with this mentor, the same membership as _dashboard_all
+        with span("dashboard_rows"):
+            page = paginator.paginate(
+                rows.filter(mentor=user_profile)
+                .exclude(profile=user_profile)
+                .values('profile_id', 'data', paginator.key)
+            )
+        for row in page:
+            profile_ids.append(row['profile_id'])
+            row_map[row['profile_id']] = row['data']
+        return profile_ids, row_map
 
     def post(self, request, yatra_id):
         """
@@ -640,72 +577,133 @@ class YatraRegistrationView(APIView):
             return Response({'error': 'Invalid data format. Expected object of profile_id -> registration info.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        created_or_updated = []
         errors = []
 
-        for profile_id, reg_data in registrations_data.items():
+        # =====================================================
+        # RESOLVE PROFILES, ELIGIBILITY AND INSTALLMENTS (IN QUERIES)
+        # =====================================================
+        parsed_ids = {}
+        for profile_id in registrations_data:
             try:
-                profile = Profile.objects.get(id=profile_id)
-            except Profile.DoesNotExist:
+                parsed_ids[profile_id] = UUID(str(profile_id))
+            except ValueError:
+                continue
+
+        profiles = Profile.objects.in_bulk(set(parsed_ids.values()))
+        eligible_ids = self._eligible_profile_ids(yatra, profiles.keys(), registrant)
+        installment_map = {i.label: i for i in yatra.installments.all()}
+
+        accepted = {}  # profile_id -> (profile, reg_data)
+        for profile_id, reg_data in registrations_data.items():
+            profile = profiles.get(parsed_ids.get(profile_id))
+            if profile is None:
                 errors.append(f'Invalid profile ID: {profile_id}')
                 continue
 
             # --- Eligibility check ---
-            if not self._check_eligibility(yatra, profile, registrant):
+            if profile.id not in eligible_ids:
                 errors.append(f'{profile} is not eligible for registration')
                 continue
 
-            # --- Extract fields ---
-            form_fields = reg_data.get('form_fields', {})
-            installments_selected = reg_data.get('installments_selected', [])
-            installments_details = reg_data.get('installments_details', [])
+            accepted[profile.id] = (profile, reg_data)
 
-            # --- Create or update registration ---
-            registration, created_flag = YatraRegistration.objects.get_or_create(
-                yatra=yatra,
-                registered_for=profile,
-                defaults={
-                    'registered_by': registrant,
-                    'form_data': form_fields,
-                    'status': 'partial' if installments_selected else 'pending',
+        created_or_updated = []
+        waitlisted = []
+        if accepted:
+            with transaction.atomic():
+                # --- Admission: new registrations need a seat, first come first served ---
+                existing_ids = set(
+                    YatraRegistration.objects
+                    .filter(yatra=yatra, registered_for_id__in=accepted.keys())
+                    .values_list('registered_for_id', flat=True)
+                )
+                new_ids = [pid for pid in accepted if pid not in existing_ids]
+                granted = reserve_seats(yatra, len(new_ids))
+                # --- No seat left: queue the rest in arrival order ---
+                overflow = {pid: accepted.pop(pid) for pid in new_ids[granted:]}
+                enqueue(yatra, registrant, overflow)
+                waitlisted = [str(pid) for pid in overflow]
+
+                # --- Upsert registrations (only form_data changes on existing ones) ---
+                upserted = {
+                    profile.id: YatraRegistration(
+                        yatra=yatra,
+                        registered_for=profile,
+                        registered_by=registrant,
+                        form_data=reg_data.get('form_fields', {}),
+                        status='partial' if reg_data.get('installments_selected') else 'pending',
+                    )
+                    for profile, reg_data in accepted.values()
                 }
-            )
-
-            if not created_flag:
-                registration.form_data = form_fields
-                registration.save()
-
-            # --- Handle installments ---
-            existing_labels = set(
-                registration.installments.values_list('installment__label', flat=True)
-            )
-
-            for inst_label in installments_selected:
-                try:
-                    installment = YatraInstallment.objects.get(yatra=yatra, label=inst_label)
-                except YatraInstallment.DoesNotExist:
-                    errors.append(f'Invalid installment "{inst_label}" for profile {profile}')
-                    continue
-
-                reg_inst, _ = YatraRegistrationInstallment.objects.get_or_create(
-                    registration=registration,
-                    installment=installment
+                # bulk_create() may overwrite the ids with the stored ones
+                generated_ids = {pid: r.id for pid, r in upserted.items()}
+                YatraRegistration.objects.bulk_create(
+                    upserted.values(),
+                    **upsert_kwargs(['yatra', 'registered_for'], ['form_data', 'updated_at'])
                 )
+                # Re-read: on conflict the stored row keeps its own id
+                registration_map = {
+                    r.registered_for_id: r
+                    for r in YatraRegistration.objects
+                    .filter(yatra=yatra, registered_for_id__in=accepted.keys())
+                    .select_related('registered_for', 'registered_by')
+                }
+                # A concurrent request inserted some "new" rows after existing_ids was
+                # read; those already hold the seat it reserved, so give ours back
+                release_seats(yatra.id, sum(
+                    1 for pid in new_ids
+                    if pid in accepted and registration_map[pid].id != generated_ids[pid]
+                ))
+
+                # --- Handle installments ---
+                plain_installments = {}
+                detailed_installments = {}
+                for profile_id, (profile, reg_data) in accepted.items():
+                    registration = registration_map[profile_id]
+                    details = {
+                        d.get('label'): d for d in reg_data.get('installments_details', [])
+                    }
+                    for inst_label in reg_data.get('installments_selected', []):
+                        installment = installment_map.get(inst_label)
+                        if installment is None:
+                            errors.append(f'Invalid installment "{inst_label}" for profile {profile}')
+                            continue
+
+                        key = (registration.id, installment.id)
+                        reg_inst = YatraRegistrationInstallment(
+                            registration=registration,
+                            installment=installment
+                        )
+                        # Update payment-related details if provided
+                        matching_detail = details.get(inst_label)
+                        if matching_detail and 'is_paid' in matching_detail:
+                            reg_inst.is_paid = matching_detail['is_paid']
+                            detailed_installments[key] = reg_inst
+                        else:
+                            plain_installments[key] = reg_inst
+
+                if plain_installments:
+                    YatraRegistrationInstallment.objects.bulk_create(
+                        plain_installments.values(), ignore_conflicts=True
+                    )
+                if detailed_installments:
+                    YatraRegistrationInstallment.objects.bulk_create(
+                        detailed_installments.values(),
+                        **upsert_kwargs(['registration', 'installment'], ['is_paid'])
+                    )
 
-                # Update payment-related details if provided
-                matching_detail = next((i for i in installments_details if i['label'] == inst_label), None)
-                if matching_detail:
-                    reg_inst.is_paid = matching_detail.get('is_paid', reg_inst.is_paid)
-                    reg_inst.save()
+                # bulk writes skip signals; refresh the dashboard rows explicitly
+                schedule_dashboard_refresh(yatra.id, accepted.keys())
 
-            created_or_updated.append(registration)
+            created_or_updated = [registration_map[pid] for pid in accepted]
 
         # --- Return response ---
         return Response({
             'message': f'{len(created_or_updated)} registrations processed successfully',
             'errors': errors,
-            'registrations': YatraRegistrationSerializer(created_or_updated, many=True).data
-        }, status=status.HTTP_200_OK if created_or_updated else status.HTTP_400_BAD_REQUEST)
+            'registrations': YatraRegistrationSerializer(created_or_updated, many=True).data,
+            'waitlisted': waitlisted,
+        }, status=status.HTTP_200_OK if created_or_updated or waitlisted else status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, yatra_id):
         """
@@ -790,9 +788,11 @@ class YatraRegistrationView(APIView):
                 status=403
             )
         
-        # ---- 4. Mark registration as cancelled ----
-        registration.status = "cancelled"
-        registration.save()
+        # ---- 4. Mark registration as cancelled, hand the seat to the waitlist ----
+        with transaction.atomic():
+            registration.status = "cancelled"
+            registration.save()
+            promote_from_waitlist(yatra)
 
         # ---- 5. Delete allocations ----
         # registration.accommodation_allocations.all().delete()
@@ -805,27 +805,31 @@ class YatraRegistrationView(APIView):
             "status": "cancelled"
         }, status=200)
     
-    def _check_eligibility(self, yatra, profile, registrant):
-        """Check if profile is eligible for registration"""
-        if profile == registrant:
-            try:
-                eligibility = YatraEligibility.objects.get(yatra=yatra, profile=profile)
-                return eligibility.is_approved
-            except YatraEligibility.DoesNotExist:
-                return False
-        else:
-            if not MentorRequest.objects.filter(
-                from_user=profile,
-                to_mentor=registrant,
+    def _eligible_profile_ids(self, yatra, profile_ids, registrant):
+        """
+        Profiles that may be registered by registrant: approved for this yatra,
+        and either the registrant themself or one of their approved mentees.
+        """
+        approved_ids = set(
+            YatraEligibility.objects.filter(
+                yatra=yatra,
+                profile_id__in=profile_ids,
                 is_approved=True
-            ).exists():
-                return False
-            
-            try:
-                eligibility = YatraEligibility.objects.get(yatra=yatra, profile=profile)
-                return eligibility.is_approved
-            except YatraEligibility.DoesNotExist:
-                return False
+            ).values_list('profile_id', flat=True)
+        )
+        mentee_ids = set()
+        if approved_ids - {registrant.id}:
+            mentee_ids = set(
+                MentorRequest.objects.filter(
+                    from_user_id__in=approved_ids - {registrant.id},
+                    to_mentor=registrant,
+                    is_approved=True
+                ).values_list('from_user_id', flat=True)
+            )
+        return {
+            pid for pid in approved_ids
+            if pid == registrant.id or pid in mentee_ids
+        }
 
 class YatraRegistrationDetailView(APIView):
     """
@@ -834,66 +838,170 @@ class YatraRegistrationDetailView(APIView):
     """
 
     def get(self, request, yatra_id, profile_id):
-        try:
-            registration = YatraRegistration.objects.get(
-                yatra_id=yatra_id,
-                registered_for_id=profile_id
-            )
-            serializer = YatraRegistrationDetailSerializer(registration,context={"request": request})
-            return Response(serializer.data, status=status.HTTP_200_OK)
-
-        except YatraRegistration.DoesNotExist:
-            # User not registered yet — return blank structure
-            yatra = get_object_or_404(Yatra, id=yatra_id)
-            installments = yatra.installments.all()
-            installments_data = InstallmentSerializer(installments, many=True, context={'blank_mode': True}).data
-
-            blank_data = {
-                "id": None,
-                "yatra": yatra.title,
-                "registered_for": profile_id,
-                "form_data": {},  # empty form
-                "status": "not_registered",
-                "registered_at": None,
-                "updated_at": None,
-                "installments": [
-                    {
-                        "id": None,
-                        "label": inst.label,
-                        "amount": inst.amount,
-                        "is_paid": False,
-                        "paid_at": None,
-                        "verified_by": None,
-                        "verified_at": None,
-                        "notes": None,
-                        "payment": None,
-                    }
-                    for inst in installments
-                ],
-            }
-            return Response(blank_data, status=status.HTTP_200_OK)
+        # Cached per registration; see yatra_registration.detail
+        data = registration_detail(yatra_id, profile_id, request)
+        if data is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class TrackRCSDownloadAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, registration_id):
-        registration = get_object_or_404(
-            YatraRegistration,
-            id=registration_id
-        )
-        event, created = RCSDownloadEvent.objects.get_or_create(
-            registration=registration
-        )
-        event.record_download()
+        count, created = record_download(registration_id)
+        if count is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
         return Response(
             {
                 "ok": True,
-                "count": event.count,
+                "count": count,
             },
             status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
         )
 
+class RCSPDFView(APIView):
+    """
+    GET /yatras/<registration_id>/rcs/
+    → The registration confirmation slip as a PDF (rendered once per set of
+    inputs and then served from storage; see yatra_registration.rcs).
+    Counts as an RCS download.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, registration_id):
+        registration = rcs_registrations().filter(id=registration_id).first()
+        if registration is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        profile = request.user.profile
+        is_staff = request.user.is_staff
+        if not is_staff and profile.id not in (
+            registration.registered_for_id,
+            registration.registered_by_id,
+            registration.registered_for.mentor_id,
+        ):
+            return Response({"error": "You cannot download this RCS."}, status=status.HTTP_403_FORBIDDEN)
+        if not registration.yatra.is_rcs_download_open and not is_staff:
+            return Response({"error": "RCS download is not open for this yatra."}, status=status.HTTP_403_FORBIDDEN)
+        if registration.status not in RCS_STATUSES:
+            return Response({"error": "RCS is available once the registration is confirmed."}, status=status.HTTP_400_BAD_REQUEST)
+
+        path = get_or_render_rcs(
+            registration,
+            yatra_rcs_context(registration.yatra),
+            attendance_url(registration, request),
+        )
+        record_download(registration.id)
+        return FileResponse(
+            default_storage.open(path, 'rb'),
+            content_type='application/pdf',
+            as_attachment=True,
+            filename=f"RCS-{registration.registered_for.member_id or registration.id}.pdf",
+        )
+
+
+class AttendanceSyncView(APIView):
+    """
+    POST /yatras/<yatra_id>/attendance/sync/
+    Batch upload from the yatra's gate scanner devices (staff only).
+    Expects: {
+        "scans": [
+            {"token": "<QR token>", "scanned_at": "<ISO datetime>", "scanner_id": "gate-1",
+             "fee_collected": false},
+            {"registration_id": "...", "scanned_at": "...", "scanner_id": "gate-1"},
+            ...
+        ]
+    }
+    Returns the scans that marked attendance under "applied" and the rest under
+    "conflicts" (not_found, wrong_yatra, not_paid, already_attended,
+    stale_token, substitution_fee_due).
+    Uploading the same scans again returns the same outcomes.
+    """
+    permission_classes = [IsAdminUser]
+    # see helpers.instrumentation; constant per batch (locked read, scan log,
+    # substitutions, update, bulk insert and the dashboard refresh)
+    query_budget = {'POST': 24}
+
+    def post(self, request, yatra_id):
+        scans = request.data.get('scans')
+        if not isinstance(scans, list) or not scans:
+            return Response({'error': 'scans must be a non-empty list'}, status=400)
+        if len(scans) > MAX_SCANS_PER_SYNC:
+            return Response({'error': f'At most {MAX_SCANS_PER_SYNC} scans per request'}, status=400)
+
+        serializer = AttendanceScanSerializer(data=scans, many=True)
+        if not serializer.is_valid():
+            rejected = [
+                {'index': idx, 'errors': errors}
+                for idx, errors in enumerate(serializer.errors) if errors
+            ]
+            return Response({'error': 'Invalid scans', 'rejected': rejected}, status=400)
+
+        applied, conflicts = apply_scans(yatra_id, serializer.validated_data)
+        return Response({
+            'applied': applied,
+            'conflicts': conflicts,
+        }, status=200)
+
+
+class AttendanceManifestView(APIView):
+    """
+    GET /yatras/<yatra_id>/attendance/manifest/
+    Streams the yatra's attendance manifest (staff only) for gate scanners to
+    cache, so QR tokens are checked on the device and the server is only
+    contacted to sync attendance. See yatra_registration.attendance.attendance_manifest.
+    """
+    permission_classes = [IsAdminUser]
+    # see helpers.instrumentation; the manifest rows are read while streaming
+    query_budget = {'GET': 4}
+
+    def get(self, request, yatra_id):
+        yatra = get_object_or_404(Yatra, id=yatra_id)
+        return StreamingHttpResponse(attendance_manifest(yatra), content_type='application/json')
+
+
+class RefundBatchView(APIView):
+    """
+    GET  /yatras/<yatra_id>/refunds/   the yatra's refund batches (staff only)
+    POST /yatras/<yatra_id>/refunds/   {"dry_run": false}
+    Refunds every cancelled registration of the yatra with verified payments
+    above the cancellation fee, once payment_refund_date has arrived. Returns
+    the batch with its payout file; a dry run returns the payout rows instead.
+    See yatra_registration.refunds.
+    """
+    permission_classes = [IsAdminUser]
+    # see helpers.instrumentation; constant per batch (locked selection, payout
+    # rows, bulk insert, updates, payment transition and the dashboard refresh)
+    query_budget = {'GET': 3, 'POST': 52}
+
+    def get(self, request, yatra_id):
+        yatra = get_object_or_404(Yatra, id=yatra_id)
+        batches = yatra.refund_batches.select_related('created_by').order_by('-created_at')
+        return Response(RefundBatchSerializer(batches, many=True, context={'request': request}).data)
+
+    def post(self, request, yatra_id):
+        get_object_or_404(Yatra, id=yatra_id)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        try:
+            batch, rows = refund_batch(yatra_id, request.user.profile, apply=not dry_run)
+        except RefundError as e:
+            return Response({'error': str(e)}, status=400)
+
+        if dry_run:
+            return Response({
+                'registrations_count': len(rows),
+                'total_amount': sum(row['refund_amount'] for row in rows),
+                'rows': rows,
+            })
+        if batch is None:
+            return Response({'message': 'No cancelled registrations to refund.'})
+        return Response(
+            RefundBatchSerializer(batch, context={'request': request}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
 @method_decorator(staff_member_required, name="dispatch")
 class MarkAttendanceView(View):
 
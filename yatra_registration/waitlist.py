@@ -0,0 +1,114 @@
+# yatra_registration/waitlist.py
+"""
+Waitlist for full yatras.
+
+Profiles that do not get a seat in YatraRegistrationView.post are queued as
+YatraWaitlistEntry rows. Whenever seats free up (cancellation, substitution,
+capacity increase) promote_from_waitlist() pops the head of the queue with an
+indexed `WHERE yatra_id = ? ORDER BY id LIMIT n` read. The head rows are
+locked with SKIP LOCKED, so concurrent cancellations promote different
+entries instead of queueing behind each other.
+"""
+from django.db import transaction
+
+from .admission import ensure_seat_counter, reserve_seats
+from .dashboard import schedule_dashboard_refresh
+from .models import (
+    YatraRegistration, YatraRegistrationInstallment, YatraSeatCounter,
+    YatraWaitlistEntry,
+)
+
+
+def enqueue(yatra, registrant, requests):
+    """
+    Queue {profile_id: (profile, reg_data)} for a yatra. Profiles already on
+    the waitlist keep their place.
+    """
+    if not requests:
+        return
+    YatraWaitlistEntry.objects.bulk_create(
+        [
+            YatraWaitlistEntry(
+                yatra=yatra,
+                profile=profile,
+                requested_by=registrant,
+                form_data=reg_data.get('form_fields', {}),
+                installments_selected=reg_data.get('installments_selected', []),
+            )
+            for profile, reg_data in requests.values()
+        ],
+        ignore_conflicts=True,
+    )
+    schedule_dashboard_refresh(yatra.id, requests.keys())
+
+
+def free_seats(yatra):
+    taken = (
+        YatraSeatCounter.objects
+        .filter(pk=yatra.pk)
+        .values_list('seats_taken', flat=True)
+        .first()
+    )
+    if taken is None:
+        taken = ensure_seat_counter(yatra.pk).seats_taken
+    return max(0, yatra.capacity - taken)
+
+
+def promote_from_waitlist(yatra):
+    """
+    Register waitlisted profiles into the seats that are free, oldest first.
+    Runs inside the caller's transaction; returns the new registrations.
+    """
+    with transaction.atomic():
+        free = free_seats(yatra)
+        if not free:
+            return []
+
+        head = list(
+            YatraWaitlistEntry.objects
+            .filter(yatra=yatra)
+            .order_by('id')
+            .select_for_update(skip_locked=True)[:free]
+        )
+        if not head:
+            return []
+
+        # Profiles registered some other way meanwhile just leave the queue
+        registered = set(
+            YatraRegistration.objects
+            .filter(yatra=yatra, registered_for_id__in=[e.profile_id for e in head])
+            .values_list('registered_for_id', flat=True)
+        )
+        waiting = [e for e in head if e.profile_id not in registered]
+        promoted = waiting[:reserve_seats(yatra, len(waiting))]
+
+        registrations = [
+            YatraRegistration(
+                yatra=yatra,
+                registered_for_id=entry.profile_id,
+                registered_by_id=entry.requested_by_id,
+                form_data=entry.form_data,
+                status='partial' if entry.installments_selected else 'pending',
+            )
+            for entry in promoted
+        ]
+        # bulk_create skips the seat signals; the seats were reserved above
+        YatraRegistration.objects.bulk_create(registrations)
+
+        if any(entry.installments_selected for entry in promoted):
+            installment_map = {i.label: i for i in yatra.installments.all()}
+            YatraRegistrationInstallment.objects.bulk_create(
+                [
+                    YatraRegistrationInstallment(registration=registration, installment=installment_map[label])
+                    for entry, registration in zip(promoted, registrations)
+                    for label in entry.installments_selected
+                    if label in installment_map
+                ],
+                ignore_conflicts=True,
+            )
+
+        served = [e for e in head if e.profile_id in registered] + promoted
+        YatraWaitlistEntry.objects.filter(id__in=[e.id for e in served]).delete()
+        schedule_dashboard_refresh(yatra.id, [e.profile_id for e in served])
+
+    return registrations
@@ -13,6 +13,7 @@ from decimal import Decimal
 
 from userProfile.models import Profile
 from yatra_registration.models import *
+from yatra_registration.waitlist import promote_from_waitlist
 from .models import SubstitutionRequest
 from .serializers import SubstitutionRequestSerializer
 from django.db import models
@@ -226,6 +227,9 @@ def respond_substitution_request(request, req_id):
         sr.new_registration = new_reg
         sr.save()
 
+        # The seat passes to the target; hand any seat still free to the waitlist
+        promote_from_waitlist(reg.yatra)
+
     # Notify initiator & target about success
 
     return Response({"detail":"Substitution completed", "new_registration_id": str(new_reg.id)})